@@ -0,0 +1,102 @@
+"""Measure commit latency in a writer process on a SQLite database before and during an online backup.
+
+Run from the repository root: python -m benchmarks.backup [size-in-MiB]
+"""
+import multiprocessing
+import multiprocessing.synchronize
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from jiu_jitsu_notes import backup
+from jiu_jitsu_notes.models import Base
+
+ROW_BYTES = 4096
+BASELINE_SECONDS = 3.0
+WRITE_INTERVAL_SECONDS = 0.005
+
+
+def seed(path: Path, size: int) -> None:
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'bench', 'bench@example.com', '')")
+    connection.execute("INSERT INTO position_groups (id, user_id, name, description) VALUES (1, 1, 'Guard', '')")
+
+    for _ in range(max(1, size // (ROW_BYTES * 1000))):
+        connection.execute(
+            """
+            WITH RECURSIVE rows(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM rows WHERE n < 1000)
+            INSERT INTO positions (user_id, group_id, name, description, submission)
+            SELECT 1, 1, 'Position ' || n, hex(randomblob(?)) || printf('%.*c', ?, 'x'), 0 FROM rows
+            """,
+            (ROW_BYTES // 4, ROW_BYTES // 2),
+        )
+        connection.commit()
+
+    connection.close()
+
+
+def write(path: Path, stopped: multiprocessing.synchronize.Event, results: multiprocessing.Queue) -> None:
+    """Commit one small change row every few milliseconds, like the app process would, timing each commit."""
+    connection = sqlite3.connect(path, timeout=30)
+    latencies = []
+
+    while not stopped.wait(WRITE_INTERVAL_SECONDS):
+        started = time.monotonic()
+        connection.execute("INSERT INTO changes (user_id, entity, entity_id, deleted) VALUES (1, 'position', 1, 0)")
+        connection.commit()
+        latencies.append((started, time.monotonic() - started))
+
+    connection.close()
+    results.put(latencies)
+
+
+def summarise(name: str, latencies: list[float]) -> None:
+    milliseconds = sorted(latency * 1000 for latency in latencies)
+    p99 = milliseconds[min(len(milliseconds) - 1, int(len(milliseconds) * 0.99))]
+
+    print(
+        f"  {name:<8} {len(milliseconds):6} commits  p50 {statistics.median(milliseconds):7.3f} ms"
+        f"  p99 {p99:7.3f} ms  max {milliseconds[-1]:8.3f} ms"
+    )
+
+
+def main(size_mib: int = 256) -> None:
+    with tempfile.TemporaryDirectory() as scratch:
+        path = Path(scratch) / "notes.db"
+        seed(path, size_mib * 1024 * 1024)
+
+        print(f"{path.stat().st_size / 1024 / 1024:.0f} MiB database")
+
+        stopped = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        writer = multiprocessing.Process(target=write, args=(path, stopped, results))
+        writer.start()
+        time.sleep(BASELINE_SECONDS)
+
+        started = time.monotonic()
+        snapshot = Path(scratch) / "notes.sqlite3.gz"
+        backup.snapshot_sqlite(str(path), snapshot)
+        finished = time.monotonic()
+
+        stopped.set()
+        latencies = results.get()
+        writer.join()
+        elapsed = finished - started
+        baseline = [latency for at, latency in latencies if at < started]
+        during = [latency for at, latency in latencies if started <= at < finished]
+
+        print(f"  backup   {elapsed:8.2f} s  {snapshot.stat().st_size / 1024 / 1024:.0f} MiB compressed")
+        summarise("idle", baseline)
+        summarise("backup", during)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
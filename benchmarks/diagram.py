@@ -0,0 +1,31 @@
+"""Time layout and SVG rendering of a large group's technique graph.
+
+Run from the repository root: python -m benchmarks.diagram [positions] [techniques] [budget-ms]
+"""
+import random
+import sys
+import timeit
+
+from jiu_jitsu_notes import diagram
+
+
+def main(positions: int = 500, techniques: int = 2000, budget_ms: float = 500, repeat: int = 5) -> None:
+    generator = random.Random(0)
+    nodes = [(node_id, f"Position {node_id}") for node_id in range(1, positions + 1)]
+    edges = [(generator.randint(1, positions), generator.randint(1, positions)) for _ in range(techniques)]
+
+    size = len(diagram.render(nodes, edges))
+    best = min(timeit.repeat(lambda: diagram.render(nodes, edges), number=1, repeat=repeat)) * 1000
+    cached = min(timeit.repeat(lambda: diagram.group_diagram(1, 1, nodes, edges), number=1, repeat=repeat)) * 1000
+
+    print(f"{positions} positions, {techniques} techniques, best of {repeat}")
+    print(f"  layout + render {best:8.2f} ms  {size / 1024:8.1f} KiB  (budget {budget_ms:.0f} ms)")
+    print(f"  cached          {cached:8.2f} ms")
+
+    if best > budget_ms:
+        sys.exit(f"Layout and render took {best:.2f} ms, over the {budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    main(*map(int, arguments[:2]), *map(float, arguments[2:3]))
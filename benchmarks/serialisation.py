@@ -0,0 +1,72 @@
+"""Compare rendering a large group as HTML against serialising it as JSON.
+
+Run from the repository root: python -m benchmarks.serialisation [positions] [techniques-per-position]
+"""
+import sys
+import timeit
+
+import orjson
+from jinja2 import Environment, FileSystemLoader
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import db, serialisers
+from jiu_jitsu_notes.models import Base, Position, PositionGroup, Technique, User
+
+
+def seed(session: Session, positions: int, techniques: int) -> User:
+    user = User(username="bench", email="bench@example.com", password_hash="")
+    group = PositionGroup(name="Guard", description="A large group", user=user)
+
+    session.add(group)
+    session.flush()
+
+    for p in range(positions):
+        position = Position(name=f"Position {p}", description="Description " * 5, user=user, group=group)
+        session.add(position)
+
+        for t in range(techniques):
+            session.add(
+                Technique(name=f"Technique {p}.{t}", description="Details " * 10, user=user, from_position=position)
+            )
+
+    session.commit()
+
+    return user
+
+
+def main(positions: int = 100, techniques: int = 20, repeat: int = 20) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    environment = Environment(loader=FileSystemLoader("templates"))
+    template = environment.get_template("pages/group.html")
+
+    with Session(engine) as session:
+        user_id = seed(session, positions, techniques).id
+
+    include = serialisers.parse_include(PositionGroup, "positions.techniques")
+    options = serialisers.eager_options(PositionGroup, include)
+    sparse = {(): {"name"}, ("positions",): {"name"}, ("positions", "techniques"): {"name"}}
+
+    def html() -> bytes:
+        with Session(engine) as session:
+            user = session.get(User, user_id)
+            group = db.group_by_id(session, user, 1)
+            return template.render(group=group, user=user).encode()
+
+    def json(field_sets: serialisers.FieldSets) -> bytes:
+        with Session(engine) as session:
+            user = session.get(User, user_id)
+            group = db.load_for_user(session, user, PositionGroup, options, id=1)[0]
+            return orjson.dumps(serialisers.serialise(group, include, field_sets))
+
+    print(f"{positions} positions x {techniques} techniques, best of {repeat}")
+
+    for name, function in (("html", html), ("json", lambda: json({})), ("json (sparse)", lambda: json(sparse))):
+        size = len(function())
+        best = min(timeit.repeat(function, number=1, repeat=repeat))
+        print(f"  {name:<14} {best * 1000:8.2f} ms  {size / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,76 @@
+"""Compare per-call overhead of the prebuilt db.py statements against building a Query on every call.
+
+Both sides filter on the same columns, so the difference is only in building the statement. Each is
+reported with its compiled cache hit rate, as SQLAlchemy already caches the compiled form of a
+Query built per call.
+
+Run from the repository root: python -m benchmarks.statements [calls]
+"""
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import db, metrics
+from jiu_jitsu_notes.models import Base, Position, PositionGroup, Technique, Token, User
+
+
+def seed(session: Session) -> tuple[User, str]:
+    token = Token(token=str(uuid.uuid4()), created_at=datetime.utcnow())
+    user = User(username="bench", email="bench@example.com", password_hash="", token=token)
+    group = PositionGroup(name="Guard", description="", user=user)
+    position = Position(name="Closed Guard", description="", user=user, group=group)
+
+    session.add(Technique(name="Armbar", description="", user=user, from_position=position))
+    session.commit()
+
+    return user, token.token
+
+
+def main(calls: int = 20_000) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        user, token = seed(session)
+
+        built_per_call = {
+            "token_from_string": lambda: session.query(Token).filter_by(token=token).first(),
+            "group_by_id": lambda: session.query(PositionGroup).filter_by(id=1, user_id=user.id).first(),
+            "technique_by_id": lambda: session.query(Technique).filter_by(id=1, user_id=user.id).first(),
+        }
+        prebuilt = {
+            "token_from_string": lambda: db.token_from_string(session, token),
+            "group_by_id": lambda: db.group_by_id(session, user, 1),
+            "technique_by_id": lambda: db.technique_by_id(session, user, 1),
+        }
+
+        print(f"{calls} calls each, microseconds per call and compiled cache hit rate")
+
+        for name in prebuilt:
+            timings = []
+            hit_rates = []
+
+            for function in (built_per_call[name], prebuilt[name]):
+                hits, misses = metrics.counter("sql.cache_hit"), metrics.counter("sql.cache_miss")
+                function()
+                started = time.perf_counter()
+
+                for _ in range(calls):
+                    function()
+
+                timings.append((time.perf_counter() - started) / calls * 1_000_000)
+                hits, misses = metrics.counter("sql.cache_hit") - hits, metrics.counter("sql.cache_miss") - misses
+                hit_rates.append(hits / (hits + misses))
+
+            print(
+                f"  {name:<18} query {timings[0]:7.1f} ({hit_rates[0]:7.2%})"
+                f"   prebuilt {timings[1]:7.1f} ({hit_rates[1]:7.2%})   {timings[0] / timings[1]:5.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,53 @@
+"""Compare rendering the group page from ORM instances against rendering it from column-only view models.
+
+Run from the repository root: python -m benchmarks.views [positions] [techniques-per-position] [repeat]
+"""
+import sys
+import timeit
+import tracemalloc
+
+from jinja2 import Environment, FileSystemLoader
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from benchmarks.serialisation import seed
+from jiu_jitsu_notes import db
+from jiu_jitsu_notes.models import Base, User
+
+
+def main(positions: int = 50, techniques: int = 20, repeat: int = 20) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    environment = Environment(loader=FileSystemLoader("templates"))
+    template = environment.get_template("pages/group.html")
+
+    with Session(engine) as session:
+        user_id = seed(session, positions, techniques).id
+
+    def orm() -> str:
+        with Session(engine) as session:
+            user = session.get(User, user_id)
+            return template.render(group=db.group_by_id(session, user, 1), user=user)
+
+    def views() -> str:
+        with Session(engine) as session:
+            user = session.get(User, user_id)
+            return template.render(group=db.group_view(session, user, 1), user=user)
+
+    assert orm() == views()
+
+    print(f"{positions} positions x {techniques} techniques, best of {repeat}")
+
+    for name, function in (("orm", orm), ("views", views)):
+        best = min(timeit.repeat(function, number=1, repeat=repeat))
+
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"  {name:<6} {best * 1000:8.2f} ms  {1 / best:8.1f} req/s  peak {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
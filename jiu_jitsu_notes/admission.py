@@ -0,0 +1,216 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Protocol, Sequence
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from . import auth, db
+
+USER_RATE: float = float(os.environ.get("ADMISSION_USER_RATE", "20"))
+USER_BURST: float = float(os.environ.get("ADMISSION_USER_BURST", "60"))
+IP_RATE: float = float(os.environ.get("ADMISSION_IP_RATE", "40"))
+IP_BURST: float = float(os.environ.get("ADMISSION_IP_BURST", "120"))
+
+MAX_CONCURRENT_REQUESTS: int = int(os.environ.get("ADMISSION_MAX_CONCURRENT", "32"))
+MAX_QUEUED_REQUESTS: int = int(os.environ.get("ADMISSION_MAX_QUEUED", "64"))
+QUEUE_LATENCY_BUDGET: float = float(os.environ.get("ADMISSION_QUEUE_BUDGET", "0.5"))
+TOKEN_CACHE_SECONDS: float = float(os.environ.get("ADMISSION_TOKEN_CACHE", "60"))
+
+# First matching prefix wins; anything unmatched is a full page render.
+ROUTE_COSTS: list[tuple[str, float]] = [
+    ("/css/", 0.0),
+    ("/published/", 0.0),
+    ("/api/auth/", 10.0),
+    ("/api/", 1.0),
+]
+PAGE_COST: float = 5.0
+
+
+def route_cost(path: str) -> float:
+    for prefix, cost in ROUTE_COSTS:
+        if path.startswith(prefix):
+            return cost
+
+    return PAGE_COST
+
+
+# A bucket's key, refill rate in tokens per second and capacity.
+Limit = tuple[str, float, float]
+
+
+class LimiterBackend(Protocol):
+    def take(self, limits: Sequence[Limit], cost: float) -> float:
+        """Spend `cost` tokens from every bucket in `limits`, or from none of them.
+
+        Returns 0 if they were all available, otherwise the number of seconds until they will be.
+        """
+        ...
+
+
+class InMemoryBackend:
+    """Token buckets held in this process. Swap for a shared backend when running several workers.
+
+    At most `max_keys` buckets are kept, forgetting the least recently used first: it has had the
+    longest to refill, so forgetting it, which is the same as refilling it, changes the least.
+    """
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self.max_keys = max_keys
+
+    def take(self, limits: Sequence[Limit], cost: float) -> float:
+        now = time.monotonic()
+        levels = {}
+        retry_after = 0.0
+
+        for key, rate, capacity in limits:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            levels[key] = tokens = min(capacity, tokens + (now - updated) * rate)
+
+            if tokens < cost:
+                retry_after = max(retry_after, (cost - tokens) / rate)
+
+        for key, tokens in levels.items():
+            self.buckets[key] = (tokens if retry_after > 0 else tokens - cost, now)
+            self.buckets.move_to_end(key)
+
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+
+        return retry_after
+
+
+class TokenUsers:
+    """Which user a session token belongs to, if any, caching each answer for `ttl` seconds."""
+
+    def __init__(
+        self,
+        lookup: Callable[[str], Optional[int]],
+        ttl: float = TOKEN_CACHE_SECONDS,
+        max_keys: int = 10_000,
+    ) -> None:
+        self.lookup = lookup
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.cache: OrderedDict[str, tuple[Optional[int], float]] = OrderedDict()
+
+    async def user_id(self, token: str) -> Optional[int]:
+        now = time.monotonic()
+        cached = self.cache.get(token)
+
+        if cached is not None and now - cached[1] < self.ttl:
+            self.cache.move_to_end(token)
+            return cached[0]
+
+        user_id = await run_in_threadpool(self.lookup, token)
+        self.cache[token] = (user_id, now)
+        self.cache.move_to_end(token)
+
+        while len(self.cache) > self.max_keys:
+            self.cache.popitem(last=False)
+
+        return user_id
+
+
+def user_id_for_token(token_string: str) -> Optional[int]:
+    with db.SessionLocal() as session:
+        found = db.token_with_user(session, token_string)
+
+        if found is None or auth.token_is_expired(found[0]):
+            return None
+
+        return found[1].id
+
+
+class AdmissionControlMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: LimiterBackend | None = None,
+        users: TokenUsers | None = None,
+        max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+        max_queued: int = MAX_QUEUED_REQUESTS,
+        queue_budget: float = QUEUE_LATENCY_BUDGET,
+    ) -> None:
+        self.app = app
+        self.backend = backend or InMemoryBackend()
+        self.users = users or TokenUsers(user_id_for_token)
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_budget = queue_budget
+        self.semaphore: asyncio.Semaphore | None = None
+        self.queued = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        cost = route_cost(scope["path"])
+
+        if cost == 0:
+            return await self.app(scope, receive, send)
+
+        retry_after = await self.rate_limit(Request(scope), cost)
+
+        if retry_after > 0:
+            response = PlainTextResponse(
+                "Too many requests",
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+            return await response(scope, receive, send)
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        if not await self.admit(self.semaphore):
+            response = PlainTextResponse(
+                "Server busy",
+                status_code=503,
+                headers={"Retry-After": str(math.ceil(self.queue_budget))},
+            )
+            return await response(scope, receive, send)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.semaphore.release()
+
+    async def rate_limit(self, request: Request, cost: float) -> float:
+        """Charge the client's IP and, once its token checks out, its user; unknown tokens get no bucket of their own."""
+        limits: list[Limit] = []
+
+        if request.client is not None:
+            limits.append((f"ip:{request.client.host}", IP_RATE, IP_BURST))
+
+        token = request.cookies.get("token")
+        user_id = None if token is None else await self.users.user_id(token)
+
+        if user_id is not None:
+            limits.append((f"user:{user_id}", USER_RATE, USER_BURST))
+
+        return self.backend.take(limits, cost) if limits else 0.0
+
+    async def admit(self, semaphore: asyncio.Semaphore) -> bool:
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return True
+
+        if self.queued >= self.max_queued:
+            return False
+
+        self.queued += 1
+
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_budget)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
@@ -1,17 +1,41 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from .db import engine
-from .models import Base
+from . import autosave, db, publishing
+from .admission import AdmissionControlMiddleware
+from .profiling import ProfilingMiddleware
 from .routes import api, pages
 
-Base.metadata.create_all(bind=engine)
+db.create_all()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    autosave_flusher = asyncio.create_task(autosave.buffer.run())
+    publishing.publisher.start()
+
+    yield
+
+    autosave_flusher.cancel()
+    autosave.buffer.flush(force=True)
+    publishing.publisher.stop()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
 app.include_router(pages.router)
 app.include_router(api.router, prefix="/api")
 
 app.mount("/css", StaticFiles(directory="templates/css"), name="static")
+app.mount(
+    publishing.PUBLISHED_URL,
+    publishing.PublishedFiles(directory=publishing.PUBLISH_DIRECTORY, html=True, check_dir=False),
+    name="published",
+)
 
 templates = Jinja2Templates(directory="templates")
@@ -34,15 +34,18 @@ def current_user(
     token_string: Annotated[str, Depends(token_from_cookie)],
     session: Annotated[Session, Depends(db.get_session)],
 ) -> User:
-    token: Token | None = db.token_from_string(session, token_string)
+    found = db.token_with_user(session, token_string)
 
-    if token is None or token_is_expired(token):
+    if found is None or token_is_expired(found[0]):
         raise HTTPException(
             status_code=401,
             detail="Invalid token",
         )
 
-    return token.user
+    _, user, shard = found
+    db.route_to_user(session, user.id, shard)
+
+    return user
 
 
 def password_is_correct(user: User, password: str) -> bool:
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import db, events, position_index
+from .models import Base, Position, PositionGroup, Technique
+
+DEBOUNCE_SECONDS: float = float(os.environ.get("AUTOSAVE_DEBOUNCE", "1.0"))
+MAXIMUM_DELAY_SECONDS: float = float(os.environ.get("AUTOSAVE_MAXIMUM_DELAY", "10.0"))
+
+EDITABLE: dict[str, tuple[type[Base], tuple[str, ...]]] = {
+    "groups": (PositionGroup, ("name", "description")),
+    "positions": (Position, ("name", "description")),
+    "techniques": (Technique, ("name", "description", "to_position_id")),
+}
+
+EditKey = tuple[str, int, int]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingEdit:
+    values: dict[str, Any]
+    shard: str
+    first_buffered: float
+    last_buffered: float = field(default=0.0)
+
+
+class AutosaveBuffer:
+    """Coalesces partial updates per entity and writes the latest values in one transaction per shard.
+
+    Edits are merged in arrival order, so a later keystroke always overwrites an earlier one.
+    Flushes are serialised by `flush_lock`, so a flush can never commit older values over a newer one.
+    `discard` never waits for a flush: it leaves a tombstone that the flush checks after each write.
+    """
+
+    def __init__(self, debounce: float = DEBOUNCE_SECONDS, maximum_delay: float = MAXIMUM_DELAY_SECONDS) -> None:
+        self.debounce = debounce
+        self.maximum_delay = maximum_delay
+        self.pending: dict[EditKey, PendingEdit] = {}
+        self.discarded: set[EditKey] = set()
+        self.discarded_users: set[int] = set()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def buffer(self, kind: str, user_id: int, entity_id: int, values: dict[str, Any], shard: str | None = None) -> None:
+        """Buffer `values` for an entity on `shard`, by default the user's current one.
+
+        An edit is only written to the shard it was made on: if the user has moved since, the id
+        may now belong to another of their entities.
+        """
+        now = time.monotonic()
+        shard = shard or db.shard_router.shard_for(user_id)
+
+        with self.lock:
+            edit = self.pending.get((kind, user_id, entity_id))
+
+            if edit is None or edit.shard != shard:
+                edit = self.pending[(kind, user_id, entity_id)] = PendingEdit({}, shard, now)
+
+            edit.values.update(values)
+            edit.last_buffered = now
+
+    def discard(self, kind: str, user_id: int, entity_id: int) -> None:
+        """Drop buffered edits that a full save or delete is about to supersede, including any being flushed.
+
+        A flush that wrote the edit before this holds its row until it commits, so the caller's own
+        write lands after it; one that writes it afterwards sees the tombstone and rolls it back.
+        """
+        with self.lock:
+            self.pending.pop((kind, user_id, entity_id), None)
+            self.discarded.add((kind, user_id, entity_id))
+
+    def discard_user(self, user_id: int) -> None:
+        """Drop every buffered edit of a user, for when their entity ids no longer mean what they did."""
+        with self.lock:
+            for key in [key for key in self.pending if key[1] == user_id]:
+                del self.pending[key]
+
+            self.discarded_users.add(user_id)
+
+    def was_discarded(self, key: EditKey) -> bool:
+        with self.lock:
+            return key in self.discarded or key[1] in self.discarded_users
+
+    def take_due(self, force: bool) -> dict[EditKey, PendingEdit]:
+        now = time.monotonic()
+
+        with self.lock:
+            due = [
+                key
+                for key, edit in self.pending.items()
+                if force
+                or now - edit.last_buffered >= self.debounce
+                or now - edit.first_buffered >= self.maximum_delay
+            ]
+
+            # Tombstones only matter to edits taken before them, and every such flush has finished.
+            self.discarded.clear()
+            self.discarded_users.clear()
+
+            return {key: self.pending.pop(key) for key in due}
+
+    def flush(self, force: bool = False) -> int:
+        """Write every due edit, dropping any the database rejects rather than retrying them forever.
+
+        Each edit is written under its own savepoint, so one bad edit, such as a technique pointing at
+        a position deleted since it was buffered, can't fail the other users' edits on its shard.
+        A shard whose commit fails has all its edits requeued, since that failure isn't theirs.
+        """
+        with self.flush_lock:
+            edits = self.take_due(force)
+
+            if not edits:
+                return 0
+
+            saved: dict[EditKey, dict[str, Any]] = {}
+
+            for shard, shard_edits in self.by_shard(edits).items():
+                with db.SessionLocal() as session:
+                    session.shard = shard
+                    written = {}
+
+                    for key, values in shard_edits.items():
+                        try:
+                            savepoint = session.begin_nested()
+                            self.write(session, key, values)
+                        except IntegrityError:
+                            savepoint.rollback()
+                            logger.warning("Dropping autosave of %s %s for user %s: %s", key[0], key[2], key[1], values)
+                            continue
+
+                        if self.was_discarded(key):
+                            savepoint.rollback()
+                        else:
+                            savepoint.commit()
+                            written[key] = values
+
+                    try:
+                        session.commit()
+                    except Exception:
+                        logger.exception("Autosave flush to shard %s failed, edits will be retried", shard)
+                        self.requeue(shard, shard_edits)
+                    else:
+                        saved.update(written)
+
+        for (kind, user_id, entity_id), values in saved.items():
+            if kind == "positions" and "name" in values:
+                position_index.position_saved(user_id, entity_id, values["name"])
+
+        for user_id in {user_id for _, user_id, _ in saved}:
+            events.user_data_changed(user_id)
+
+        return len(saved)
+
+    @staticmethod
+    def write(session: Session, key: EditKey, values: dict[str, Any]) -> None:
+        kind, user_id, entity_id = key
+        model, _ = EDITABLE[kind]
+        criteria = (model.id == entity_id, model.user_id == user_id)
+
+        session.execute(
+            update(model).where(*criteria).values(**values),
+            execution_options={"synchronize_session": False},
+        )
+        db.record_changes(session, model, *criteria)
+
+        if model in db.TRIGRAM_MODELS:
+            db.index_trigrams_where(session, model, *criteria)
+
+    def by_shard(self, edits: dict[EditKey, PendingEdit]) -> dict[str, dict[EditKey, dict[str, Any]]]:
+        """Group edits by shard, dropping those made before their user moved to another."""
+        shards: dict[str, dict[EditKey, dict[str, Any]]] = {}
+
+        for key, edit in edits.items():
+            if db.shard_router.shard_for(key[1]) != edit.shard:
+                logger.warning(
+                    "Dropping autosave of %s %s for user %s, who moved off shard %s", key[0], key[2], key[1], edit.shard
+                )
+                continue
+
+            shards.setdefault(edit.shard, {})[key] = edit.values
+
+        return shards
+
+    def requeue(self, shard: str, edits: dict[EditKey, dict[str, Any]]) -> None:
+        now = time.monotonic()
+
+        with self.lock:
+            for key, values in edits.items():
+                if key in self.discarded or key[1] in self.discarded_users:
+                    continue
+
+                edit = self.pending.get(key)
+
+                if edit is None:
+                    self.pending[key] = PendingEdit(values, shard, now, now)
+                elif edit.shard == shard:
+                    edit.values = values | edit.values
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.debounce / 2)
+
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception:
+                logger.exception("Autosave flush failed, edits will be retried")
+
+
+buffer = AutosaveBuffer()
+events.on_user_moved(buffer.discard_user)
@@ -0,0 +1,358 @@
+import argparse
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import ChangeLogState
+from .shards import ShardRouter
+
+BACKUP_DIRECTORY = Path(os.environ.get("BACKUP_DIRECTORY", "backups"))
+BACKUP_RETENTION: int = int(os.environ.get("BACKUP_RETENTION", "7"))
+BACKUP_INTERVAL_HOURS: float = float(os.environ.get("BACKUP_INTERVAL_HOURS", "24"))
+PAGES_PER_STEP: int = int(os.environ.get("BACKUP_PAGES_PER_STEP", "256"))
+STEP_PAUSE_SECONDS: float = float(os.environ.get("BACKUP_STEP_PAUSE", "0.005"))
+
+CHUNK_BYTES = 1024 * 1024
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%SZ"
+SUFFIXES = {"sqlite": ".sqlite3.gz", "postgresql": ".sql.gz"}
+POSTGRES_DUMP_TRAILER = b"-- PostgreSQL database dump complete"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    database: str
+    dialect: str
+    taken_at: datetime
+    path: Path
+
+
+def databases(router: ShardRouter) -> dict[str, Engine]:
+    """Every distinct database: the directory, then each shard that isn't also the directory."""
+    return {"directory": router.directory} | {
+        name: engine for name, engine in router.engines.items() if engine is not router.directory
+    }
+
+
+def snapshot_path(database: str, dialect: str, taken_at: datetime) -> Path:
+    return BACKUP_DIRECTORY / f"{database}-{taken_at.strftime(TIMESTAMP_FORMAT)}{SUFFIXES[dialect]}"
+
+
+def snapshots(database: str | None = None) -> list[Snapshot]:
+    """Snapshots in the backup directory, newest first."""
+    found = []
+
+    for dialect, suffix in SUFFIXES.items():
+        for path in BACKUP_DIRECTORY.glob(f"*{suffix}"):
+            name, _, timestamp = path.name.removesuffix(suffix).rpartition("-")
+
+            try:
+                taken_at = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+
+            if database is None or name == database:
+                found.append(Snapshot(name, dialect, taken_at, path))
+
+    return sorted(found, key=lambda snapshot: (snapshot.taken_at, snapshot.database), reverse=True)
+
+
+def snapshot_at(database: str, at: datetime | None = None) -> Snapshot:
+    """The newest snapshot of `database` taken at or before `at`."""
+    for snapshot in snapshots(database):
+        if at is None or snapshot.taken_at <= at:
+            return snapshot
+
+    raise ValueError(f"No backup of {database!r} taken at or before {at or 'now'}")
+
+
+def rotate(database: str, retention: int = BACKUP_RETENTION) -> list[Path]:
+    expired = [snapshot.path for snapshot in snapshots(database)[retention:]]
+
+    for path in expired:
+        path.unlink(missing_ok=True)
+
+    return expired
+
+
+def sqlite_path(engine: Engine) -> str:
+    if engine.url.database in (None, "", ":memory:"):
+        raise ValueError("In-memory SQLite databases cannot be backed up")
+
+    return engine.url.database
+
+
+def postgres_connection(engine: Engine) -> tuple[str, dict[str, str]]:
+    """A libpq URI for `engine` and the environment to run pg_dump or psql with, keeping the password out of argv."""
+    url = engine.url.set(drivername="postgresql")
+    environment = dict(os.environ)
+
+    if url.password is not None:
+        environment["PGPASSWORD"] = str(url.password)
+
+    return url.set(password=None).render_as_string(hide_password=False), environment
+
+
+def copy_sqlite(
+    source_path: str,
+    destination_path: Path,
+    pages: int = PAGES_PER_STEP,
+    pause: float = STEP_PAUSE_SECONDS,
+) -> None:
+    """Copy a live SQLite database with the online backup API, `pages` pages per step.
+
+    In WAL mode a read transaction is held for the whole copy: it pins one consistent snapshot and
+    never blocks writers. Otherwise each step holds a shared lock only while it copies, and SQLite
+    restarts the copy if another connection commits in between, so quiet periods suit it best.
+    """
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True, isolation_level=None)
+    destination = sqlite3.connect(destination_path)
+    # The copy is scratch space that is compressed next; syncing it would stall the live database's disk.
+    destination.execute("PRAGMA synchronous=OFF")
+
+    try:
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+        if wal:
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+        source.backup(destination, pages=pages, sleep=pause)
+
+        if wal:
+            source.execute("COMMIT")
+    finally:
+        destination.close()
+        source.close()
+
+
+def compress(stream, path: Path) -> None:
+    """Gzip `stream` into `path` in chunks, only replacing `path` once the whole stream is written."""
+    partial = path.with_name(f".{path.name}.partial")
+
+    try:
+        with gzip.open(partial, "wb", compresslevel=6) as destination:
+            shutil.copyfileobj(stream, destination, CHUNK_BYTES)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+    os.replace(partial, path)
+
+
+def snapshot_sqlite(source_path: str, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=path.parent) as scratch:
+        copy = Path(scratch) / "snapshot.sqlite3"
+        copy_sqlite(source_path, copy)
+
+        with copy.open("rb") as stream:
+            compress(stream, path)
+
+
+def snapshot_postgres(engine: Engine, path: Path) -> None:
+    """Stream `pg_dump`, which reads from one repeatable-read snapshot and doesn't block writers."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    uri, environment = postgres_connection(engine)
+
+    with subprocess.Popen(
+        ["pg_dump", "--clean", "--if-exists", "--no-owner", "--dbname", uri],
+        stdout=subprocess.PIPE,
+        env=environment,
+    ) as dump:
+        compress(dump.stdout, path)
+
+    if dump.returncode != 0:
+        path.unlink(missing_ok=True)
+        raise RuntimeError(f"pg_dump exited with status {dump.returncode}")
+
+
+def backup_database(name: str, engine: Engine, taken_at: datetime) -> Path:
+    dialect = engine.dialect.name
+
+    if dialect not in SUFFIXES:
+        raise ValueError(f"Backing up {dialect} databases is not supported")
+
+    path = snapshot_path(name, dialect, taken_at)
+
+    if dialect == "sqlite":
+        snapshot_sqlite(sqlite_path(engine), path)
+    else:
+        snapshot_postgres(engine, path)
+
+    return path
+
+
+def backup_all(retention: int = BACKUP_RETENTION) -> list[Path]:
+    """Back up every database under one timestamp, so a restore can pick a matching set, then rotate."""
+    taken_at = datetime.utcnow().replace(microsecond=0)
+    paths = []
+
+    for name, engine in databases(db.shard_router).items():
+        paths.append(backup_database(name, engine, taken_at))
+        rotate(name, retention)
+        logger.info("Backed up %s to %s", name, paths[-1])
+
+    return paths
+
+
+def decompress(snapshot: Snapshot, scratch: Path) -> Path:
+    """Decompress a snapshot and check it is intact, raising ValueError if not."""
+    restored = scratch / f"{snapshot.database}.restore"
+
+    try:
+        with gzip.open(snapshot.path, "rb") as stream, restored.open("wb") as destination:
+            shutil.copyfileobj(stream, destination, CHUNK_BYTES)
+    except (OSError, EOFError) as error:
+        raise ValueError(f"{snapshot.path.name} is damaged: {error}") from error
+
+    if snapshot.dialect == "sqlite":
+        connection = sqlite3.connect(f"file:{restored}?mode=ro", uri=True)
+
+        try:
+            problems = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+            problems += [str(row) for row in connection.execute("PRAGMA foreign_key_check")]
+        except sqlite3.DatabaseError as error:
+            problems = [str(error)]
+        finally:
+            connection.close()
+
+        if problems != ["ok"]:
+            raise ValueError(f"{snapshot.path.name} failed its integrity check: {'; '.join(problems[:5])}")
+
+    else:
+        with restored.open("rb") as dump:
+            dump.seek(max(0, restored.stat().st_size - 4096))
+
+            if POSTGRES_DUMP_TRAILER not in dump.read():
+                raise ValueError(f"{snapshot.path.name} is a truncated dump")
+
+    return restored
+
+
+def verify(snapshot: Snapshot) -> None:
+    BACKUP_DIRECTORY.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIRECTORY) as scratch:
+        decompress(snapshot, Path(scratch))
+
+
+def restore(snapshot: Snapshot) -> None:
+    """Replace a database with a verified snapshot.
+
+    Stop the app and job workers first: they cache rendered pages, data versions, the search
+    indexes and token lookups per process, so they must be restarted to see the restored data.
+    The change log starts a new epoch, so sync clients discard their copies and download afresh.
+    """
+    engine = databases(db.shard_router)[snapshot.database]
+
+    if engine.dialect.name != snapshot.dialect:
+        raise ValueError(
+            f"{snapshot.path.name} is a {snapshot.dialect} backup but {snapshot.database} is {engine.dialect.name}"
+        )
+
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIRECTORY) as scratch:
+        restored = decompress(snapshot, Path(scratch))
+
+        if snapshot.dialect == "sqlite":
+            source = sqlite3.connect(restored)
+            destination = sqlite3.connect(sqlite_path(engine))
+
+            try:
+                source.backup(destination)
+            finally:
+                destination.close()
+                source.close()
+        else:
+            uri, environment = postgres_connection(engine)
+            subprocess.run(
+                ["psql", "--quiet", "--single-transaction", "--set", "ON_ERROR_STOP=1", "--dbname", uri, "--file", restored],
+                env=environment,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+
+    engine.dispose()
+    ChangeLogState.__table__.create(engine, checkfirst=True)
+
+    with Session(engine) as session:
+        db.start_change_log_epoch(session)
+
+    engine.dispose()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Back up and restore the notes databases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="Back up every database and rotate old snapshots")
+    create.add_argument("--retention", type=int, default=BACKUP_RETENTION)
+
+    commands.add_parser("list", help="Show the available snapshots")
+
+    for name, description in (("verify", "Check snapshots are intact"), ("restore", "Restore databases from snapshots")):
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--database", help="Only this database, by default all of them")
+        command.add_argument(
+            "--at",
+            type=datetime.fromisoformat,
+            help="Use the newest snapshots taken at or before this UTC time",
+        )
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "create":
+        for path in backup_all(arguments.retention):
+            print(path)
+
+    if arguments.command == "list":
+        for snapshot in snapshots():
+            print(f"{snapshot.database}\t{snapshot.taken_at.isoformat()}\t{snapshot.path.stat().st_size}\t{snapshot.path}")
+
+    if arguments.command in ("verify", "restore"):
+        names = [arguments.database] if arguments.database else list(databases(db.shard_router))
+        chosen = [snapshot_at(name, arguments.at) for name in names]
+
+        for snapshot in chosen:
+            verify(snapshot)
+            print(f"{snapshot.path}: ok")
+
+        if arguments.command == "restore":
+            restored = []
+
+            for snapshot in chosen:
+                try:
+                    restore(snapshot)
+                except Exception as error:
+                    logger.exception("Restoring %s from %s failed", snapshot.database, snapshot.path)
+                    pending = [other.database for other in chosen[len(restored) :]]
+                    raise SystemExit(
+                        f"Restoring {snapshot.database} failed: {error}\n"
+                        f"Restored: {', '.join(restored) or 'none'}\n"
+                        f"Not restored: {', '.join(pending)}\n"
+                        "The databases are now from different points in time; restore the rest before starting the app."
+                    ) from error
+
+                restored.append(snapshot.database)
+                print(f"Restored {snapshot.database} from {snapshot.path}")
+
+            print("Restart the app and job workers so they drop data cached from before the restore.")
+
+
+if __name__ == "__main__":
+    main()
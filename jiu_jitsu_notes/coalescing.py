@@ -0,0 +1,286 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, TypeVar
+
+from fastapi.requests import Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import db, events, metrics
+from .models import User
+from .templating import templates
+
+FRAGMENT_CACHE_BYTES: int = int(os.environ.get("FRAGMENT_CACHE_BYTES", str(1024 * 1024)))
+FRAGMENT_CACHE_USERS: int = int(os.environ.get("FRAGMENT_CACHE_USERS", "1000"))
+FRAGMENT_CACHE_TOTAL_BYTES: int = int(os.environ.get("FRAGMENT_CACHE_TOTAL_BYTES", str(64 * 1024 * 1024)))
+FRAGMENT_TTL_SECONDS: float = float(os.environ.get("FRAGMENT_TTL", "60"))
+FIRST_PAGE_WINDOW_SECONDS: float = float(os.environ.get("FIRST_PAGE_WINDOW", "300"))
+FIRST_PAGE_USERS: int = int(os.environ.get("FIRST_PAGE_USERS", "10000"))
+
+T = TypeVar("T")
+
+_versions: dict[int, int] = {}
+_versions_lock = threading.Lock()
+_in_flight: dict[Hashable, asyncio.Future] = {}
+
+
+@events.on_user_data_changed
+def bump_data_version(user_id: int) -> None:
+    with _versions_lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+def data_version(user_id: int) -> int:
+    with _versions_lock:
+        return _versions.get(user_id, 0)
+
+
+async def coalesce(key: Hashable, compute: Callable[[], T]) -> T:
+    """Run `compute` in the threadpool, sharing its result with every caller that asks for `key` meanwhile.
+
+    The computation is its own task, so a leader whose client disconnects doesn't cancel it for the others.
+    """
+    task = _in_flight.get(key)
+
+    if task is None:
+        task = asyncio.ensure_future(run_in_threadpool(compute))
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+        _in_flight[key] = task
+        metrics.increment("coalescing.computed")
+    else:
+        metrics.increment("coalescing.coalesced")
+
+    return await asyncio.shield(task)
+
+
+class FragmentCache:
+    """Rendered pages and fragments, least recently used first, within a byte budget per user and overall.
+
+    Keys end with the data version they were rendered at, so a write in this process makes them
+    unreachable; the user's entries are dropped on the same event to give the memory back straight
+    away. Writes this process never hears of, from another worker, a shard move or a restore, are
+    covered by `ttl`: no fragment is served once it is older than that.
+    """
+
+    def __init__(
+        self,
+        budget: int = FRAGMENT_CACHE_BYTES,
+        maximum_users: int = FRAGMENT_CACHE_USERS,
+        total_budget: int = FRAGMENT_CACHE_TOTAL_BYTES,
+        ttl: float = FRAGMENT_TTL_SECONDS,
+    ) -> None:
+        self.budget = budget
+        self.maximum_users = maximum_users
+        self.total_budget = total_budget
+        self.ttl = ttl
+        self.users: OrderedDict[int, OrderedDict[Hashable, tuple[str, float]]] = OrderedDict()
+        self.sizes: dict[int, int] = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def get(self, user_id: int, key: Hashable) -> str | None:
+        with self.lock:
+            fragments = self.users.get(user_id)
+
+            if fragments is None or key not in fragments:
+                return None
+
+            html, stored_at = fragments[key]
+
+            if time.monotonic() - stored_at > self.ttl:
+                self.remove(user_id, key)
+                metrics.increment("fragments.expired")
+                return None
+
+            self.users.move_to_end(user_id)
+            fragments.move_to_end(key)
+
+            return html
+
+    def put(self, user_id: int, key: Hashable, html: str) -> bool:
+        """Cache `html` unless it alone exceeds the budget, evicting least recently used fragments to fit.
+
+        The user's own fragments make room under their budget, then other users' under the total.
+        """
+        size = sys.getsizeof(html)
+
+        if size > min(self.budget, self.total_budget):
+            return False
+
+        with self.lock:
+            fragments = self.users.setdefault(user_id, OrderedDict())
+            self.users.move_to_end(user_id)
+
+            if key in fragments:
+                self.remove(user_id, key)
+
+            while fragments and self.sizes.get(user_id, 0) + size > self.budget:
+                self.remove(user_id, next(iter(fragments)))
+                metrics.increment("fragments.evicted")
+
+            while self.total + size > self.total_budget:
+                oldest_user, oldest = next((user, entries) for user, entries in self.users.items() if entries)
+                self.remove(oldest_user, next(iter(oldest)))
+                metrics.increment("fragments.evicted")
+
+            fragments[key] = (html, time.monotonic())
+            self.sizes[user_id] = self.sizes.get(user_id, 0) + size
+            self.total += size
+
+            while len(self.users) > self.maximum_users:
+                evicted_user, _ = self.users.popitem(last=False)
+                self.total -= self.sizes.pop(evicted_user, 0)
+
+        return True
+
+    def remove(self, user_id: int, key: Hashable) -> None:
+        """Drop one fragment; the caller holds the lock."""
+        html, _ = self.users[user_id].pop(key)
+        size = sys.getsizeof(html)
+        self.sizes[user_id] -= size
+        self.total -= size
+
+    def free(self, user_id: int) -> int:
+        with self.lock:
+            return min(self.budget - self.sizes.get(user_id, 0), self.total_budget - self.total)
+
+    def discard(self, user_id: int) -> None:
+        with self.lock:
+            self.users.pop(user_id, None)
+            self.total -= self.sizes.pop(user_id, 0)
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "users": len(self.users),
+                "fragments": sum(len(fragments) for fragments in self.users.values()),
+                "bytes": self.total,
+            }
+
+
+fragments = FragmentCache()
+events.on_user_data_changed(fragments.discard)
+events.on_user_moved(bump_data_version)
+events.on_user_moved(fragments.discard)
+
+# The "first page" metrics time the first page or fragment served through `render` after a login,
+# split by whether that login prefetched. Login redirects to the static index, so this is whichever
+# cached view the user opens first. Logins with no such view within FIRST_PAGE_WINDOW_SECONDS are
+# forgotten. Maps user id to (prefetched, login time), oldest login first.
+_first_pages: OrderedDict[int, tuple[bool, float]] = OrderedDict()
+_first_pages_lock = threading.Lock()
+
+
+def expect_first_page(user_id: int, prefetched: bool) -> None:
+    now = time.monotonic()
+
+    with _first_pages_lock:
+        _first_pages.pop(user_id, None)
+        _first_pages[user_id] = (prefetched, now)
+
+        while (
+            len(_first_pages) > FIRST_PAGE_USERS
+            or now - next(iter(_first_pages.values()))[1] > FIRST_PAGE_WINDOW_SECONDS
+        ):
+            _first_pages.popitem(last=False)
+
+
+def first_page(user_id: int) -> bool | None:
+    """Whether this user's login prefetched, if this is their first cached view since it, otherwise None."""
+    with _first_pages_lock:
+        expected = _first_pages.pop(user_id, None)
+
+    if expected is None or time.monotonic() - expected[1] > FIRST_PAGE_WINDOW_SECONDS:
+        return None
+
+    return expected[0]
+
+
+def record_latency(user_id: int, hit: bool, seconds: float) -> None:
+    outcome = "hit" if hit else "miss"
+    metrics.increment(f"fragments.{outcome}")
+    metrics.increment(f"fragments.{outcome}_seconds", seconds)
+
+    prefetched = first_page(user_id)
+
+    if prefetched is not None:
+        cohort = "prefetched" if prefetched else "cold"
+        metrics.increment(f"first_page.{cohort}")
+        metrics.increment(f"first_page.{cohort}_seconds", seconds)
+
+
+def _mean_milliseconds(name: str) -> float | None:
+    count = metrics.counter(name)
+
+    return round(metrics.counter(f"{name}_seconds") / count * 1000, 3) if count else None
+
+
+@metrics.collector("fragments")
+def fragment_cache_stats() -> dict[str, Any]:
+    return fragments.stats() | {
+        "hit_ms": _mean_milliseconds("fragments.hit"),
+        "miss_ms": _mean_milliseconds("fragments.miss"),
+        "first_page_prefetched_ms": _mean_milliseconds("first_page.prefetched"),
+        "first_page_cold_ms": _mean_milliseconds("first_page.cold"),
+    }
+
+
+def fragment_key(
+    user_id: int,
+    method: str,
+    path: str,
+    query: Iterable[tuple[str, str]] = (),
+    version: int | None = None,
+) -> Hashable:
+    """Key for a page or fragment at `version`, by default the user's current data version."""
+    return (user_id, method, path, tuple(sorted(query)), data_version(user_id) if version is None else version)
+
+
+def request_key(request: Request, user: User) -> Hashable:
+    return fragment_key(user.id, request.method, request.url.path, request.query_params.multi_items())
+
+
+def cache_fragment(user_id: int, key: Hashable, html: str) -> bool:
+    """Keep `html` for later requests, unless the user's notes changed while it was rendered."""
+    if key[-1] != data_version(user_id):
+        return False
+
+    return fragments.put(user_id, key, html)
+
+
+async def render(
+    request: Request,
+    user: User,
+    template: str,
+    load: Callable[[Session], dict[str, Any]],
+) -> HTMLResponse:
+    """Load a context with `load` in a fresh session and render `template`, coalescing identical concurrent reads.
+
+    `load` may raise HTTPException, which is raised to every coalesced request. Rendered HTML is
+    kept in the fragment cache, so later requests at the same data version skip `load` entirely.
+    """
+    started = time.perf_counter()
+    key = request_key(request, user)
+    html = fragments.get(user.id, key)
+
+    def compute() -> str:
+        with db.session_for_user(user.id) as session:
+            html = templates.get_template(template).render(load(session))
+
+        cache_fragment(user.id, key, html)
+
+        return html
+
+    hit = html is not None
+
+    if not hit:
+        html = await coalesce(key, compute)
+
+    record_latency(user.id, hit, time.perf_counter() - started)
+
+    return HTMLResponse(html)
@@ -1,18 +1,188 @@
 import os
+import secrets
+import sqlite3
 import uuid
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Sequence
 
 from passlib import hash
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
-
-from .models import Position, PositionGroup, Technique, Token, User
+from sqlalchemy import Engine, bindparam, create_engine, delete, event, func, insert, literal, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+
+from . import events, metrics, trigrams
+from .models import (
+    Base,
+    Change,
+    ChangeLock,
+    ChangeLogState,
+    Position,
+    PositionGroup,
+    Publication,
+    ShardAssignment,
+    Tag,
+    Technique,
+    Token,
+    Trigram,
+    User,
+    position_tags,
+    technique_tags,
+)
+from .shards import ShardedSession, ShardRouter, parse_shards
+from .views import GroupView, PositionView, TechniqueView
 
 DATABASE_URI: str = os.environ.get("DATABASE_URI", "sqlite:///jiu_jitsu_notes.db")
+SHARDS: dict[str, str] = parse_shards(os.environ.get("SHARDS", ""), DATABASE_URI)
 
 engine = create_engine(DATABASE_URI)
-SessionLocal = sessionmaker(bind=engine)
+shard_router = ShardRouter(engine, SHARDS, DATABASE_URI)
+SessionLocal = sessionmaker(class_=ShardedSession, router=shard_router)
+
+
+@event.listens_for(Engine, "connect")
+def configure_sqlite(dbapi_connection, connection_record) -> None:
+    """Enforce foreign keys and use the write-ahead log, so readers such as online backups run alongside the writer."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def count_compiled_cache_use(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None and context.compiled is not None:
+        metrics.increment(f"sql.{context.cache_hit.name.lower()}")
+
+
+@metrics.collector("sql")
+def compiled_cache_stats() -> dict:
+    hits, misses = metrics.counter("sql.cache_hit"), metrics.counter("sql.cache_miss")
+
+    return {
+        "compiled_cache_hit_rate": hits / (hits + misses) if hits + misses else None,
+        "compiled_cache_size": {name: len(shard._compiled_cache or ()) for name, shard in shard_router.engines.items()},
+    }
+
+
+# Statements are built once at import so each call only binds parameters; their compiled forms are
+# then looked up by the same cache key every time instead of a freshly generated one.
+CHANGES_SINCE = (
+    select(Change)
+    .where(Change.user_id == bindparam("user_id"), Change.id > bindparam("since"))
+    .order_by(Change.id)
+    .limit(bindparam("limit"))
+)
+CHANGE_LOCK = select(ChangeLock.user_id).where(ChangeLock.user_id == bindparam("user_id")).with_for_update()
+ENTITIES_BY_IDS = {
+    model: select(model).where(model.user_id == bindparam("user_id"), model.id.in_(bindparam("ids", expanding=True)))
+    for model in (PositionGroup, Position, Technique, Tag)
+}
+ENTITIES_WITH_TAGS_BY_IDS = {model: ENTITIES_BY_IDS[model].options(selectinload(model.tags)) for model in (Position, Technique)}
+GROUP_BY_ID = select(PositionGroup).where(PositionGroup.id == bindparam("group_id"), PositionGroup.user_id == bindparam("user_id"))
+GROUPS_FOR_USER = select(PositionGroup).where(PositionGroup.user_id == bindparam("user_id"))
+GROUP_SUMMARIES = (
+    select(PositionGroup.id, PositionGroup.name, PositionGroup.description)
+    .where(PositionGroup.user_id == bindparam("user_id"))
+    .order_by(PositionGroup.id)
+)
+POSITION_SUMMARIES = (
+    select(Position.id, Position.group_id, Position.name, Position.description)
+    .where(Position.user_id == bindparam("user_id"))
+    .order_by(Position.id)
+)
+TECHNIQUE_SUMMARIES = (
+    select(Technique.id, Technique.name, Technique.description, Technique.from_position_id, Technique.to_position_id)
+    .where(Technique.user_id == bindparam("user_id"))
+    .order_by(Technique.id)
+)
+TECHNIQUE_SUMMARY = (
+    select(Technique.id, Technique.name, Technique.description, Technique.from_position_id, Technique.to_position_id)
+    .where(Technique.id == bindparam("technique_id"), Technique.user_id == bindparam("user_id"))
+)
+TECHNIQUE_TAGS = (
+    select(Tag.name)
+    .join(technique_tags, technique_tags.c.tag_id == Tag.id)
+    .where(technique_tags.c.technique_id == bindparam("technique_id"), Tag.user_id == bindparam("user_id"))
+    .order_by(Tag.name)
+)
+GROUP_HEADER = select(PositionGroup.name, PositionGroup.description).where(
+    PositionGroup.id == bindparam("group_id"), PositionGroup.user_id == bindparam("user_id")
+)
+GROUP_POSITIONS = (
+    select(Position.id, Position.name, Position.description)
+    .where(Position.group_id == bindparam("group_id"), Position.user_id == bindparam("user_id"))
+    .order_by(Position.id)
+)
+GROUP_TECHNIQUES = (
+    select(Technique.id, Technique.name, Technique.description, Technique.from_position_id, Technique.to_position_id)
+    .join(Position, Technique.from_position_id == Position.id)
+    .where(Position.group_id == bindparam("group_id"), Position.user_id == bindparam("user_id"))
+    .order_by(Technique.id)
+)
+GROUP_GRAPH_POSITIONS = select(Position.id, Position.name).where(
+    Position.group_id == bindparam("group_id"), Position.user_id == bindparam("user_id")
+)
+GROUP_GRAPH_EDGES = (
+    select(Technique.from_position_id, Technique.to_position_id)
+    .join(Position, Technique.from_position_id == Position.id)
+    .where(
+        Position.group_id == bindparam("group_id"),
+        Position.user_id == bindparam("user_id"),
+        Technique.to_position_id.is_not(None),
+    )
+)
+POSITION_BY_ID = select(Position).where(Position.id == bindparam("position_id"), Position.user_id == bindparam("user_id"))
+POSITIONS_FOR_USER = select(Position).where(Position.user_id == bindparam("user_id"))
+TECHNIQUE_BY_ID = select(Technique).where(Technique.id == bindparam("technique_id"), Technique.user_id == bindparam("user_id"))
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email")).limit(1)
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username")).limit(1)
+TOKEN_FROM_STRING = select(Token).where(Token.token == bindparam("token"))
+TOKEN_WITH_USER = (
+    select(Token, User, ShardAssignment.shard)
+    .join(User, User.token_id == Token.id)
+    .outerjoin(ShardAssignment, ShardAssignment.user_id == User.id)
+    .where(Token.token == bindparam("token"))
+)
+TAGS_FOR_USER = select(Tag).where(Tag.user_id == bindparam("user_id")).order_by(Tag.name)
+TAGS_NAMED = select(Tag).where(Tag.user_id == bindparam("user_id"), Tag.name.in_(bindparam("names", expanding=True)))
+TECHNIQUE_IDS_FOR_USER = select(Technique.id).where(Technique.user_id == bindparam("user_id"))
+TECHNIQUE_TAG_NAMES = union_all(
+    select(technique_tags.c.technique_id, Tag.name)
+    .join(Tag, technique_tags.c.tag_id == Tag.id)
+    .where(Tag.user_id == bindparam("user_id")),
+    select(Technique.id, Tag.name)
+    .join(position_tags, position_tags.c.position_id == Technique.from_position_id)
+    .join(Tag, position_tags.c.tag_id == Tag.id)
+    .where(Tag.user_id == bindparam("user_id")),
+)
+
+TRIGRAM_MATCHES = (
+    select(Trigram.entity_id, func.count())
+    .where(
+        Trigram.user_id == bindparam("user_id"),
+        Trigram.entity == bindparam("entity"),
+        Trigram.field == bindparam("field"),
+        Trigram.trigram.in_(bindparam("trigrams", expanding=True)),
+    )
+    .group_by(Trigram.entity_id)
+    .having(func.count() >= bindparam("minimum"))
+    .order_by(func.count().desc())
+    .limit(bindparam("limit"))
+)
+TRIGRAM_MATCHES_AMONG = TRIGRAM_MATCHES.where(Trigram.entity_id.in_(bindparam("ids", expanding=True)))
+TRIGRAM_COUNTS = (
+    select(Trigram.entity_id, Trigram.field, func.count())
+    .where(
+        Trigram.user_id == bindparam("user_id"),
+        Trigram.entity == bindparam("entity"),
+        Trigram.entity_id.in_(bindparam("ids", expanding=True)),
+    )
+    .group_by(Trigram.entity_id, Trigram.field)
+)
+NAME_TRIGRAMS_FOR_USER = select(Trigram.entity_id, Trigram.trigram).where(
+    Trigram.user_id == bindparam("user_id"), Trigram.entity == bindparam("entity"), Trigram.field == "name"
+)
 
 
 def get_session():
@@ -23,12 +193,269 @@ def get_session():
         session.close()
 
 
+# The shard each user's sessions were last routed to in this process, to notice moves made by another.
+_routed_shards: dict[int, str] = {}
+
+
+def create_all() -> None:
+    shard_router.create_all()
+
+
+def route_to_user(session: ShardedSession, user_id: int, assigned: Optional[str] = None) -> None:
+    session.shard = shard_router.shard_for(user_id, assigned)
+
+    if _routed_shards.setdefault(user_id, session.shard) != session.shard:
+        _routed_shards[user_id] = session.shard
+        events.user_moved(user_id)
+
+
+def session_for_user(user_id: int) -> ShardedSession:
+    session = SessionLocal()
+    route_to_user(session, user_id)
+
+    return session
+
+
+CHANGE_ENTITIES: dict[type[Base], str] = {
+    PositionGroup: "group",
+    Position: "position",
+    Technique: "technique",
+    Tag: "tag",
+}
+
+
+# Models whose names and descriptions are kept in the trigram index by every helper that writes them.
+TRIGRAM_MODELS: tuple[type[Base], ...] = (Position, Technique)
+
+# Each database has a single change log state row.
+CHANGE_LOG_STATE_ID = 1
+
+
+def lock_change_log(session: Session, user_ids: Iterable[int]) -> None:
+    """Hold each user's change log lock until commit, so their change ids become visible in order.
+
+    Sync cursors are change ids, but Postgres assigns ids on insert rather than on commit: a client
+    could read id N+1 while N is still uncommitted and move its cursor past N for good. With each
+    user's change-logging transactions taking turns, a user's ids commit in the order they were
+    assigned. SQLite's single writer already gives that order, and it ignores FOR UPDATE.
+    """
+    for user_id in sorted(set(user_ids)):
+        if session.execute(CHANGE_LOCK, {"user_id": user_id}).first() is not None:
+            continue
+
+        try:
+            with session.begin_nested():
+                session.execute(insert(ChangeLock).values(user_id=user_id))
+        except IntegrityError:
+            session.execute(CHANGE_LOCK, {"user_id": user_id})
+
+
+def record_change(session: Session, entity: PositionGroup | Position | Technique | Tag, deleted: bool = False) -> None:
+    lock_change_log(session, [entity.user_id])
+    session.add(
+        Change(
+            user_id=entity.user_id,
+            entity=CHANGE_ENTITIES[type(entity)],
+            entity_id=entity.id,
+            deleted=deleted,
+        )
+    )
+
+
+def record_changes(session: Session, model: type[Base], *criteria, deleted: bool = False) -> None:
+    """Append one change per row of `model` matching `criteria`, in a single INSERT ... SELECT."""
+    lock_change_log(session, session.scalars(select(model.user_id).where(*criteria).distinct()))
+    session.execute(
+        insert(Change).from_select(
+            ["user_id", "entity", "entity_id", "deleted"],
+            select(model.user_id, literal(CHANGE_ENTITIES[model]), model.id, literal(deleted)).where(*criteria),
+        )
+    )
+
+
+def trigram_rows(model: type[Base], rows: Sequence[tuple[int, int, str, str]]) -> list[dict]:
+    """Trigram index rows for each (user id, id, name, description) of `model`."""
+    return [
+        {"user_id": user_id, "entity": CHANGE_ENTITIES[model], "field": field, "trigram": trigram, "entity_id": entity_id}
+        for user_id, entity_id, name, description in rows
+        for field, text in (("name", name), ("description", description))
+        for trigram in trigrams.trigrams(text or "")
+    ]
+
+
+def delete_trigrams(session: Session, model: type[Base], ids) -> None:
+    session.execute(
+        delete(Trigram).where(Trigram.entity == CHANGE_ENTITIES[model], Trigram.entity_id.in_(ids)),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def index_trigrams(session: Session, model: type[Base], rows: Sequence[tuple[int, int, str, str]]) -> None:
+    """Replace the indexed trigrams of each (user id, id, name, description) of `model`."""
+    if not rows:
+        return
+
+    delete_trigrams(session, model, [row[1] for row in rows])
+
+    if values := trigram_rows(model, rows):
+        session.execute(insert(Trigram), values)
+
+
+def index_trigrams_of(session: Session, entity: Position | Technique) -> None:
+    index_trigrams(session, type(entity), [(entity.user_id, entity.id, entity.name, entity.description)])
+
+
+def index_trigrams_where(session: Session, model: type[Base], *criteria) -> None:
+    """Reindex every row of `model` matching `criteria`, e.g. after a bulk UPDATE of their names."""
+    rows = session.execute(select(model.user_id, model.id, model.name, model.description).where(*criteria)).all()
+    index_trigrams(session, model, rows)
+
+
+def reindex_trigrams(session: Session) -> int:
+    """Rebuild the whole trigram index on the session's shard, e.g. for notes written before it existed."""
+    indexed = 0
+
+    for model in TRIGRAM_MODELS:
+        session.execute(
+            delete(Trigram).where(Trigram.entity == CHANGE_ENTITIES[model]),
+            execution_options={"synchronize_session": False},
+        )
+        rows = session.execute(select(model.user_id, model.id, model.name, model.description)).all()
+
+        if values := trigram_rows(model, rows):
+            session.execute(insert(Trigram), values)
+
+        indexed += len(rows)
+
+    session.commit()
+
+    return indexed
+
+
+def trigram_matches(
+    session: Session,
+    user: User,
+    model: type[Base],
+    field: str,
+    grams: set[str],
+    minimum: int,
+    limit: int,
+    ids: Optional[list[int]] = None,
+) -> dict[int, int]:
+    """Ids of the user's `model` rows sharing at least `minimum` of `grams` in `field`, with how many they share."""
+    parameters = {
+        "user_id": user.id,
+        "entity": CHANGE_ENTITIES[model],
+        "field": field,
+        "trigrams": sorted(grams),
+        "minimum": minimum,
+        "limit": limit,
+    }
+
+    if ids is None:
+        return dict(session.execute(TRIGRAM_MATCHES, parameters).all())
+
+    return dict(session.execute(TRIGRAM_MATCHES_AMONG, parameters | {"ids": ids}).all())
+
+
+def trigram_counts(session: Session, user: User, model: type[Base], ids: list[int]) -> dict[tuple[int, str], int]:
+    rows = session.execute(TRIGRAM_COUNTS, {"user_id": user.id, "entity": CHANGE_ENTITIES[model], "ids": ids})
+
+    return {(entity_id, field): count for entity_id, field, count in rows}
+
+
+def name_trigrams_for_user(session: Session, user: User, model: type[Base]) -> list[tuple[int, str]]:
+    rows = session.execute(NAME_TRIGRAMS_FOR_USER, {"user_id": user.id, "entity": CHANGE_ENTITIES[model]})
+
+    return [(entity_id, trigram) for entity_id, trigram in rows]
+
+
+def changes_since(session: Session, user: User, since: int, limit: int) -> list[Change]:
+    return list(session.scalars(CHANGES_SINCE, {"user_id": user.id, "since": since, "limit": limit}))
+
+
+def change_log_state(session: Session) -> ChangeLogState:
+    """The state of this database's change log, created and committed on first use."""
+    state = session.get(ChangeLogState, CHANGE_LOG_STATE_ID)
+
+    if state is not None:
+        return state
+
+    try:
+        with session.begin_nested():
+            state = ChangeLogState(id=CHANGE_LOG_STATE_ID, epoch=secrets.token_hex(4), horizon=0)
+            session.add(state)
+    except IntegrityError:
+        return session.get(ChangeLogState, CHANGE_LOG_STATE_ID)
+
+    session.commit()
+
+    return state
+
+
+def start_change_log_epoch(session: Session) -> str:
+    """Start a new epoch of change ids, so cursors issued before it make their clients start over.
+
+    Restoring a backup takes change ids back to an earlier point; without a new epoch a client whose
+    cursor is ahead of the restored log would skip every change made after the restore.
+    """
+    state = change_log_state(session)
+    state.epoch = secrets.token_hex(4)
+    session.commit()
+
+    return state.epoch
+
+
+def compact_changes(session: Session, tombstone_retention: timedelta) -> int:
+    """Delete every change that a later change to the same entity supersedes, then expired deletions.
+
+    Deletions are kept for at least `tombstone_retention`: each run notes the newest change id, and
+    once that note is older than the retention the deletions up to it are dropped and it becomes
+    the horizon, before which cursors can no longer be trusted.
+    """
+    state = change_log_state(session)
+    now = datetime.utcnow()
+    latest = select(func.max(Change.id)).group_by(Change.user_id, Change.entity, Change.entity_id)
+    compacted = session.execute(
+        delete(Change).where(Change.id.not_in(latest)),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+
+    if state.pending_since is not None and now - state.pending_since >= tombstone_retention:
+        compacted += session.execute(
+            delete(Change).where(Change.deleted, Change.id <= state.pending_horizon),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        state.horizon = state.pending_horizon
+        state.pending_since = None
+
+    if state.pending_since is None:
+        state.pending_horizon = session.scalar(select(func.coalesce(func.max(Change.id), 0)))
+        state.pending_since = now
+
+    session.commit()
+
+    return compacted
+
+
+def entities_by_ids(session: Session, user: User, model: type[Base], ids: list[int], with_tags: bool = False) -> list:
+    statement = ENTITIES_WITH_TAGS_BY_IDS[model] if with_tags else ENTITIES_BY_IDS[model]
+
+    return list(session.scalars(statement, {"user_id": user.id, "ids": ids}))
+
+
+def load_for_user(session: Session, user: User, model: type[Base], options: list, **filters) -> list:
+    statement = select(model).filter_by(user_id=user.id, **filters).options(*options).order_by(model.id)
+
+    return list(session.scalars(statement).unique())
+
+
 def group_by_id(session: Session, user: User, group_id: int) -> PositionGroup | None:
-    return session.query(PositionGroup).filter_by(id=group_id, user=user).first()
+    return session.scalars(GROUP_BY_ID, {"group_id": group_id, "user_id": user.id}).first()
 
 
 def all_groups_for_user(session: Session, user: User) -> list[PositionGroup]:
-    return session.query(PositionGroup).filter_by(user=user).all()
+    return list(session.scalars(GROUPS_FOR_USER, {"user_id": user.id}))
 
 
 def create_group(session: Session, user: User, name: str, description: str) -> PositionGroup:
@@ -39,6 +466,9 @@ def create_group(session: Session, user: User, name: str, description: str) -> P
     )
 
     session.add(group)
+    session.flush()
+
+    record_change(session, group)
     session.commit()
 
     return group
@@ -51,17 +481,123 @@ def update_group(session: Session, group: PositionGroup, name: Optional[str], de
     if description is not None:
         group.description = description
 
+    record_change(session, group)
+    session.commit()
+
+    return group
+
+
+def delete_group(session: Session, user: User, group_id: int) -> bool:
+    positions = select(Position.id).where(Position.group_id == group_id, Position.user_id == user.id)
+
+    record_changes(session, Technique, Technique.to_position_id.in_(positions))
+    record_changes(session, Technique, Technique.from_position_id.in_(positions), deleted=True)
+    record_changes(session, Position, Position.id.in_(positions), deleted=True)
+    record_changes(session, PositionGroup, PositionGroup.id == group_id, PositionGroup.user_id == user.id, deleted=True)
+
+    delete_trigrams(session, Technique, select(Technique.id).where(Technique.from_position_id.in_(positions)))
+    delete_trigrams(session, Position, positions)
+
+    session.execute(
+        update(Technique).where(Technique.to_position_id.in_(positions)).values(to_position_id=None),
+        execution_options={"synchronize_session": False},
+    )
+    session.execute(
+        delete(Technique).where(Technique.from_position_id.in_(positions)),
+        execution_options={"synchronize_session": False},
+    )
+    session.execute(
+        delete(Position).where(Position.group_id == group_id, Position.user_id == user.id),
+        execution_options={"synchronize_session": False},
+    )
+    result = session.execute(
+        delete(PositionGroup).where(PositionGroup.id == group_id, PositionGroup.user_id == user.id),
+        execution_options={"synchronize_session": False},
+    )
+
     session.commit()
 
+    return result.rowcount > 0
+
+
+def group_graph(session: Session, user: User, group_id: int) -> tuple[list[tuple[int, str]], list[tuple[int, int]]]:
+    parameters = {"group_id": group_id, "user_id": user.id}
+    positions = session.execute(GROUP_GRAPH_POSITIONS, parameters).all()
+    techniques = session.execute(GROUP_GRAPH_EDGES, parameters).all()
+
+    return [tuple(row) for row in positions], [tuple(row) for row in techniques]
+
+
+def group_views_for_user(session: Session, user: User) -> list[GroupView]:
+    """Every group with its positions' names, read as plain columns rather than ORM instances."""
+    groups = {
+        group_id: GroupView(group_id, name, description)
+        for group_id, name, description in session.execute(GROUP_SUMMARIES, {"user_id": user.id})
+    }
+    positions = session.execute(POSITION_SUMMARIES, {"user_id": user.id})
+
+    for position_id, group_id, name, description in positions:
+        if group_id in groups:
+            groups[group_id].positions.append(PositionView(position_id, name, description))
+
+    return list(groups.values())
+
+
+def group_views_with_techniques(session: Session, user: User) -> list[GroupView]:
+    """Every group, position and technique of the user's, as `group_view` would build each group, in three queries."""
+    groups = group_views_for_user(session, user)
+    positions = {position.id: position for group in groups for position in group.positions}
+
+    for technique in session.execute(TECHNIQUE_SUMMARIES, {"user_id": user.id}):
+        if technique.from_position_id in positions:
+            positions[technique.from_position_id].techniques_from.append(TechniqueView(*technique))
+
+    return groups
+
+
+def group_view(session: Session, user: User, group_id: int) -> GroupView | None:
+    """A group, its positions and their techniques in three column-only queries."""
+    parameters = {"group_id": group_id, "user_id": user.id}
+    row = session.execute(GROUP_HEADER, parameters).first()
+
+    if row is None:
+        return None
+
+    group = GroupView(group_id, row.name, row.description)
+    positions: dict[int, PositionView] = {}
+
+    for position_id, name, description in session.execute(GROUP_POSITIONS, parameters):
+        positions[position_id] = PositionView(position_id, name, description)
+        group.positions.append(positions[position_id])
+
+    for technique in session.execute(GROUP_TECHNIQUES, parameters):
+        positions[technique.from_position_id].techniques_from.append(TechniqueView(*technique))
+
     return group
 
 
+def technique_view(session: Session, user: User, technique_id: int, with_tags: bool = False) -> TechniqueView | None:
+    """A technique's columns, and with `with_tags` its tags' names, without loading ORM instances."""
+    parameters = {"technique_id": technique_id, "user_id": user.id}
+    row = session.execute(TECHNIQUE_SUMMARY, parameters).first()
+
+    if row is None:
+        return None
+
+    technique = TechniqueView(*row)
+
+    if with_tags:
+        technique.tags = list(session.scalars(TECHNIQUE_TAGS, parameters))
+
+    return technique
+
+
 def position_by_id(session: Session, user: User, position_id: int) -> Position | None:
-    return session.query(Position).filter_by(id=position_id, user=user).first()
+    return session.scalars(POSITION_BY_ID, {"position_id": position_id, "user_id": user.id}).first()
 
 
 def all_positions_for_user(session: Session, user: User) -> list[Position]:
-    return session.query(Position).filter_by(user=user).all()
+    return list(session.scalars(POSITIONS_FOR_USER, {"user_id": user.id}))
 
 
 def create_position_in_group(session: Session, user: User, group: PositionGroup, **position_args) -> Position:
@@ -72,13 +608,67 @@ def create_position_in_group(session: Session, user: User, group: PositionGroup,
     )
 
     session.add(position)
+    session.flush()
+
+    record_change(session, position)
+    index_trigrams_of(session, position)
+    session.commit()
+
+    return position
+
+
+def update_position(session: Session, position: Position, name: Optional[str], description: Optional[str]) -> Position:
+    if name is not None:
+        position.name = name
+
+    if description is not None:
+        position.description = description
+
+    record_change(session, position)
+    index_trigrams_of(session, position)
     session.commit()
 
     return position
 
 
+def delete_position(session: Session, user: User, group_id: int, position_id: int) -> bool:
+    position = select(Position.id).where(
+        Position.id == position_id,
+        Position.group_id == group_id,
+        Position.user_id == user.id,
+    )
+
+    record_changes(session, Technique, Technique.to_position_id.in_(position))
+    record_changes(session, Technique, Technique.from_position_id.in_(position), deleted=True)
+    record_changes(session, Position, Position.id.in_(position), deleted=True)
+
+    delete_trigrams(session, Technique, select(Technique.id).where(Technique.from_position_id.in_(position)))
+    delete_trigrams(session, Position, position)
+
+    session.execute(
+        update(Technique).where(Technique.to_position_id.in_(position)).values(to_position_id=None),
+        execution_options={"synchronize_session": False},
+    )
+    session.execute(
+        delete(Technique).where(Technique.from_position_id.in_(position)),
+        execution_options={"synchronize_session": False},
+    )
+    result = session.execute(
+        delete(Position).where(
+            Position.id == position_id,
+            Position.group_id == group_id,
+            Position.user_id == user.id,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+
+    session.commit()
+
+    return result.rowcount > 0
+
+
 def technique_by_id(session: Session, user: User, technique_id: int) -> Technique | None:
-    return session.query(Technique).filter_by(id=technique_id, user=user).first()
+    return session.scalars(TECHNIQUE_BY_ID, {"technique_id": technique_id, "user_id": user.id}).first()
 
 
 def create_technique(
@@ -88,6 +678,7 @@ def create_technique(
     description: str,
     from_position_id: int,
     to_position_id: Optional[int],
+    tags: Sequence[Tag] = (),
 ) -> Technique:
     technique = Technique(
         name=name,
@@ -95,20 +686,88 @@ def create_technique(
         from_position_id=from_position_id,
         to_position_id=to_position_id,
         user=user,
+        tags=list(tags),
     )
 
     session.add(technique)
+    session.flush()
+
+    record_change(session, technique)
+    index_trigrams_of(session, technique)
     session.commit()
 
     return technique
 
 
+def update_technique(
+    session: Session,
+    technique: Technique,
+    name: Optional[str],
+    description: Optional[str],
+    to_position_id: Optional[int],
+    tags: Optional[Sequence[Tag]] = None,
+) -> Technique:
+    if name is not None:
+        technique.name = name
+
+    if description is not None:
+        technique.description = description
+
+    if to_position_id is not None:
+        technique.to_position_id = to_position_id
+
+    if tags is not None:
+        technique.tags = list(tags)
+
+    record_change(session, technique)
+    index_trigrams_of(session, technique)
+    session.commit()
+
+    return technique
+
+
+def delete_technique(session: Session, technique: Technique) -> None:
+    record_change(session, technique, deleted=True)
+    delete_trigrams(session, Technique, [technique.id])
+    session.delete(technique)
+    session.commit()
+
+
+def technique_ids_for_user(session: Session, user: User) -> list[int]:
+    return list(session.scalars(TECHNIQUE_IDS_FOR_USER, {"user_id": user.id}))
+
+
+def all_tags_for_user(session: Session, user: User) -> list[Tag]:
+    return list(session.scalars(TAGS_FOR_USER, {"user_id": user.id}))
+
+
+def technique_tag_names(session: Session, user: User) -> list[tuple[int, str]]:
+    """Every (technique id, tag name) pair, counting tags on the position a technique starts from."""
+    return [(technique_id, name) for technique_id, name in session.execute(TECHNIQUE_TAG_NAMES, {"user_id": user.id})]
+
+
+def tags_named(session: Session, user: User, names: list[str]) -> list[Tag]:
+    """The user's tags called `names`, creating any that don't exist yet."""
+    tags = {tag.name: tag for tag in session.scalars(TAGS_NAMED, {"user_id": user.id, "names": names})}
+    created = [Tag(user_id=user.id, name=name) for name in names if name not in tags]
+
+    if created:
+        session.add_all(created)
+        session.flush()
+
+        for tag in created:
+            tags[tag.name] = tag
+            record_change(session, tag)
+
+    return [tags[name] for name in names]
+
+
 def user_by_email(session: Session, email: str) -> User | None:
-    return session.query(User).filter_by(email=email).first()
+    return session.scalars(USER_BY_EMAIL, {"email": email}).first()
 
 
 def user_by_username(session: Session, username: str) -> User | None:
-    return session.query(User).filter_by(username=username).first()
+    return session.scalars(USER_BY_USERNAME, {"username": username}).first()
 
 
 def create_user(session: Session, username: str, email: str, password: str) -> User | None:
@@ -125,7 +784,14 @@ def create_user(session: Session, username: str, email: str, password: str) -> U
 
 
 def token_from_string(session: Session, token: str) -> Token | None:
-    return session.query(Token).filter_by(token=token).first()
+    return session.scalars(TOKEN_FROM_STRING, {"token": token}).first()
+
+
+def token_with_user(session: Session, token: str) -> tuple[Token, User, Optional[str]] | None:
+    """A token, its user and the shard they're assigned to, if any, in one query."""
+    row = session.execute(TOKEN_WITH_USER, {"token": token}).first()
+
+    return None if row is None else (row[0], row[1], row[2])
 
 
 def create_token_for_user(session: Session, user: User) -> Token:
@@ -146,3 +812,33 @@ def create_token_for_user(session: Session, user: User) -> Token:
 def delete_token_for_user(session: Session, user: User) -> None:
     session.delete(user.token)
     session.commit()
+
+
+def publication_for_user(session: Session, user_id: int) -> Publication | None:
+    return session.get(Publication, user_id)
+
+
+def create_publication(session: Session, user: User) -> Publication:
+    publication = publication_for_user(session, user.id)
+
+    if publication is None:
+        publication = Publication(
+            user_id=user.id,
+            slug=secrets.token_urlsafe(12),
+            published_at=datetime.utcnow(),
+        )
+
+        session.add(publication)
+        session.commit()
+
+    return publication
+
+
+def delete_publication(session: Session, user: User) -> Publication | None:
+    publication = publication_for_user(session, user.id)
+
+    if publication is not None:
+        session.delete(publication)
+        session.commit()
+
+    return publication
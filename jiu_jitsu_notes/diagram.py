@@ -0,0 +1,223 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from html import escape
+
+from . import events
+
+NODE_WIDTH = 160
+NODE_HEIGHT = 36
+HORIZONTAL_GAP = 40
+VERTICAL_GAP = 80
+MARGIN = 20
+MAXIMUM_LABEL_LENGTH = 22
+ORDERING_SWEEPS = 4
+MAXIMUM_CACHED_DIAGRAMS = 256
+
+Node = tuple[int, str]
+Edge = tuple[int, int]
+
+
+def content_hash(nodes: list[Node], edges: list[Edge]) -> str:
+    digest = hashlib.sha256()
+
+    for node_id, name in sorted(nodes):
+        digest.update(f"n{node_id}:{name}\0".encode())
+
+    for from_id, to_id in sorted(edges):
+        digest.update(f"e{from_id}:{to_id}\0".encode())
+
+    return digest.hexdigest()
+
+
+def acyclic_edges(node_ids: list[int], adjacency: dict[int, list[int]]) -> list[Edge]:
+    """Depth-first search that reverses back edges, so the graph can be layered."""
+    state: dict[int, int] = {}
+    edges: list[Edge] = []
+
+    for root in node_ids:
+        if root in state:
+            continue
+
+        state[root] = 1
+        stack = [(root, iter(adjacency[root]))]
+
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+
+            if child is None:
+                state[node] = 2
+                stack.pop()
+            elif state.get(child) == 1:
+                edges.append((child, node))
+            else:
+                edges.append((node, child))
+
+                if child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(adjacency[child])))
+
+    return edges
+
+
+def assign_layers(node_ids: list[int], edges: list[Edge]) -> dict[int, int]:
+    """Longest-path layering over a topological order."""
+    successors: dict[int, list[int]] = {node_id: [] for node_id in node_ids}
+    incoming = dict.fromkeys(node_ids, 0)
+
+    for from_id, to_id in edges:
+        successors[from_id].append(to_id)
+        incoming[to_id] += 1
+
+    layers = dict.fromkeys(node_ids, 0)
+    ready = [node_id for node_id in node_ids if incoming[node_id] == 0]
+
+    while ready:
+        node = ready.pop()
+
+        for child in successors[node]:
+            layers[child] = max(layers[child], layers[node] + 1)
+            incoming[child] -= 1
+
+            if incoming[child] == 0:
+                ready.append(child)
+
+    return layers
+
+
+def order_layers(layers: dict[int, int], edges: list[Edge]) -> list[list[int]]:
+    """Reduce crossings by repeatedly sorting each layer by the barycenter of its neighbours."""
+    rows: list[list[int]] = [[] for _ in range(max(layers.values(), default=-1) + 1)]
+
+    for node_id in sorted(layers):
+        rows[layers[node_id]].append(node_id)
+
+    above: dict[int, list[int]] = {node_id: [] for node_id in layers}
+    below: dict[int, list[int]] = {node_id: [] for node_id in layers}
+
+    for from_id, to_id in edges:
+        below[from_id].append(to_id)
+        above[to_id].append(from_id)
+
+    position = {node_id: index for row in rows for index, node_id in enumerate(row)}
+
+    def sweep(sequence: range, neighbours: dict[int, list[int]]) -> None:
+        for layer in sequence:
+            row = rows[layer]
+
+            def barycenter(node_id: int) -> float:
+                adjacent = neighbours[node_id]
+
+                if not adjacent:
+                    return position[node_id]
+
+                return sum(position[neighbour] for neighbour in adjacent) / len(adjacent)
+
+            row.sort(key=barycenter)
+            position.update((node_id, index) for index, node_id in enumerate(row))
+
+    for _ in range(ORDERING_SWEEPS):
+        sweep(range(1, len(rows)), above)
+        sweep(range(len(rows) - 2, -1, -1), below)
+
+    return rows
+
+
+def layout(nodes: list[Node], edges: list[Edge]) -> tuple[dict[int, tuple[int, int]], int, int]:
+    node_ids = [node_id for node_id, _ in nodes]
+    adjacency: dict[int, list[int]] = {node_id: [] for node_id in node_ids}
+
+    for from_id, to_id in edges:
+        if from_id != to_id and from_id in adjacency and to_id in adjacency:
+            adjacency[from_id].append(to_id)
+
+    layered = acyclic_edges(node_ids, adjacency)
+    rows = order_layers(assign_layers(node_ids, layered), layered)
+
+    widest = max((len(row) for row in rows), default=0)
+    width = widest * (NODE_WIDTH + HORIZONTAL_GAP) - HORIZONTAL_GAP + 2 * MARGIN
+    height = len(rows) * (NODE_HEIGHT + VERTICAL_GAP) - VERTICAL_GAP + 2 * MARGIN
+
+    coordinates: dict[int, tuple[int, int]] = {}
+
+    for layer, row in enumerate(rows):
+        offset = (widest - len(row)) * (NODE_WIDTH + HORIZONTAL_GAP) // 2
+
+        for index, node_id in enumerate(row):
+            coordinates[node_id] = (
+                MARGIN + offset + index * (NODE_WIDTH + HORIZONTAL_GAP),
+                MARGIN + layer * (NODE_HEIGHT + VERTICAL_GAP),
+            )
+
+    return coordinates, max(width, 2 * MARGIN), max(height, 2 * MARGIN)
+
+
+def render(nodes: list[Node], edges: list[Edge]) -> str:
+    coordinates, width, height = layout(nodes, edges)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="6" markerHeight="6" '
+        'orient="auto-start-reverse"><path d="M 0 0 L 10 5 L 0 10 z" fill="#64748b"/></marker></defs>',
+        '<g stroke="#64748b" fill="none">',
+    ]
+
+    for from_id, to_id in set(edges):
+        if from_id == to_id or from_id not in coordinates or to_id not in coordinates:
+            continue
+
+        (x1, y1), (x2, y2) = coordinates[from_id], coordinates[to_id]
+        start_y, end_y = (y1 + NODE_HEIGHT, y2) if y1 <= y2 else (y1, y2 + NODE_HEIGHT)
+        parts.append(
+            f'<line x1="{x1 + NODE_WIDTH // 2}" y1="{start_y}" x2="{x2 + NODE_WIDTH // 2}" y2="{end_y}" '
+            'marker-end="url(#arrow)"/>'
+        )
+
+    parts.append('</g><g font-family="sans-serif" font-size="13" text-anchor="middle">')
+
+    for node_id, name in nodes:
+        x, y = coordinates[node_id]
+        label = name if len(name) <= MAXIMUM_LABEL_LENGTH else name[: MAXIMUM_LABEL_LENGTH - 1] + "…"
+        parts.append(
+            f'<rect x="{x}" y="{y}" width="{NODE_WIDTH}" height="{NODE_HEIGHT}" rx="6" fill="#334155"/>'
+            f'<text x="{x + NODE_WIDTH // 2}" y="{y + NODE_HEIGHT // 2 + 5}" fill="white">'
+            f"<title>{escape(name)}</title>{escape(label)}</text>"
+        )
+
+    parts.append("</g></svg>")
+
+    return "".join(parts)
+
+
+_cache: OrderedDict[tuple[int, int], tuple[str, str]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def group_diagram(user_id: int, group_id: int, nodes: list[Node], edges: list[Edge]) -> tuple[str, str]:
+    """Return (content hash, svg) for a group, rendering only if its graph has changed."""
+    digest = content_hash(nodes, edges)
+    key = (user_id, group_id)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+
+        if cached is not None and cached[0] == digest:
+            _cache.move_to_end(key)
+            return cached
+
+    svg = render(nodes, edges)
+
+    with _cache_lock:
+        _cache[key] = (digest, svg)
+
+        while len(_cache) > MAXIMUM_CACHED_DIAGRAMS:
+            _cache.popitem(last=False)
+
+    return digest, svg
+
+
+@events.on_user_data_changed
+def invalidate(user_id: int) -> None:
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == user_id]:
+            del _cache[key]
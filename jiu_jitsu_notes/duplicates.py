@@ -0,0 +1,200 @@
+import argparse
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy.orm import Session
+
+from . import db, trigrams
+from .models import Base, Position, Technique, User
+
+THRESHOLD: float = float(os.environ.get("DUPLICATE_THRESHOLD", "0.5"))
+MAXIMUM_WARNINGS = 5
+
+# How many of the most similar names by shared trigram count are scored exactly.
+CANDIDATES = 50
+
+REPORTED_MODELS: dict[str, type[Base]] = {"positions": Position, "techniques": Technique}
+
+
+@dataclass(slots=True)
+class Match:
+    id: int
+    name: str
+    similarity: float
+
+
+def possible_duplicates(
+    session: Session,
+    user: User,
+    model: type[Base],
+    name: str,
+    description: str = "",
+    exclude_id: Optional[int] = None,
+) -> list[Match]:
+    """The user's positions or techniques whose names look like `name`, most similar first.
+
+    Candidates come from the trigram index, already narrowed to those sharing enough trigrams
+    to reach the threshold, and descriptions only adjust the ranking of names that matched.
+    """
+    name_trigrams = trigrams.trigrams(name)
+
+    if not name_trigrams:
+        return []
+
+    minimum = trigrams.minimum_shared(len(name_trigrams), THRESHOLD)
+    shared = db.trigram_matches(session, user, model, "name", name_trigrams, minimum, CANDIDATES)
+    shared.pop(exclude_id, None)
+
+    if not shared:
+        return []
+
+    sizes = db.trigram_counts(session, user, model, list(shared))
+    name_similarities = {
+        entity_id: similarity
+        for entity_id, count in shared.items()
+        if (similarity := trigrams.similarity(count, len(name_trigrams), sizes.get((entity_id, "name"), 0))) >= THRESHOLD
+    }
+
+    if not name_similarities:
+        return []
+
+    description_trigrams = trigrams.trigrams(description)
+    description_shared: dict[int, int] = {}
+
+    if description_trigrams:
+        candidates = list(name_similarities)
+        description_shared = db.trigram_matches(
+            session, user, model, "description", description_trigrams, 1, len(candidates), candidates
+        )
+
+    matches = []
+
+    for entity in db.entities_by_ids(session, user, model, list(name_similarities)):
+        description_size = sizes.get((entity.id, "description"), 0)
+        description_similarity = None
+
+        if description_trigrams and description_size:
+            description_similarity = trigrams.similarity(
+                description_shared.get(entity.id, 0), len(description_trigrams), description_size
+            )
+
+        matches.append(Match(entity.id, entity.name, trigrams.blend(name_similarities[entity.id], description_similarity)))
+
+    matches.sort(key=lambda match: (-match.similarity, match.id))
+
+    return matches[:MAXIMUM_WARNINGS]
+
+
+class DisjointSet:
+    def __init__(self) -> None:
+        self.parents: dict[int, int] = {}
+
+    def find(self, item: int) -> int:
+        root = self.parents.setdefault(item, item)
+
+        while self.parents[root] != root:
+            root = self.parents[root]
+
+        while item != root:
+            item, self.parents[item] = self.parents[item], root
+
+        return root
+
+    def union(self, first: int, second: int) -> None:
+        self.parents[self.find(first)] = self.find(second)
+
+
+def similar_pairs(names: dict[int, set[str]], threshold: float = THRESHOLD) -> list[tuple[int, int, float]]:
+    """Every pair of trigram sets with a Jaccard similarity of at least `threshold`.
+
+    A prefix-filtered similarity join: with trigrams ordered rarest first, two sets that similar
+    must share a trigram within the first `size - minimum_shared + 1` of either, so only those
+    prefixes are indexed and probed. Common trigrams like "  t" rarely fall in a prefix, which
+    keeps posting lists short and the join close to linear in the number of trigrams.
+    """
+    frequencies = Counter(trigram for grams in names.values() for trigram in grams)
+    postings: dict[str, list[int]] = {}
+    pairs = []
+
+    for entity_id in sorted(names, key=lambda entity_id: (len(names[entity_id]), entity_id)):
+        grams = names[entity_id]
+        size = len(grams)
+        ordered = sorted(grams, key=lambda trigram: (frequencies[trigram], trigram))
+        prefix = ordered[: size - trigrams.minimum_shared(size, threshold) + 1]
+        candidates: set[int] = set()
+
+        for trigram in prefix:
+            # Sets are visited smallest first, so earlier ones only need checking against the size bound.
+            candidates.update(other for other in postings.get(trigram, ()) if len(names[other]) >= threshold * size)
+            postings.setdefault(trigram, []).append(entity_id)
+
+        for other in candidates:
+            similarity = trigrams.similarity(len(grams & names[other]), size, len(names[other]))
+
+            if similarity >= threshold:
+                pairs.append((other, entity_id, similarity))
+
+    return pairs
+
+
+def merge_suggestions(session: Session, user: User, model: type[Base]) -> list[list[dict[str, Any]]]:
+    """Clusters of the user's positions or techniques whose names are transitively similar."""
+    names: dict[int, set[str]] = {}
+
+    for entity_id, trigram in db.name_trigrams_for_user(session, user, model):
+        names.setdefault(entity_id, set()).add(trigram)
+
+    clusters = DisjointSet()
+
+    for first, second, _ in similar_pairs(names):
+        clusters.union(first, second)
+
+    members: dict[int, list[int]] = {}
+
+    for entity_id in clusters.parents:
+        members.setdefault(clusters.find(entity_id), []).append(entity_id)
+
+    grouped = sorted(sorted(ids) for ids in members.values() if len(ids) > 1)
+    names_by_id = {
+        entity.id: entity.name
+        for entity in db.entities_by_ids(session, user, model, [entity_id for ids in grouped for entity_id in ids])
+    }
+
+    return [[{"id": entity_id, "name": names_by_id[entity_id]} for entity_id in ids] for ids in grouped]
+
+
+def report(session: Session, user: User) -> dict[str, list[list[dict[str, Any]]]]:
+    return {key: merge_suggestions(session, user, model) for key, model in REPORTED_MODELS.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the trigram index and find near-duplicate notes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("reindex", help="Rebuild the trigram index on every shard")
+
+    report_command = commands.add_parser("report", help="Print merge suggestions for a user")
+    report_command.add_argument("user_id", type=int)
+
+    arguments = parser.parse_args()
+    db.create_all()
+
+    if arguments.command == "reindex":
+        for shard in db.shard_router.engines:
+            with db.SessionLocal() as session:
+                session.shard = shard
+                print(f"{shard}: {db.reindex_trigrams(session)} entities indexed")
+
+    if arguments.command == "report":
+        with db.session_for_user(arguments.user_id) as session:
+            user = session.get(User, arguments.user_id)
+
+            for key, clusters in report(session, user).items():
+                for cluster in clusters:
+                    print(f"{key}: " + " | ".join(f"{entity['name']} ({entity['id']})" for entity in cluster))
+
+
+if __name__ == "__main__":
+    main()
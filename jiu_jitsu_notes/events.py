@@ -0,0 +1,31 @@
+from typing import Callable
+
+UserDataListener = Callable[[int], None]
+
+_listeners: list[UserDataListener] = []
+_moved_listeners: list[UserDataListener] = []
+
+
+def on_user_data_changed(listener: UserDataListener) -> UserDataListener:
+    """Register `listener` to be called with a user's id after any of their notes are written."""
+    _listeners.append(listener)
+    return listener
+
+
+def user_data_changed(user_id: int) -> None:
+    for listener in _listeners:
+        listener(user_id)
+
+
+def on_user_moved(listener: UserDataListener) -> UserDataListener:
+    """Register `listener` to be called with a user's id once this process sees their notes on another shard.
+
+    Moving a user reassigns their entity ids, so anything cached by id must be dropped, not updated.
+    """
+    _moved_listeners.append(listener)
+    return listener
+
+
+def user_moved(user_id: int) -> None:
+    for listener in _moved_listeners:
+        listener(user_id)
@@ -0,0 +1,410 @@
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import orjson
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from . import auth, backup, db, serialisers, sync
+from .models import Job, PositionGroup, Token, User
+
+POLL_INTERVAL_SECONDS: float = float(os.environ.get("JOBS_POLL_INTERVAL", "1"))
+LEASE_SECONDS: float = float(os.environ.get("JOBS_LEASE", "600"))
+HEARTBEAT_SECONDS: float = float(os.environ.get("JOBS_HEARTBEAT", str(LEASE_SECONDS / 4)))
+RETRY_BASE_SECONDS: float = float(os.environ.get("JOBS_RETRY_BASE", "5"))
+RETRY_MAXIMUM_SECONDS: float = float(os.environ.get("JOBS_RETRY_MAXIMUM", "3600"))
+EXPORT_DIRECTORY = Path(os.environ.get("EXPORT_DIRECTORY", "exports"))
+EXPORT_RETENTION_HOURS: float = float(os.environ.get("EXPORT_RETENTION_HOURS", "24"))
+
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Handler:
+    function: Callable[[Optional[int], dict[str, Any]], Optional[dict[str, Any]]]
+    concurrency: int
+    max_attempts: int
+
+
+HANDLERS: dict[str, Handler] = {}
+
+# Maintenance jobs the worker enqueues on a timer, deduplicated by an idempotency key per interval.
+SCHEDULE: dict[str, timedelta] = {}
+
+
+def handler(kind: str, concurrency: int = 1, max_attempts: int = 5, every: Optional[timedelta] = None):
+    """Register a job handler. `concurrency` caps how many of this kind run at once across all workers."""
+
+    def register(function):
+        HANDLERS[kind] = Handler(function, concurrency, max_attempts)
+
+        if every is not None:
+            SCHEDULE[kind] = every
+
+        return function
+
+    return register
+
+
+def enqueue(
+    session: Session,
+    kind: str,
+    payload: Optional[dict[str, Any]] = None,
+    user_id: Optional[int] = None,
+    priority: int = PRIORITY_NORMAL,
+    idempotency_key: Optional[str] = None,
+    run_at: Optional[datetime] = None,
+) -> Job:
+    """Queue a job, or return the existing one if `idempotency_key` has been used before."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+
+    if idempotency_key is not None:
+        existing = session.scalars(select(Job).filter_by(idempotency_key=idempotency_key)).first()
+
+        if existing is not None:
+            return existing
+
+    now = datetime.utcnow()
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        user_id=user_id,
+        priority=priority,
+        max_attempts=HANDLERS[kind].max_attempts,
+        idempotency_key=idempotency_key,
+        run_at=run_at or now,
+        created_at=now,
+    )
+
+    session.add(job)
+
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return session.scalars(select(Job).filter_by(idempotency_key=idempotency_key)).one()
+
+    return job
+
+
+def job_for_user(session: Session, user: User, job_id: int) -> Job | None:
+    return session.scalars(select(Job).filter_by(id=job_id, user_id=user.id)).first()
+
+
+def recent_jobs_for_user(session: Session, user: User, limit: int = 20) -> list[Job]:
+    return list(session.scalars(select(Job).filter_by(user_id=user.id).order_by(Job.id.desc()).limit(limit)))
+
+
+def describe(job: Job) -> dict[str, Any]:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat(),
+        "run_at": job.run_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+    }
+
+
+def claim(session: Session, worker: str) -> Job | None:
+    """Lock the highest-priority due job whose kind is under its concurrency limit.
+
+    Claims are a compare-and-set on status that also recounts the kind's running jobs in the same
+    statement, so any number of worker processes can poll the same table without exceeding a limit.
+    On Postgres, claims of one kind also take a transaction-level advisory lock first, since a
+    concurrent claim's new row isn't visible to that recount until it commits.
+    """
+    running = dict(session.execute(select(Job.kind, func.count()).where(Job.status == "running").group_by(Job.kind)).all())
+    saturated = [kind for kind, handler in HANDLERS.items() if running.get(kind, 0) >= handler.concurrency]
+    now = datetime.utcnow()
+
+    candidates = session.execute(
+        select(Job.id, Job.kind)
+        .where(Job.status == "queued", Job.run_at <= now, Job.kind.not_in(saturated))
+        .order_by(Job.priority.desc(), Job.id)
+        .limit(10)
+    ).all()
+
+    for job_id, kind in candidates:
+        if kind not in HANDLERS:
+            continue
+
+        if session.get_bind(Job.__mapper__).dialect.name == "postgresql":
+            session.execute(
+                select(func.pg_advisory_xact_lock(func.hashtext(f"jobs:{kind}"))),
+                bind_arguments={"mapper": Job.__mapper__},
+            )
+
+        others = aliased(Job)
+        running_of_kind = select(func.count()).where(others.kind == kind, others.status == "running").scalar_subquery()
+
+        result = session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued", running_of_kind < HANDLERS[kind].concurrency)
+            .values(status="running", locked_by=worker, locked_at=now, attempts=Job.attempts + 1),
+            execution_options={"synchronize_session": False},
+        )
+        session.commit()
+
+        if result.rowcount == 1:
+            return session.get(Job, job_id)
+
+    return None
+
+
+class Heartbeat:
+    """Refreshes a running job's lease until the job finishes, so only jobs whose worker died are requeued."""
+
+    def __init__(self, job_id: int, worker: str, interval: float = HEARTBEAT_SECONDS) -> None:
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, daemon=True)
+
+    def beat(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                with db.SessionLocal() as session:
+                    renewed = session.execute(
+                        update(Job)
+                        .where(Job.id == self.job_id, Job.locked_by == self.worker, Job.status == "running")
+                        .values(locked_at=datetime.utcnow()),
+                        execution_options={"synchronize_session": False},
+                    )
+                    session.commit()
+            except Exception:
+                logger.exception("Could not renew the lease on job %s", self.job_id)
+                continue
+
+            if renewed.rowcount == 0:
+                logger.warning("Job %s lost its lease while running", self.job_id)
+                return
+
+    def __enter__(self) -> "Heartbeat":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff with full jitter."""
+    return timedelta(seconds=random.uniform(0, min(RETRY_MAXIMUM_SECONDS, RETRY_BASE_SECONDS * 2**attempts)))
+
+
+def run_job(session: Session, job: Job, worker: str) -> bool:
+    """Run a job `worker` claimed and record how it went, unless its lease has since passed to another worker."""
+    job_id = job.id
+
+    with Heartbeat(job_id, worker):
+        try:
+            result = HANDLERS[job.kind].function(job.user_id, json.loads(job.payload))
+        except Exception as error:
+            logger.exception("Job %s (%s) failed on attempt %s", job_id, job.kind, job.attempts)
+            session.rollback()
+
+            outcome: dict[str, Any] = {"error": f"{type(error).__name__}: {error}", "locked_by": None, "locked_at": None}
+
+            if job.attempts < job.max_attempts:
+                outcome |= {"status": "queued", "run_at": datetime.utcnow() + retry_delay(job.attempts)}
+            else:
+                outcome |= {"status": "failed", "finished_at": datetime.utcnow()}
+        else:
+            outcome = {
+                "status": "succeeded",
+                "result": json.dumps(result) if result is not None else None,
+                "error": None,
+                "finished_at": datetime.utcnow(),
+            }
+
+    recorded = session.execute(
+        update(Job).where(Job.id == job_id, Job.locked_by == worker, Job.status == "running").values(**outcome),
+        execution_options={"synchronize_session": False},
+    )
+    session.commit()
+
+    if recorded.rowcount == 0:
+        logger.warning("Job %s finished after losing its lease, so its outcome was discarded", job_id)
+
+    return recorded.rowcount == 1
+
+
+def release_expired_leases(session: Session) -> int:
+    """Requeue jobs whose worker stopped heartbeating, e.g. because the process was killed."""
+    result = session.execute(
+        update(Job)
+        .where(Job.status == "running", Job.locked_at < datetime.utcnow() - timedelta(seconds=LEASE_SECONDS))
+        .values(status="queued", locked_by=None, locked_at=None),
+        execution_options={"synchronize_session": False},
+    )
+    session.commit()
+
+    return result.rowcount
+
+
+def schedule_maintenance(session: Session) -> None:
+    now = datetime.utcnow()
+
+    for kind, every in SCHEDULE.items():
+        slot = int(now.timestamp() // every.total_seconds())
+        enqueue(session, kind, priority=PRIORITY_LOW, idempotency_key=f"{kind}:{slot}")
+
+
+@handler("delete_expired_tokens", every=timedelta(hours=1))
+def delete_expired_tokens(user_id: Optional[int], payload: dict[str, Any]) -> dict[str, Any]:
+    expired = select(Token.id).where(Token.created_at < datetime.utcnow() - auth.MAXIMUM_TOKEN_AGE)
+
+    with db.SessionLocal() as session:
+        # Databases created before users.token_id had ON DELETE SET NULL still need the update.
+        session.execute(
+            update(User).where(User.token_id.in_(expired)).values(token_id=None),
+            execution_options={"synchronize_session": False},
+        )
+        result = session.execute(
+            delete(Token).where(Token.id.in_(expired)),
+            execution_options={"synchronize_session": False},
+        )
+        session.commit()
+
+    return {"deleted": result.rowcount}
+
+
+@handler("compact_changes", every=timedelta(seconds=sync.COMPACTION_INTERVAL_SECONDS))
+def compact_changes(user_id: Optional[int], payload: dict[str, Any]) -> dict[str, Any]:
+    return {"compacted": sync.compact_all_shards()}
+
+
+# Backups of large databases can outlast LEASE_SECONDS; the worker's heartbeat keeps renewing the lease.
+@handler("backup", max_attempts=3, every=timedelta(hours=backup.BACKUP_INTERVAL_HOURS))
+def backup_databases(user_id: Optional[int], payload: dict[str, Any]) -> dict[str, Any]:
+    return {"files": [path.name for path in backup.backup_all()]}
+
+
+@handler("export", concurrency=2, max_attempts=3)
+def export(user_id: Optional[int], payload: dict[str, Any]) -> dict[str, Any]:
+    include = serialisers.parse_include(PositionGroup, "positions.techniques")
+
+    with db.session_for_user(user_id) as session:
+        user = session.get(User, user_id)
+        groups = db.load_for_user(session, user, PositionGroup, serialisers.eager_options(PositionGroup, include))
+        document = [serialisers.serialise(group, include, {}) for group in groups]
+
+    EXPORT_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    path = EXPORT_DIRECTORY / f"{user_id}-{payload['export_id']}.json"
+    path.write_bytes(orjson.dumps({"groups": document}))
+
+    return {"file": path.name, "groups": len(document)}
+
+
+@handler("expire_exports", every=timedelta(hours=1))
+def expire_exports(user_id: Optional[int], payload: dict[str, Any]) -> dict[str, Any]:
+    """Delete export files older than EXPORT_RETENTION_HOURS; their jobs then report no download."""
+    cutoff = time.time() - EXPORT_RETENTION_HOURS * 3600
+    expired = [path for path in EXPORT_DIRECTORY.glob("*.json") if path.stat().st_mtime < cutoff]
+
+    for path in expired:
+        path.unlink(missing_ok=True)
+
+    return {"deleted": len(expired)}
+
+
+def export_path(job: Job) -> Path | None:
+    if job.kind != "export" or job.status != "succeeded" or not job.result:
+        return None
+
+    return EXPORT_DIRECTORY / json.loads(job.result)["file"]
+
+
+class Worker:
+    def __init__(self, concurrency: int, poll_interval: float = POLL_INTERVAL_SECONDS) -> None:
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stopped = threading.Event()
+
+    def work(self, index: int) -> None:
+        name = f"{self.name}:{index}"
+
+        while not self.stopped.is_set():
+            with db.SessionLocal() as session:
+                job = claim(session, name)
+
+                if job is not None:
+                    run_job(session, job, name)
+                    continue
+
+            self.stopped.wait(self.poll_interval)
+
+    def run(self) -> None:
+        threads = [threading.Thread(target=self.work, args=(index,), daemon=True) for index in range(self.concurrency)]
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not self.stopped.is_set():
+                with db.SessionLocal() as session:
+                    release_expired_leases(session)
+                    schedule_maintenance(session)
+
+                self.stopped.wait(max(self.poll_interval, 30))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stopped.set()
+
+            for thread in threads:
+                thread.join()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Run and enqueue background jobs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="Process queued jobs until interrupted")
+    worker.add_argument("--concurrency", type=int, default=2)
+
+    enqueue_command = commands.add_parser("enqueue", help="Queue a job")
+    enqueue_command.add_argument("kind", choices=list(HANDLERS))
+    enqueue_command.add_argument("--payload", type=json.loads, default={})
+    enqueue_command.add_argument("--user-id", type=int)
+    enqueue_command.add_argument("--priority", type=int, default=PRIORITY_NORMAL)
+
+    arguments = parser.parse_args()
+    db.create_all()
+
+    if arguments.command == "worker":
+        Worker(arguments.concurrency).run()
+
+    if arguments.command == "enqueue":
+        with db.SessionLocal() as session:
+            job = enqueue(session, arguments.kind, arguments.payload, arguments.user_id, arguments.priority)
+            print(f"Queued job {job.id}")
+
+
+if __name__ == "__main__":
+    main()
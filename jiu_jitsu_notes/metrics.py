@@ -0,0 +1,36 @@
+import threading
+from collections import defaultdict
+from typing import Any, Callable
+
+Collector = Callable[[], dict[str, Any]]
+
+_counters: defaultdict[str, float] = defaultdict(int)
+_counters_lock = threading.Lock()
+_collectors: dict[str, Collector] = {}
+
+
+def increment(name: str, amount: float = 1) -> None:
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def counter(name: str) -> float:
+    with _counters_lock:
+        return _counters[name]
+
+
+def collector(name: str) -> Callable[[Collector], Collector]:
+    """Register a function whose result is reported under `name` alongside the counters."""
+
+    def register(function: Collector) -> Collector:
+        _collectors[name] = function
+        return function
+
+    return register
+
+
+def snapshot() -> dict[str, Any]:
+    with _counters_lock:
+        counters = dict(_counters)
+
+    return {"counters": counters} | {name: function() for name, function in _collectors.items()}
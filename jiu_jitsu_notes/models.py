@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import Column, ForeignKey, Index, Table, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -13,11 +13,11 @@ class User(Base):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    username: Mapped[str]
-    email: Mapped[str]
+    username: Mapped[str] = mapped_column(index=True)
+    email: Mapped[str] = mapped_column(index=True)
     password_hash: Mapped[str]
 
-    token_id: Mapped[Optional[int]] = mapped_column(ForeignKey("tokens.id"))
+    token_id: Mapped[Optional[int]] = mapped_column(ForeignKey("tokens.id", ondelete="SET NULL"), index=True)
     token: Mapped[Optional["Token"]] = relationship(back_populates="user")
 
     groups: Mapped[list["PositionGroup"]] = relationship(back_populates="user")
@@ -31,66 +31,191 @@ class Token(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     user: Mapped[User] = relationship(back_populates="token", uselist=False)
 
-    token: Mapped[str]
+    token: Mapped[str] = mapped_column(unique=True)
     created_at: Mapped[datetime]
 
 
+class ShardAssignment(Base):
+    __tablename__ = "shard_assignments"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    shard: Mapped[str] = mapped_column(index=True)
+
+
+class Publication(Base):
+    __tablename__ = "publications"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    slug: Mapped[str] = mapped_column(unique=True)
+    published_at: Mapped[datetime]
+
+
 class PositionGroup(Base):
     __tablename__ = "position_groups"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     user: Mapped[User] = relationship(back_populates="groups")
 
     name: Mapped[str]
     description: Mapped[str]
 
-    positions: Mapped[list["Position"]] = relationship(back_populates="group")
+    positions: Mapped[list["Position"]] = relationship(back_populates="group", passive_deletes=True)
 
 
 class Position(Base):
     __tablename__ = "positions"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     user: Mapped[User] = relationship(back_populates="positions")
 
     name: Mapped[str]
     description: Mapped[str]
     submission: Mapped[bool] = mapped_column(default=False)
 
-    group_id: Mapped[int | None] = mapped_column(ForeignKey("position_groups.id"))
+    group_id: Mapped[int | None] = mapped_column(ForeignKey("position_groups.id", ondelete="CASCADE"), index=True)
     group: Mapped[PositionGroup | None] = relationship(back_populates="positions")
 
     techniques_from: Mapped[list["Technique"]] = relationship(
         back_populates="from_position",
         foreign_keys="Technique.from_position_id",
+        passive_deletes=True,
     )
 
     techniques_to: Mapped[list["Technique"]] = relationship(
         back_populates="to_position",
         foreign_keys="Technique.to_position_id",
+        passive_deletes=True,
     )
 
+    tags: Mapped[list["Tag"]] = relationship(secondary="position_tags", back_populates="positions", passive_deletes=True)
+
 
 class Technique(Base):
     __tablename__ = "techniques"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     user: Mapped[User] = relationship(back_populates="techniques")
 
     name: Mapped[str]
     description: Mapped[str]
 
-    from_position_id: Mapped[int | None] = mapped_column(ForeignKey("positions.id"))
+    from_position_id: Mapped[int | None] = mapped_column(ForeignKey("positions.id", ondelete="CASCADE"), index=True)
     from_position: Mapped[Position | None] = relationship(
         back_populates="techniques_from",
         foreign_keys=[from_position_id],
     )
 
-    to_position_id: Mapped[int | None] = mapped_column(ForeignKey("positions.id"))
+    to_position_id: Mapped[int | None] = mapped_column(ForeignKey("positions.id", ondelete="SET NULL"), index=True)
     to_position: Mapped[Position | None] = relationship(
         back_populates="techniques_to",
         foreign_keys=[to_position_id],
     )
+
+    tags: Mapped[list["Tag"]] = relationship(secondary="technique_tags", back_populates="techniques", passive_deletes=True)
+
+
+technique_tags = Table(
+    "technique_tags",
+    Base.metadata,
+    Column("technique_id", ForeignKey("techniques.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+position_tags = Table(
+    "position_tags",
+    Base.metadata,
+    Column("position_id", ForeignKey("positions.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    __table_args__ = (UniqueConstraint("user_id", "name"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+
+    name: Mapped[str]
+
+    techniques: Mapped[list[Technique]] = relationship(
+        secondary=technique_tags,
+        back_populates="tags",
+        passive_deletes=True,
+    )
+    positions: Mapped[list[Position]] = relationship(
+        secondary=position_tags,
+        back_populates="tags",
+        passive_deletes=True,
+    )
+
+
+class Change(Base):
+    __tablename__ = "changes"
+    __table_args__ = (
+        Index("ix_changes_user_id_id", "user_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+
+    entity: Mapped[str]
+    entity_id: Mapped[int]
+    deleted: Mapped[bool] = mapped_column(default=False)
+
+
+class ChangeLock(Base):
+    __tablename__ = "change_locks"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+
+
+class ChangeLogState(Base):
+    __tablename__ = "change_log_state"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    epoch: Mapped[str]
+
+    horizon: Mapped[int] = mapped_column(default=0)
+    pending_horizon: Mapped[Optional[int]]
+    pending_since: Mapped[Optional[datetime]]
+
+
+class Trigram(Base):
+    __tablename__ = "trigrams"
+    __table_args__ = (Index("ix_trigrams_entity_entity_id", "entity", "entity_id", "field"),)
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    entity: Mapped[str] = mapped_column(primary_key=True)
+    field: Mapped[str] = mapped_column(primary_key=True)
+    trigram: Mapped[str] = mapped_column(primary_key=True)
+    entity_id: Mapped[int] = mapped_column(primary_key=True)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_priority_id", "status", "priority", "id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"), index=True)
+
+    kind: Mapped[str]
+    payload: Mapped[str]
+    result: Mapped[Optional[str]]
+    error: Mapped[Optional[str]]
+
+    status: Mapped[str] = mapped_column(default="queued")
+    priority: Mapped[int] = mapped_column(default=0)
+    attempts: Mapped[int] = mapped_column(default=0)
+    max_attempts: Mapped[int]
+    idempotency_key: Mapped[Optional[str]] = mapped_column(unique=True)
+
+    run_at: Mapped[datetime]
+    created_at: Mapped[datetime]
+    locked_by: Mapped[Optional[str]]
+    locked_at: Mapped[Optional[datetime]]
+    finished_at: Mapped[Optional[datetime]]
@@ -0,0 +1,94 @@
+import re
+from bisect import bisect_left, insort
+
+from sqlalchemy.orm import Session
+
+from . import db, events
+from .models import User
+
+MAXIMUM_RESULTS = 10
+
+_WHITESPACE = re.compile(r"[\s\-_]+")
+
+
+def normalise(name: str) -> str:
+    return _WHITESPACE.sub(" ", name.casefold()).strip()
+
+
+class PositionIndex:
+    """Sorted array of normalised position names, searched by prefix with bisect."""
+
+    def __init__(self) -> None:
+        self.entries: list[tuple[str, int]] = []
+        self.names: dict[int, str] = {}
+
+    def add(self, position_id: int, name: str) -> None:
+        if position_id in self.names:
+            self.remove(position_id)
+
+        self.names[position_id] = name
+        insort(self.entries, (normalise(name), position_id))
+
+    def remove(self, position_id: int) -> None:
+        name = self.names.pop(position_id, None)
+
+        if name is None:
+            return
+
+        entry = (normalise(name), position_id)
+        index = bisect_left(self.entries, entry)
+
+        if index < len(self.entries) and self.entries[index] == entry:
+            del self.entries[index]
+
+    def search(self, prefix: str, limit: int) -> list[tuple[int, str]]:
+        prefix = normalise(prefix)
+        matches: list[tuple[int, str]] = []
+
+        for key, position_id in self.entries[bisect_left(self.entries, (prefix,)) :]:
+            if not key.startswith(prefix) or len(matches) >= limit:
+                break
+
+            matches.append((position_id, self.names[position_id]))
+
+        return matches
+
+
+_indexes: dict[int, PositionIndex] = {}
+
+
+def index_for_user(session: Session, user: User) -> PositionIndex:
+    index = _indexes.get(user.id)
+
+    if index is None:
+        index = PositionIndex()
+
+        for position in db.all_positions_for_user(session, user):
+            index.add(position.id, position.name)
+
+        _indexes[user.id] = index
+
+    return index
+
+
+def search(session: Session, user: User, prefix: str, limit: int = MAXIMUM_RESULTS) -> list[tuple[int, str]]:
+    return index_for_user(session, user).search(prefix, limit)
+
+
+def position_saved(user_id: int, position_id: int, name: str) -> None:
+    index = _indexes.get(user_id)
+
+    if index is not None:
+        index.add(position_id, name)
+
+
+def position_deleted(user_id: int, position_id: int) -> None:
+    index = _indexes.get(user_id)
+
+    if index is not None:
+        index.remove(position_id)
+
+
+@events.on_user_moved
+def invalidate(user_id: int) -> None:
+    _indexes.pop(user_id, None)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from functools import partial
+from typing import Any, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+from . import coalescing, db, metrics
+from .models import User
+from .templating import templates
+from .views import GroupView
+
+# Share of logins that prefetch; the rest are held back as the cold cohort that first-page latency
+# is compared against. Set to 1 to prefetch for everyone once the comparison has been made.
+PREFETCH_RATE: float = float(os.environ.get("PREFETCH_RATE", "0.9"))
+
+logger = logging.getLogger(__name__)
+
+# The event loop only keeps weak references to tasks, so running prefetches are held here.
+_tasks: set[asyncio.Task] = set()
+
+
+def pages(user: User, groups: list[GroupView]) -> list[tuple[str, str, dict[str, Any]]]:
+    """(path, template, context) of the pages a session usually opens with, as `routes/pages.py` renders them."""
+    return [("/groups", "pages/all_groups.html", {"user": user, "groups": groups})] + [
+        (f"/groups/{group.id}", "pages/group.html", {"group": group, "user": user}) for group in groups
+    ]
+
+
+def load_working_set(user_id: int) -> tuple[User, list[GroupView]]:
+    with db.session_for_user(user_id) as session:
+        user = session.get(User, user_id)
+
+        return user, db.group_views_with_techniques(session, user)
+
+
+def render_page(user_id: int, key: Hashable, template: str, context: dict[str, Any]) -> str:
+    html = templates.get_template(template).render(context)
+
+    # Don't evict pages this prefetch has already cached to make room for less likely ones.
+    if sys.getsizeof(html) <= coalescing.fragments.free(user_id):
+        coalescing.cache_fragment(user_id, key, html)
+
+    return html
+
+
+async def warm(user_id: int) -> int:
+    """Render the user's pages into the fragment cache, stopping once their budget is full.
+
+    Each page is rendered through `coalescing.coalesce`, so a request that arrives for it meanwhile
+    waits for the prefetch instead of rendering it again. Returns how many pages were cached.
+    """
+    started = time.perf_counter()
+    version = coalescing.data_version(user_id)
+    user, groups = await run_in_threadpool(load_working_set, user_id)
+    cached = 0
+
+    for path, template, context in pages(user, groups):
+        key = coalescing.fragment_key(user_id, "GET", path, version=version)
+
+        if coalescing.fragments.get(user_id, key) is None:
+            await coalescing.coalesce(key, partial(render_page, user_id, key, template, context))
+
+            if coalescing.fragments.get(user_id, key) is None:
+                break
+
+        cached += 1
+
+    metrics.increment("prefetch.runs")
+    metrics.increment("prefetch.pages", cached)
+    metrics.increment("prefetch.seconds", time.perf_counter() - started)
+
+    return cached
+
+
+def finished(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Prefetching after login failed", exc_info=task.exception())
+
+
+def schedule(user_id: int) -> None:
+    """Start warming a user's pages in the background, e.g. straight after they log in."""
+    prefetched = random.random() < PREFETCH_RATE
+    coalescing.expect_first_page(user_id, prefetched)
+
+    if prefetched:
+        task = asyncio.ensure_future(warm(user_id))
+        _tasks.add(task)
+        task.add_done_callback(finished)
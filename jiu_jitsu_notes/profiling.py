@@ -0,0 +1,268 @@
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import FrameType
+from typing import Any, Iterator
+
+import jinja2
+from sqlalchemy import Engine, event
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILING_TOKEN: str | None = os.environ.get("PROFILING_TOKEN") or None
+PROFILE_DIRECTORY = Path(os.environ.get("PROFILE_DIRECTORY", "profiles"))
+PROFILE_RETENTION: int = int(os.environ.get("PROFILE_RETENTION", "50"))
+SAMPLE_INTERVAL_SECONDS: float = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.001"))
+
+Interval = tuple[str, float, float]
+
+
+@dataclass
+class Recording:
+    started: float = field(default_factory=time.perf_counter)
+    queries: list[Interval] = field(default_factory=list)
+    templates: list[Interval] = field(default_factory=list)
+
+
+_recording: ContextVar[Recording | None] = ContextVar("profiling_recording", default=None)
+
+
+def token_matches(supplied: str | None) -> bool:
+    return PROFILING_TOKEN is not None and supplied is not None and secrets.compare_digest(supplied, PROFILING_TOKEN)
+
+
+def is_admin(request: Request) -> bool:
+    """Admins send the token in an X-Profile header or the `profile` cookie, never in a URL."""
+    return token_matches(request.headers.get("x-profile")) or token_matches(request.cookies.get("profile"))
+
+
+def wants_profile(request: Request) -> bool:
+    """A header profiles every request it's sent with; the cookie only those flagged with ?profile."""
+    return token_matches(request.headers.get("x-profile")) or (
+        "profile" in request.query_params and token_matches(request.cookies.get("profile"))
+    )
+
+
+def require_admin(request: Request) -> None:
+    if not is_admin(request):
+        raise HTTPException(
+            status_code=404,
+            detail="Not found",
+        )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _recording.get() is not None:
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany) -> None:
+    recording = _recording.get()
+    started = conn.info.get("profiling_started")
+
+    if recording is not None and started:
+        recording.queries.append((statement, started.pop(), time.perf_counter()))
+
+
+class ProfiledTemplate(jinja2.Template):
+    """Records how long each template, including every `{% include %}`, takes to render.
+
+    Loaders build every template through `from_code`, and includes render through the
+    template's `root_render_func`, so wrapping that once per loaded template times both.
+    """
+
+    @classmethod
+    def from_code(cls, environment, code, globals, uptodate=None):
+        template = super().from_code(environment, code, globals, uptodate)
+        render = template.root_render_func
+
+        def root_render_func(context):
+            recording = _recording.get()
+
+            if recording is None:
+                return render(context)
+
+            return _timed(render(context), template.name, recording)
+
+        template.root_render_func = root_render_func
+
+        return template
+
+
+def _timed(events: Iterator[str], name: str, recording: Recording) -> Iterator[str]:
+    started = time.perf_counter()
+
+    try:
+        yield from events
+    finally:
+        recording.templates.append((name, started, time.perf_counter()))
+
+
+class Sampler(threading.Thread):
+    """Samples one thread's stack, keeping only samples taken while it runs inside `frame`.
+
+    Concurrent requests share the event loop thread, so a sample only belongs to this request
+    if the request's own coroutine frame is on the stack. Work the request hands to the
+    threadpool isn't sampled, but still shows up on the SQL and Templates tracks.
+    """
+
+    def __init__(self, interval: float, thread_id: int, frame: FrameType) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.thread_id = thread_id
+        self.frame = frame
+        self.samples: list[tuple[float, list[tuple[str, str, int]]]] = []
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            inside = False
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, frame.f_lineno))
+                inside = inside or frame is self.frame
+                frame = frame.f_back
+
+            if inside:
+                stack.reverse()
+                self.samples.append((now, stack))
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+def speedscope(name: str, recording: Recording, sampler: Sampler, ended: float) -> dict[str, Any]:
+    frames: list[dict[str, Any]] = []
+    frame_indexes: dict[tuple[str, str, int], int] = {}
+
+    def frame_index(key: tuple[str, str, int]) -> int:
+        if key not in frame_indexes:
+            frame_indexes[key] = len(frames)
+            frames.append({"name": key[0], "file": key[1], "line": key[2]})
+
+        return frame_indexes[key]
+
+    profiles: list[dict[str, Any]] = [
+        {
+            "type": "sampled",
+            "name": "Request",
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": ended - recording.started,
+            "samples": [[frame_index(key) for key in stack] for _, stack in sampler.samples],
+            "weights": [sampler.interval] * len(sampler.samples),
+        }
+    ]
+
+    for profile_name, intervals in (("SQL", recording.queries), ("Templates", recording.templates)):
+        events = []
+
+        for label, started, finished in intervals:
+            index = frame_index((label[:200], profile_name, 0))
+            events.append({"type": "O", "frame": index, "at": started - recording.started})
+            events.append({"type": "C", "frame": index, "at": finished - recording.started})
+
+        events.sort(key=lambda event: (event["at"], event["type"] == "O"))
+        profiles.append(
+            {
+                "type": "evented",
+                "name": profile_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": ended - recording.started,
+                "events": events,
+            }
+        )
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "jiu-jitsu-notes",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+def profile_id(name: str) -> str:
+    return time.strftime("%Y%m%dT%H%M%S") + f"-{time.time_ns() % 1_000_000_000:09d}-" + re.sub(r"\W+", "-", name).strip("-")
+
+
+def save_profile(identifier: str, profile: dict[str, Any], summary: dict[str, Any]) -> None:
+    PROFILE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+
+    (PROFILE_DIRECTORY / f"{identifier}.speedscope.json").write_text(json.dumps(profile))
+    (PROFILE_DIRECTORY / f"{identifier}.summary.json").write_text(json.dumps(summary))
+
+    for expired in recent_profiles()[PROFILE_RETENTION:]:
+        for path in PROFILE_DIRECTORY.glob(f"{expired['id']}.*"):
+            path.unlink(missing_ok=True)
+
+
+def recent_profiles() -> list[dict[str, Any]]:
+    if not PROFILE_DIRECTORY.exists():
+        return []
+
+    summaries = sorted(PROFILE_DIRECTORY.glob("*.summary.json"), reverse=True)
+
+    return [json.loads(path.read_text()) | {"id": path.name.removesuffix(".summary.json")} for path in summaries]
+
+
+class ProfilingMiddleware:
+    """Profiles requests the admin asks for with the profiling token and stores a speedscope file for each."""
+
+    def __init__(self, app: ASGIApp, interval: float = SAMPLE_INTERVAL_SECONDS) -> None:
+        self.app = app
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith("/profiles") or not wants_profile(Request(scope)):
+            return await self.app(scope, receive, send)
+
+        recording = Recording()
+        sampler = Sampler(self.interval, threading.get_ident(), sys._getframe())
+        name = f"{scope['method']} {scope['path']}"
+        identifier = profile_id(name)
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", identifier.encode())]
+
+            await send(message)
+
+        token = _recording.set(recording)
+        sampler.start()
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            _recording.reset(token)
+
+            ended = time.perf_counter()
+            summary = {
+                "name": name,
+                "duration_ms": round((ended - recording.started) * 1000, 3),
+                "queries": len(recording.queries),
+                "query_ms": round(sum(finished - started for _, started, finished in recording.queries) * 1000, 3),
+                "templates": len(recording.templates),
+                "template_ms": round(sum(finished - started for _, started, finished in recording.templates) * 1000, 3),
+            }
+            profile = speedscope(name, recording, sampler, ended)
+
+            await run_in_threadpool(save_profile, identifier, profile, summary)
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from . import db, diagram, events
+from .models import User
+from .templating import templates
+
+PUBLISH_DIRECTORY = Path(os.environ.get("PUBLISH_DIRECTORY", "published"))
+PUBLISH_DEBOUNCE_SECONDS: float = float(os.environ.get("PUBLISH_DEBOUNCE", "2"))
+PUBLISHED_URL = "/published"
+MANIFEST = ".manifest.json"
+
+logger = logging.getLogger(__name__)
+
+# Held while a publication's files are written or removed, so unpublishing can't race a rebuild.
+_files_lock = threading.Lock()
+
+
+def template_version() -> str:
+    """Hash of every template file, since a page's includes can change as well as its own template."""
+    digest = hashlib.sha256()
+
+    for directory in map(Path, templates.env.loader.searchpath):
+        for path in sorted(directory.rglob("*.html")):
+            digest.update(f"{path.relative_to(directory).as_posix()}\0".encode())
+            digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+
+TEMPLATE_VERSION = template_version()
+
+
+def published_url(slug: str) -> str:
+    return f"{PUBLISHED_URL}/{slug}"
+
+
+def page_hash(template: str, context: dict[str, Any]) -> str:
+    """Hash of everything a page is rendered from; view models have deterministic reprs."""
+    return hashlib.sha256(f"{TEMPLATE_VERSION}\0{template}\0{context!r}".encode()).hexdigest()
+
+
+def write_atomically(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_text(content)
+    os.replace(temporary, path)
+
+
+def rebuild(user_id: int) -> int:
+    """Re-render the user's published pages whose inputs changed. Returns how many were written.
+
+    Pages are loaded and rendered without holding `_files_lock`, so other users' rebuilds aren't
+    held up; it's only taken to write the files, once the publication is known to still exist.
+    """
+    with db.session_for_user(user_id) as session:
+        publication = db.publication_for_user(session, user_id)
+
+        if publication is None:
+            return 0
+
+        slug = publication.slug
+        user = session.get(User, user_id)
+        directory = PUBLISH_DIRECTORY / slug
+        manifest_path = directory / MANIFEST
+        manifest: dict[str, str] = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+        groups = db.group_views_for_user(session, user)
+        pages: dict[str, tuple[str, dict[str, Any]]] = {"index.html": ("pages/published/groups.html", {"groups": groups})}
+
+        for summary in groups:
+            pages[f"groups/{summary.id}"] = ("pages/published/group.html", {"group": db.group_view(session, user, summary.id)})
+
+        hashes: dict[str, str] = {}
+        rendered: dict[str, str] = {}
+
+        for path, (template, context) in pages.items():
+            hashes[path] = page_hash(template, context)
+
+            if manifest.get(path) == hashes[path] and (directory / path).exists():
+                continue
+
+            if "group" in context:
+                group_id = context["group"].id
+                _, svg = diagram.group_diagram(user_id, group_id, *db.group_graph(session, user, group_id))
+                context = context | {"diagram": svg}
+
+            rendered[path] = templates.get_template(template).render(
+                user=user,
+                base_url=published_url(slug),
+                published=True,
+                **context,
+            )
+
+        # End the read transaction so the check below sees an unpublish committed since.
+        session.rollback()
+
+        with _files_lock:
+            publication = db.publication_for_user(session, user_id)
+
+            if publication is None or publication.slug != slug:
+                return 0
+
+            for path, html in rendered.items():
+                write_atomically(directory / path, html)
+
+            for stale in manifest.keys() - hashes.keys():
+                (directory / stale).unlink(missing_ok=True)
+
+            write_atomically(manifest_path, json.dumps(hashes))
+
+    return len(rendered)
+
+
+def remove(slug: str) -> None:
+    with _files_lock:
+        shutil.rmtree(PUBLISH_DIRECTORY / slug, ignore_errors=True)
+
+
+class Publisher:
+    """Background thread that rebuilds published pages shortly after their owner's notes change."""
+
+    def __init__(self, debounce: float = PUBLISH_DEBOUNCE_SECONDS) -> None:
+        self.debounce = debounce
+        self.pending: set[int] = set()
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def enqueue(self, user_id: int) -> None:
+        with self.condition:
+            self.pending.add(user_id)
+            self.condition.notify()
+
+    def take_pending(self) -> set[int]:
+        with self.condition:
+            while not self.pending and not self.stopped.is_set():
+                self.condition.wait()
+
+        # Let a burst of edits settle so each user is rebuilt once.
+        self.stopped.wait(self.debounce)
+
+        with self.condition:
+            pending, self.pending = self.pending, set()
+
+        return pending
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            for user_id in self.take_pending():
+                try:
+                    rebuild(user_id)
+                except Exception:
+                    logger.exception("Rebuilding published pages for user %s failed", user_id)
+
+    def start(self) -> None:
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="publisher", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+        with self.condition:
+            self.condition.notify()
+
+        if self.thread is not None:
+            self.thread.join()
+
+
+publisher = Publisher()
+events.on_user_data_changed(publisher.enqueue)
+
+
+class PublishedFiles(StaticFiles):
+    """Serves published pages as HTML with an ETag derived from their content, not their mtime.
+
+    Dotfiles, such as each publication's manifest and half-written pages, are never served.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.etags: dict[tuple[str, int, int], str] = {}
+
+    def etag(self, full_path: str, stat_result: os.stat_result) -> str:
+        key = (full_path, stat_result.st_mtime_ns, stat_result.st_size)
+
+        if key not in self.etags:
+            if len(self.etags) > 10_000:
+                self.etags.clear()
+
+            self.etags[key] = hashlib.sha256(Path(full_path).read_bytes()).hexdigest()
+
+        return f'"{self.etags[key]}"'
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in Path(path).parts):
+            raise HTTPException(status_code=404)
+
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            method=scope["method"],
+            media_type="text/html",
+        )
+        response.headers["etag"] = self.etag(str(full_path), stat_result)
+        response.headers["cache-control"] = "public, no-cache"
+
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+
+        return response
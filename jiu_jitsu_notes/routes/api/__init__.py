@@ -1,9 +1,16 @@
 from fastapi import APIRouter
 
-from . import auth, groups, positions, techniques
+from . import auth, autosave, data, duplicates, groups, jobs, metrics, positions, publications, tags, techniques
 
 router = APIRouter()
 router.include_router(groups.router, prefix="/groups")
 router.include_router(positions.router)
 router.include_router(techniques.router, prefix="/positions")
 router.include_router(auth.router, prefix="/auth")
+router.include_router(data.router, prefix="/data")
+router.include_router(autosave.router, prefix="/autosave")
+router.include_router(publications.router, prefix="/publications")
+router.include_router(jobs.router, prefix="/jobs")
+router.include_router(metrics.router, prefix="/metrics")
+router.include_router(tags.router, prefix="/tags")
+router.include_router(duplicates.router, prefix="/duplicates")
@@ -3,14 +3,13 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, Form
 from fastapi.requests import Request
 from fastapi.responses import Response
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
-from ... import auth, db
+from ... import auth, db, prefetch
 from ...models import Token, User
+from ...templating import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 
 @router.post("/token")
@@ -32,6 +31,7 @@ async def login(
         )
 
     token = db.create_token_for_user(session, user)
+    prefetch.schedule(user.id)
 
     response = Response()
     response.set_cookie("token", token.token)
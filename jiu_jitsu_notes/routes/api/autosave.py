@@ -0,0 +1,46 @@
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, Form, HTTPException
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from ... import auth, autosave, db
+from ...models import User
+
+router = APIRouter()
+
+
+@router.patch("/{kind}/{entity_id}")
+async def autosave_entity(
+    kind: Literal["groups", "positions", "techniques"],
+    entity_id: int,
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    name: Annotated[Optional[str], Form()] = None,
+    description: Annotated[Optional[str], Form()] = None,
+    to_position_id: Annotated[Optional[str], Form()] = None,
+):
+    values: dict = {"name": name, "description": description}
+
+    if kind == "techniques" and to_position_id:
+        if not to_position_id.isdigit():
+            raise HTTPException(
+                status_code=422,
+                detail="to_position_id must be an integer",
+            )
+
+        if db.position_by_id(session, user, int(to_position_id)) is None:
+            raise HTTPException(
+                status_code=422,
+                detail=f"No position found with id {to_position_id!r}",
+            )
+
+        values["to_position_id"] = int(to_position_id)
+
+    _, fields = autosave.EDITABLE[kind]
+    values = {key: value for key, value in values.items() if key in fields and value is not None}
+
+    if values:
+        autosave.buffer.buffer(kind, user.id, entity_id, values, session.shard)
+
+    return Response(status_code=204)
@@ -0,0 +1,129 @@
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+
+from ... import auth, db, serialisers, sync
+from ...models import Base, Position, PositionGroup, Technique, User
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+
+def list_response(
+    session: Session,
+    user: User,
+    model: type[Base],
+    include: Optional[str],
+    fields: Optional[str],
+    **filters,
+) -> ORJSONResponse:
+    include_tree = serialisers.parse_include(model, include)
+    field_sets = serialisers.parse_fields(model, include_tree, fields)
+
+    entities = db.load_for_user(session, user, model, serialisers.eager_options(model, include_tree), **filters)
+
+    return ORJSONResponse(
+        [serialisers.serialise(entity, include_tree, field_sets) for entity in entities],
+    )
+
+
+def single_response(
+    session: Session,
+    user: User,
+    model: type[Base],
+    entity_id: int,
+    include: Optional[str],
+    fields: Optional[str],
+) -> ORJSONResponse:
+    include_tree = serialisers.parse_include(model, include)
+    field_sets = serialisers.parse_fields(model, include_tree, fields)
+
+    entities = db.load_for_user(session, user, model, serialisers.eager_options(model, include_tree), id=entity_id)
+
+    if not entities:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No {model.__tablename__} found with id {entity_id!r}",
+        )
+
+    return ORJSONResponse(serialisers.serialise(entities[0], include_tree, field_sets))
+
+
+@router.get("/sync")
+async def get_changes(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    cursor: Optional[str] = None,
+    limit: int = 100,
+):
+    return ORJSONResponse(sync.changes_page(session, user, cursor, max(limit, 1)))
+
+
+@router.get("/groups")
+async def get_groups(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    return list_response(session, user, PositionGroup, include, fields)
+
+
+@router.get("/groups/{group_id}")
+async def get_group(
+    group_id: int,
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    return single_response(session, user, PositionGroup, group_id, include, fields)
+
+
+@router.get("/positions")
+async def get_positions(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    group_id: Optional[int] = None,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    filters = {} if group_id is None else {"group_id": group_id}
+
+    return list_response(session, user, Position, include, fields, **filters)
+
+
+@router.get("/positions/{position_id}")
+async def get_position(
+    position_id: int,
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    return single_response(session, user, Position, position_id, include, fields)
+
+
+@router.get("/techniques")
+async def get_techniques(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    from_position_id: Optional[int] = None,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    filters = {} if from_position_id is None else {"from_position_id": from_position_id}
+
+    return list_response(session, user, Technique, include, fields, **filters)
+
+
+@router.get("/techniques/{technique_id}")
+async def get_technique(
+    technique_id: int,
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    return single_response(session, user, Technique, technique_id, include, fields)
@@ -0,0 +1,47 @@
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.requests import Request
+from sqlalchemy.orm import Session
+
+from ... import auth, db, duplicates
+from ...models import User
+from ...templating import templates
+
+router = APIRouter()
+
+
+@router.get("/report")
+async def get_merge_suggestions(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    return duplicates.report(session, user)
+
+
+@router.get("/{kind}")
+async def get_possible_duplicates(
+    request: Request,
+    kind: Literal["positions", "techniques"],
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    name: str = "",
+    description: str = "",
+    exclude_id: Optional[int] = None,
+):
+    matches = duplicates.possible_duplicates(
+        session,
+        user,
+        duplicates.REPORTED_MODELS[kind],
+        name,
+        description,
+        exclude_id,
+    )
+
+    return templates.TemplateResponse(
+        "components/duplicates/warning.html",
+        {
+            "request": request,
+            "matches": matches,
+        },
+    )
@@ -3,14 +3,14 @@ from typing import Annotated, Literal, Optional
 from fastapi import APIRouter, Depends, Form, HTTPException
 from fastapi.requests import Request
 from fastapi.responses import Response
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from ... import auth, db
+from ... import auth, autosave, db, diagram, events, position_index, tag_index
 from ...models import PositionGroup, User
+from ...templating import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 COMPONENT_TO_TEMPLATE: dict[str, str] = {
     "list-item": "components/group/list_item/readonly.html",
@@ -75,6 +75,30 @@ async def get_group(
     )
 
 
+@router.get("/{group_id}/diagram")
+async def get_group_diagram(
+    request: Request,
+    group_id: int,
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    if db.group_by_id(session, user, group_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Group not found",
+        )
+
+    positions, techniques = db.group_graph(session, user, group_id)
+    digest, svg = await run_in_threadpool(diagram.group_diagram, user.id, group_id, positions, techniques)
+
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "private, no-cache"}
+
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(svg, media_type="image/svg+xml", headers=headers)
+
+
 @router.post("/")
 async def create_group(
     request: Request,
@@ -91,6 +115,7 @@ async def create_group(
         )
 
     db_group = db.create_group(session, user, name, description)
+    events.user_data_changed(user.id)
 
     return templates.TemplateResponse(
         "components/group/list_item/readonly.html",
@@ -119,7 +144,9 @@ async def update_group(
             detail="Group not found",
         )
 
+    autosave.buffer.discard("groups", user.id, group_id)
     group = db.update_group(session, group, name, description)
+    events.user_data_changed(user.id)
 
     return templates.TemplateResponse(
         COMPONENT_TO_TEMPLATE[component],
@@ -136,16 +163,17 @@ async def delete_group(
     session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
 ):
-    group: PositionGroup | None = db.group_by_id(session, user, group_id)
+    autosave.buffer.discard("groups", user.id, group_id)
 
-    if group is None:
+    if not db.delete_group(session, user, group_id):
         raise HTTPException(
             status_code=404,
             detail="Group not found",
         )
 
-    session.delete(group)
-    session.commit()
+    position_index.invalidate(user.id)
+    tag_index.invalidate(user.id)
+    events.user_data_changed(user.id)
 
     return Response(
         headers={"HX-Redirect": "/groups/"},
@@ -0,0 +1,76 @@
+import uuid
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy.orm import Session
+
+from ... import auth, db, jobs
+from ...models import User
+
+router = APIRouter()
+
+
+@router.get("/")
+async def get_jobs(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    return [jobs.describe(job) for job in jobs.recent_jobs_for_user(session, user)]
+
+
+@router.post("/exports")
+async def create_export(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    idempotency_key: Annotated[Optional[str], Header()] = None,
+):
+    job = jobs.enqueue(
+        session,
+        "export",
+        {"export_id": uuid.uuid4().hex},
+        user_id=user.id,
+        priority=jobs.PRIORITY_HIGH,
+        idempotency_key=None if idempotency_key is None else f"export:{user.id}:{idempotency_key}",
+    )
+
+    return JSONResponse(
+        jobs.describe(job),
+        status_code=202,
+        headers={"Location": f"/api/jobs/{job.id}"},
+    )
+
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: int,
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    job = jobs.job_for_user(session, user, job_id)
+
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found",
+        )
+
+    return jobs.describe(job)
+
+
+@router.get("/{job_id}/download")
+async def download_export(
+    job_id: int,
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    job = jobs.job_for_user(session, user, job_id)
+    path = None if job is None else jobs.export_path(job)
+
+    if path is None or not path.is_file():
+        raise HTTPException(
+            status_code=404,
+            detail="Export not found",
+        )
+
+    return FileResponse(path, media_type="application/json", filename="jiu-jitsu-notes.json")
@@ -0,0 +1,14 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+
+from ... import metrics, profiling
+
+router = APIRouter()
+
+
+@router.get("/")
+async def get_metrics(
+    _: Annotated[None, Depends(profiling.require_admin)],
+):
+    return metrics.snapshot()
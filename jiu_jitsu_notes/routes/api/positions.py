@@ -3,14 +3,14 @@ from typing import Annotated, Literal, Optional
 from fastapi import APIRouter, Depends, Form, HTTPException
 from fastapi.requests import Request
 from fastapi.responses import Response
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
-from ... import auth, db
+from ... import auth, autosave, coalescing, db, events, position_index, tag_index
 from ...models import Position, PositionGroup, User
+from ...templating import templates
+from ...views import GroupView
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 
 COMPONENT_TO_TEMPLATE: dict[str, str] = {
@@ -21,64 +21,83 @@ COMPONENT_TO_TEMPLATE: dict[str, str] = {
 }
 
 
-@router.get("/groups/{group_id}/positions")
-async def get_all_positions(
+@router.get("/positions/search")
+async def search_positions(
     request: Request,
-    group_id: int,
-    component: Literal["list", "list-item-new"],
     session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
+    search: str = "",
+    limit: int = position_index.MAXIMUM_RESULTS,
 ):
-    group: PositionGroup | None = db.group_by_id(session, user, group_id)
-
-    if group is None:
-        raise HTTPException(
-            status_code=404,
-            detail="Group not found",
-        )
+    matches = position_index.search(session, user, search, min(limit, position_index.MAXIMUM_RESULTS))
 
     return templates.TemplateResponse(
-        COMPONENT_TO_TEMPLATE[component],
+        "components/position/search/options.html",
         {
             "request": request,
-            "group": group,
+            "matches": matches,
         },
     )
 
 
+@router.get("/groups/{group_id}/positions")
+async def get_all_positions(
+    request: Request,
+    group_id: int,
+    component: Literal["list", "list-item-new"],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    def load(session: Session) -> dict:
+        if component == "list":
+            group: GroupView | PositionGroup | None = db.group_view(session, user, group_id)
+        else:
+            group = db.group_by_id(session, user, group_id)
+
+        if group is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Group not found",
+            )
+
+        return {
+            "group": group,
+            "positions": group.positions if component == "list" else [],
+        }
+
+    return await coalescing.render(request, user, COMPONENT_TO_TEMPLATE[component], load)
+
+
 @router.get("/groups/{group_id}/positions/{position_id}")
 async def get_position(
     request: Request,
     group_id: int,
     position_id: int,
     component: Literal["list-item", "list-item-editable"],
-    session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
 ):
-    group: PositionGroup | None = db.group_by_id(session, user, group_id)
+    def load(session: Session) -> dict:
+        group: PositionGroup | None = db.group_by_id(session, user, group_id)
 
-    if group is None:
-        raise HTTPException(
-            status_code=404,
-            detail="Group not found",
-        )
+        if group is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Group not found",
+            )
 
-    position: Position | None = db.position_by_id(session, user, position_id)
+        position: Position | None = db.position_by_id(session, user, position_id)
 
-    if position is None or position.group_id != group_id:
-        raise HTTPException(
-            status_code=404,
-            detail="Position not found",
-        )
+        if position is None or position.group_id != group_id:
+            raise HTTPException(
+                status_code=404,
+                detail="Position not found",
+            )
 
-    return templates.TemplateResponse(
-        COMPONENT_TO_TEMPLATE[component],
-        {
-            "request": request,
+        return {
             "group": group,
             "position": position,
-        },
-    )
+        }
+
+    return await coalescing.render(request, user, COMPONENT_TO_TEMPLATE[component], load)
 
 
 @router.post("/groups/{group_id}/positions/")
@@ -107,6 +126,9 @@ async def create_position_in_group(
         description=description,
     )
 
+    position_index.position_saved(user.id, position.id, position.name)
+    events.user_data_changed(user.id)
+
     return templates.TemplateResponse(
         COMPONENT_TO_TEMPLATE[component],
         {
@@ -144,13 +166,12 @@ async def update_position(
             detail="Position not found",
         )
 
-    if name is not None:
-        position.name = name
+    autosave.buffer.discard("positions", user.id, position_id)
 
-    if description is not None:
-        position.description = description
+    db.update_position(session, position, name, description)
 
-    session.commit()
+    position_index.position_saved(user.id, position.id, position.name)
+    events.user_data_changed(user.id)
 
     return templates.TemplateResponse(
         COMPONENT_TO_TEMPLATE[component],
@@ -169,23 +190,16 @@ async def delete_position(
     session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
 ):
-    group: PositionGroup | None = db.group_by_id(session, user, group_id)
+    autosave.buffer.discard("positions", user.id, position_id)
 
-    if group is None:
-        raise HTTPException(
-            status_code=404,
-            detail="Group not found",
-        )
-
-    position: Position | None = db.position_by_id(session, user, position_id)
-
-    if position is None or position.group_id != group_id:
+    if not db.delete_position(session, user, group_id, position_id):
         raise HTTPException(
             status_code=404,
             detail="Position not found",
         )
 
-    session.delete(position)
-    session.commit()
+    position_index.position_deleted(user.id, position_id)
+    tag_index.invalidate(user.id)
+    events.user_data_changed(user.id)
 
     return Response()
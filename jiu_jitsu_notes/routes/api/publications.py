@@ -0,0 +1,55 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from ... import auth, db, publishing
+from ...models import User
+
+router = APIRouter()
+
+
+@router.get("/")
+async def get_publication(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    publication = db.publication_for_user(session, user.id)
+
+    if publication is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Notes are not published",
+        )
+
+    return {"url": publishing.published_url(publication.slug) + "/"}
+
+
+@router.post("/")
+async def publish(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    publication = db.create_publication(session, user)
+    publishing.publisher.enqueue(user.id)
+
+    return {"url": publishing.published_url(publication.slug) + "/"}
+
+
+@router.delete("/")
+async def unpublish(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    publication = db.delete_publication(session, user)
+
+    if publication is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Notes are not published",
+        )
+
+    publishing.remove(publication.slug)
+
+    return Response()
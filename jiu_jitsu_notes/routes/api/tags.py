@@ -0,0 +1,78 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Form, HTTPException
+from fastapi.requests import Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from ... import auth, db, events, tag_index
+from ...models import Position, Technique, User
+from ...templating import templates
+
+router = APIRouter()
+
+MAXIMUM_RESULTS = 200
+
+
+@router.get("/")
+async def get_tags(
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    return [{"id": tag.id, "name": tag.name} for tag in db.all_tags_for_user(session, user)]
+
+
+@router.get("/techniques")
+async def filter_techniques(
+    request: Request,
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+    query: str = "",
+    limit: int = MAXIMUM_RESULTS,
+):
+    try:
+        technique_ids = tag_index.filter_techniques(session, user, query)[: min(max(limit, 0), MAXIMUM_RESULTS)]
+    except tag_index.TagQueryError as error:
+        raise HTTPException(
+            status_code=400,
+            detail=str(error),
+        )
+
+    techniques: list[Technique] = sorted(
+        db.entities_by_ids(session, user, Technique, technique_ids),
+        key=lambda technique: technique.id,
+    )
+
+    return templates.TemplateResponse(
+        "components/technique/list.html",
+        {
+            "request": request,
+            "techniques": techniques,
+        },
+    )
+
+
+@router.put("/positions/{position_id}")
+async def set_position_tags(
+    position_id: int,
+    tags: Annotated[str, Form()],
+    session: Annotated[Session, Depends(db.get_session)],
+    user: Annotated[User, Depends(auth.current_user)],
+):
+    position: Position | None = db.position_by_id(session, user, position_id)
+
+    if position is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Position not found",
+        )
+
+    position.tags = db.tags_named(session, user, tag_index.parse_tag_names(tags))
+    db.record_change(session, position)
+    session.commit()
+
+    # Position tags apply to every technique starting there, so rebuild rather than patch each one.
+    tag_index.invalidate(user.id)
+    events.user_data_changed(user.id)
+
+    return Response(status_code=204)
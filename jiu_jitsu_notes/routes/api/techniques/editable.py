@@ -2,14 +2,13 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.requests import Request
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from .... import auth, db
 from ....models import Technique, User
+from ....templating import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/{from_position_id}/techniques/{technique_id}/editable")
@@ -39,7 +38,6 @@ async def get_editable_for_position(
         {
             "request": request,
             "technique": technique,
-            "positions": db.all_positions_for_user(session, user),
         },
     )
 
@@ -48,7 +46,6 @@ async def get_editable_for_position(
 async def create_editable(
     request: Request,
     from_position_id: int,
-    session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
 ):
     return templates.TemplateResponse(
@@ -56,6 +53,5 @@ async def create_editable(
         {
             "request": request,
             "from_position_id": from_position_id,
-            "positions": db.all_positions_for_user(session, user),
         },
     )
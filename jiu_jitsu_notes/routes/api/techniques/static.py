@@ -3,14 +3,14 @@ from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, Form, HTTPException
 from fastapi.requests import Request
 from fastapi.responses import Response
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
-from .... import auth, db
+from .... import auth, autosave, coalescing, db, events, tag_index
 from ....models import Technique, User
+from ....templating import templates
+from ....views import TechniqueView
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/{from_position_id}/techniques/{technique_id}")
@@ -18,30 +18,28 @@ async def get_single_technique(
     request: Request,
     from_position_id: int,
     technique_id: int,
-    session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
 ):
-    technique: Technique | None = db.technique_by_id(session, user, technique_id)
-
-    if technique is None:
-        raise HTTPException(
-            status_code=404,
-            detail=f"No technique found with id {technique_id!r}",
-        )
-
-    if technique.from_position_id != from_position_id:
-        raise HTTPException(
-            status_code=404,
-            detail=f"No technique with id {technique_id!r} belongs to this position",
-        )
-
-    return templates.TemplateResponse(
-        "components/technique/readonly.html",
-        {
-            "request": request,
+    def load(session: Session) -> dict:
+        technique: TechniqueView | None = db.technique_view(session, user, technique_id)
+
+        if technique is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No technique found with id {technique_id!r}",
+            )
+
+        if technique.from_position_id != from_position_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No technique with id {technique_id!r} belongs to this position",
+            )
+
+        return {
             "technique": technique,
-        },
-    )
+        }
+
+    return await coalescing.render(request, user, "components/technique/readonly.html", load)
 
 
 @router.get("/{from_position_id}/techniques/{technique_id}/detailed")
@@ -49,30 +47,28 @@ async def get_detailed_technique(
     request: Request,
     from_position_id: int,
     technique_id: int,
-    session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
 ):
-    technique: Technique | None = db.technique_by_id(session, user, technique_id)
-
-    if technique is None:
-        raise HTTPException(
-            status_code=404,
-            detail=f"No technique found with id {technique_id!r}",
-        )
-
-    if technique.from_position_id != from_position_id:
-        raise HTTPException(
-            status_code=404,
-            detail=f"No technique with id {technique_id!r} belongs to this position",
-        )
-
-    return templates.TemplateResponse(
-        "components/technique/detailed.html",
-        {
-            "request": request,
+    def load(session: Session) -> dict:
+        technique: TechniqueView | None = db.technique_view(session, user, technique_id, with_tags=True)
+
+        if technique is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No technique found with id {technique_id!r}",
+            )
+
+        if technique.from_position_id != from_position_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No technique with id {technique_id!r} belongs to this position",
+            )
+
+        return {
             "technique": technique,
-        },
-    )
+        }
+
+    return await coalescing.render(request, user, "components/technique/detailed.html", load)
 
 
 @router.put("/{from_position_id}/techniques/{technique_id}")
@@ -85,6 +81,7 @@ async def update_single_technique(
     name: Annotated[Optional[str], Form()] = None,
     description: Annotated[Optional[str], Form()] = None,
     to_position_id: Annotated[Optional[int], Form()] = None,
+    tags: Annotated[Optional[str], Form()] = None,
 ):
     db_technique: Technique | None = db.technique_by_id(session, user, technique_id)
 
@@ -100,16 +97,25 @@ async def update_single_technique(
             detail=f"No technique with id {technique_id!r} belongs to this position",
         )
 
-    if name is not None:
-        db_technique.name = name
+    if to_position_id is not None and db.position_by_id(session, user, to_position_id) is None:
+        raise HTTPException(
+            status_code=422,
+            detail=f"No position found with id {to_position_id!r}",
+        )
 
-    if description is not None:
-        db_technique.description = description
+    autosave.buffer.discard("techniques", user.id, technique_id)
 
-    if to_position_id is not None:
-        db_technique.to_position_id = to_position_id
+    db.update_technique(
+        session,
+        db_technique,
+        name,
+        description,
+        to_position_id,
+        None if tags is None else db.tags_named(session, user, tag_index.parse_tag_names(tags)),
+    )
 
-    session.commit()
+    tag_index.technique_saved(user.id, db_technique)
+    events.user_data_changed(user.id)
 
     return templates.TemplateResponse(
         "components/technique/readonly.html",
@@ -129,7 +135,20 @@ async def create_technique(
     name: Annotated[str, Form()],
     description: Annotated[str, Form()],
     to_position_id: Annotated[Optional[int], Form()] = None,
+    tags: Annotated[Optional[str], Form()] = None,
 ):
+    if db.position_by_id(session, user, from_position_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No position found with id {from_position_id!r}",
+        )
+
+    if to_position_id is not None and db.position_by_id(session, user, to_position_id) is None:
+        raise HTTPException(
+            status_code=422,
+            detail=f"No position found with id {to_position_id!r}",
+        )
+
     technique = db.create_technique(
         session,
         user,
@@ -137,8 +156,12 @@ async def create_technique(
         description,
         from_position_id,
         to_position_id,
+        db.tags_named(session, user, tag_index.parse_tag_names(tags)),
     )
 
+    tag_index.technique_saved(user.id, technique)
+    events.user_data_changed(user.id)
+
     return templates.TemplateResponse(
         "components/technique/readonly.html",
         {
@@ -169,7 +192,10 @@ async def delete_technique(
             detail=f"No technique with id {technique_id!r} belongs to this position",
         )
 
-    session.delete(technique)
-    session.commit()
+    autosave.buffer.discard("techniques", user.id, technique_id)
+    db.delete_technique(session, technique)
+
+    tag_index.technique_deleted(user.id, technique_id)
+    events.user_data_changed(user.id)
 
     return Response()
@@ -1,15 +1,16 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Form, HTTPException
 from fastapi.requests import Request
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import FileResponse, RedirectResponse
 from sqlalchemy.orm import Session
 
-from .. import auth, db
-from ..models import PositionGroup, User
+from .. import auth, coalescing, db, profiling
+from ..models import User
+from ..templating import templates
+from ..views import GroupView
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/")
@@ -27,44 +28,40 @@ async def index(
 @router.get("/groups")
 async def groups_page(
     request: Request,
-    session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
 ):
-    groups: list[PositionGroup] = db.all_groups_for_user(session, user)
+    def load(session: Session) -> dict:
+        groups: list[GroupView] = db.group_views_for_user(session, user)
 
-    return templates.TemplateResponse(
-        "pages/all_groups.html",
-        {
-            "request": request,
+        return {
             "user": user,
             "groups": groups,
-        },
-    )
+        }
+
+    return await coalescing.render(request, user, "pages/all_groups.html", load)
 
 
 @router.get("/groups/{group_id}")
 async def group_page(
     request: Request,
     group_id: int,
-    session: Annotated[Session, Depends(db.get_session)],
     user: Annotated[User, Depends(auth.current_user)],
 ):
-    group: PositionGroup | None = db.group_by_id(session, user, group_id)
+    def load(session: Session) -> dict:
+        group: GroupView | None = db.group_view(session, user, group_id)
 
-    if group is None:
-        raise HTTPException(
-            status_code=404,
-            detail="Group not found",
-        )
+        if group is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Group not found",
+            )
 
-    return templates.TemplateResponse(
-        "pages/group.html",
-        {
-            "request": request,
+        return {
             "group": group,
             "user": user,
-        },
-    )
+        }
+
+    return await coalescing.render(request, user, "pages/group.html", load)
 
 
 @router.get("/login")
@@ -85,3 +82,50 @@ async def register_page(request: Request):
             "request": request,
         },
     )
+
+
+@router.get("/profiles")
+async def profiles_page(
+    request: Request,
+    _: Annotated[None, Depends(profiling.require_admin)],
+):
+    return templates.TemplateResponse(
+        "pages/profiles.html",
+        {
+            "request": request,
+            "profiles": profiling.recent_profiles(),
+        },
+    )
+
+
+@router.post("/profiles/session")
+async def start_profiling_session(
+    token: Annotated[str, Form()],
+):
+    """Swap the profiling token for a cookie, so browsing /profiles never puts it in a URL."""
+    if not profiling.token_matches(token):
+        raise HTTPException(
+            status_code=404,
+            detail="Not found",
+        )
+
+    response = RedirectResponse("/profiles", status_code=303)
+    response.set_cookie("profile", token, httponly=True, samesite="strict")
+
+    return response
+
+
+@router.get("/profiles/{profile_id}")
+async def profile_file(
+    profile_id: str,
+    _: Annotated[None, Depends(profiling.require_admin)],
+):
+    path = profiling.PROFILE_DIRECTORY / f"{profile_id}.speedscope.json"
+
+    if "/" in profile_id or not path.is_file():
+        raise HTTPException(
+            status_code=404,
+            detail="Profile not found",
+        )
+
+    return FileResponse(path, media_type="application/json", filename=path.name)
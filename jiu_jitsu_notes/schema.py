@@ -0,0 +1,156 @@
+import logging
+
+from sqlalchemy import Engine, ForeignKeyConstraint, Table, UniqueConstraint, inspect
+from sqlalchemy.engine import Inspector
+from sqlalchemy.engine.interfaces import ReflectedForeignKeyConstraint
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable
+
+from .models import Base
+
+logger = logging.getLogger(__name__)
+
+
+# A foreign key as (its columns, the table they refer to, its ON DELETE action), from the models or reflected.
+ForeignKeyShape = tuple[tuple[str, ...], str, str]
+
+
+def constraint_shape(constraint: ForeignKeyConstraint) -> ForeignKeyShape:
+    return tuple(constraint.column_keys), constraint.referred_table.name, (constraint.ondelete or "").upper()
+
+
+def reflected_shape(found: ReflectedForeignKeyConstraint) -> ForeignKeyShape:
+    return tuple(found["constrained_columns"]), found["referred_table"], found["options"].get("ondelete", "").upper()
+
+
+def foreign_keys(table: Table) -> set[ForeignKeyShape]:
+    return {constraint_shape(constraint) for constraint in table.foreign_key_constraints}
+
+
+def existing_foreign_keys(inspector: Inspector, table: Table) -> set[ForeignKeyShape]:
+    return {reflected_shape(found) for found in inspector.get_foreign_keys(table.name)}
+
+
+def unique_columns(table: Table) -> set[frozenset[str]]:
+    return {
+        frozenset(column.name for column in constraint.columns)
+        for constraint in table.constraints
+        if isinstance(constraint, UniqueConstraint)
+    }
+
+
+def existing_unique_columns(inspector: Inspector, table: Table) -> set[frozenset[str]]:
+    constraints = {frozenset(found["column_names"]) for found in inspector.get_unique_constraints(table.name)}
+    indexes = {frozenset(found["column_names"]) for found in inspector.get_indexes(table.name) if found["unique"]}
+
+    return constraints | indexes
+
+
+def outdated_tables(engine: Engine) -> list[Table]:
+    """Existing tables whose foreign key actions or unique constraints differ from the models."""
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+
+    return [
+        table
+        for table in Base.metadata.sorted_tables
+        if table.name in existing
+        and (
+            existing_foreign_keys(inspector, table) != foreign_keys(table)
+            or not unique_columns(table) <= existing_unique_columns(inspector, table)
+        )
+    ]
+
+
+def rebuild_sqlite_tables(engine: Engine, tables: list[Table]) -> None:
+    """Recreate `tables` from the models and copy their rows across, as SQLite can't alter constraints in place.
+
+    Foreign keys are switched off for the copy, so this follows SQLite's own procedure: create the
+    new table, copy, drop the old one and rename, all in one transaction.
+    """
+    inspector = inspect(engine)
+    columns = {table.name: [column["name"] for column in inspector.get_columns(table.name)] for table in tables}
+    connection = engine.raw_connection()
+    driver = connection.driver_connection
+    isolation_level = driver.isolation_level
+    driver.isolation_level = None
+
+    try:
+        driver.execute("PRAGMA foreign_keys=OFF")
+        driver.execute("BEGIN")
+
+        try:
+            for table in tables:
+                copied = ", ".join(name for name in columns[table.name] if name in table.c)
+                create = str(CreateTable(table).compile(dialect=engine.dialect))
+
+                driver.execute(create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE _new_{table.name} ", 1))
+                driver.execute(f"INSERT INTO _new_{table.name} ({copied}) SELECT {copied} FROM {table.name}")
+                driver.execute(f"DROP TABLE {table.name}")
+                driver.execute(f"ALTER TABLE _new_{table.name} RENAME TO {table.name}")
+
+                for index in table.indexes:
+                    driver.execute(str(CreateIndex(index).compile(dialect=engine.dialect)))
+
+            orphans = driver.execute("PRAGMA foreign_key_check").fetchall()
+            driver.execute("COMMIT")
+        except BaseException:
+            driver.execute("ROLLBACK")
+            raise
+
+        if orphans:
+            logger.warning("%d rows reference rows that no longer exist: %s", len(orphans), orphans[:5])
+    finally:
+        driver.execute("PRAGMA foreign_keys=ON")
+        driver.isolation_level = isolation_level
+        connection.close()
+
+
+def alter_postgres_tables(engine: Engine, tables: list[Table]) -> None:
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for table in tables:
+            wanted = foreign_keys(table)
+            found = existing_foreign_keys(inspector, table)
+            found_unique = existing_unique_columns(inspector, table)
+
+            for reflected in inspector.get_foreign_keys(table.name):
+                if reflected_shape(reflected) not in wanted:
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} DROP CONSTRAINT "{reflected["name"]}"')
+
+            for constraint in table.foreign_key_constraints:
+                if constraint_shape(constraint) not in found:
+                    connection.execute(AddConstraint(constraint))
+
+            for constraint in table.constraints:
+                columns = frozenset(column.name for column in constraint.columns)
+
+                if isinstance(constraint, UniqueConstraint) and columns not in found_unique:
+                    connection.execute(AddConstraint(constraint))
+
+
+def upgrade(engine: Engine) -> list[str]:
+    """Bring tables created by an older schema up to date with the models, which `create_all` never does.
+
+    Rewrites foreign keys whose ON DELETE action changed, adds missing unique constraints and
+    creates missing indexes. Returns the names of the tables whose constraints were rewritten.
+    """
+    outdated = outdated_tables(engine)
+
+    if outdated:
+        logger.info("Upgrading %s on %s", ", ".join(table.name for table in outdated), engine.url.render_as_string())
+
+        if engine.dialect.name == "sqlite":
+            rebuild_sqlite_tables(engine, outdated)
+        else:
+            alter_postgres_tables(engine, outdated)
+
+    existing = set(inspect(engine).get_table_names())
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name in existing:
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+
+    return [table.name for table in outdated]
@@ -0,0 +1,135 @@
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from .models import Base, Position, PositionGroup, Tag, Technique
+
+FIELDS: dict[type[Base], tuple[str, ...]] = {
+    PositionGroup: ("name", "description"),
+    Position: ("name", "description", "submission", "group_id"),
+    Technique: ("name", "description", "from_position_id", "to_position_id"),
+    Tag: ("name",),
+}
+
+RELATIONS: dict[type[Base], dict[str, tuple[str, type[Base]]]] = {
+    PositionGroup: {"positions": ("positions", Position)},
+    Position: {
+        "techniques": ("techniques_from", Technique),
+        "techniques_to": ("techniques_to", Technique),
+        "tags": ("tags", Tag),
+    },
+    Technique: {
+        "from_position": ("from_position", Position),
+        "to_position": ("to_position", Position),
+        "tags": ("tags", Tag),
+    },
+    Tag: {},
+}
+
+IncludeTree = dict[str, "IncludeTree"]
+FieldSets = dict[tuple[str, ...], set[str]]
+
+
+def parse_include(model: type[Base], include: str | None) -> IncludeTree:
+    tree: IncludeTree = {}
+
+    for path in filter(None, (include or "").split(",")):
+        node, node_model = tree, model
+
+        for name in path.strip().split("."):
+            if name not in RELATIONS[node_model]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cannot include {path!r}",
+                )
+
+            node_model = RELATIONS[node_model][name][1]
+            node = node.setdefault(name, {})
+
+    return tree
+
+
+def parse_fields(model: type[Base], include: IncludeTree, fields: str | None) -> FieldSets:
+    field_sets: FieldSets = {}
+
+    for path in filter(None, (fields or "").split(",")):
+        *relation_path, name = path.strip().split(".")
+
+        node, node_model = include, model
+        for relation in relation_path:
+            if relation not in node:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Field {path!r} belongs to a relation that is not included",
+                )
+            node, node_model = node[relation], RELATIONS[node_model][relation][1]
+
+        if name not in FIELDS[node_model]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown field {path!r}",
+            )
+
+        field_sets.setdefault(tuple(relation_path), set()).add(name)
+
+    return field_sets
+
+
+def eager_options(model: type[Base], include: IncludeTree) -> list:
+    """Eager loads for every included relation; anything else raises rather than lazy loading.
+
+    Collections are loaded with one SELECT ... IN per included collection, as joining sibling collections would
+    return every combination of their rows. Many-to-one relations are joined onto their parent.
+    """
+    options: list = []
+
+    def walk(node_model: type[Base], node: IncludeTree, loader=None) -> None:
+        for name, children in node.items():
+            attribute, child_model = RELATIONS[node_model][name]
+            relation = getattr(node_model, attribute)
+
+            if relation.property.uselist:
+                child_loader = selectinload(relation) if loader is None else loader.selectinload(relation)
+            else:
+                child_loader = joinedload(relation) if loader is None else loader.joinedload(relation)
+
+            if children:
+                walk(child_model, children, child_loader)
+            else:
+                options.append(child_loader)
+
+    walk(model, include)
+    options.append(raiseload("*"))
+
+    return options
+
+
+def serialise(
+    entity: Base,
+    include: IncludeTree,
+    field_sets: FieldSets,
+    path: tuple[str, ...] = (),
+) -> dict[str, Any]:
+    model = type(entity)
+    wanted = field_sets.get(path)
+
+    data: dict[str, Any] = {"id": entity.id}
+
+    for name in FIELDS[model]:
+        if wanted is None or name in wanted:
+            data[name] = getattr(entity, name)
+
+    for name, children in include.items():
+        attribute, _ = RELATIONS[model][name]
+        related = getattr(entity, attribute)
+        child_path = path + (name,)
+
+        if isinstance(related, list):
+            data[name] = [serialise(child, children, field_sets, child_path) for child in related]
+        elif related is not None:
+            data[name] = serialise(related, children, field_sets, child_path)
+        else:
+            data[name] = None
+
+    return data
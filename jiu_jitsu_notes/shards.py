@@ -0,0 +1,279 @@
+import argparse
+import bisect
+import hashlib
+
+from sqlalchemy import Engine, Table, create_engine, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import schema
+from .models import Base, Change, ChangeLogState, Job, Publication, ShardAssignment, Token, Trigram, User
+
+# Tables that live only in the directory database, whichever shard a user's notes are on.
+DIRECTORY_MODELS: tuple[type[Base], ...] = (User, Token, ShardAssignment, Publication, Job)
+DIRECTORY_TABLES: set[str] = {model.__tablename__ for model in DIRECTORY_MODELS}
+
+# Shard-local tables that are rebuilt rather than copied when a user moves shard.
+REBUILT_TABLES: set[str] = {User.__tablename__, Change.__tablename__, Trigram.__tablename__}
+
+# Shard-local tables describing the database itself rather than any one user's notes.
+DATABASE_TABLES: set[str] = {ChangeLogState.__tablename__}
+
+
+def parse_shards(value: str, default_uri: str) -> dict[str, str]:
+    """Parse "name=uri,name=uri" into an ordered mapping, falling back to a single default shard."""
+    shards: dict[str, str] = {}
+
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, _, uri = entry.partition("=")
+        shards[name.strip()] = uri.strip()
+
+    return shards or {"default": default_uri}
+
+
+class ShardRouter:
+    """Places users on shards with a consistent-hash ring and pins the placement in the directory."""
+
+    def __init__(self, directory: Engine, shards: dict[str, str], directory_uri: str, replicas: int = 64) -> None:
+        self.directory = directory
+        self.engines: dict[str, Engine] = {
+            name: directory if uri == directory_uri else create_engine(uri) for name, uri in shards.items()
+        }
+        self.ring: list[tuple[int, str]] = sorted(
+            (self.hash(f"{name}:{replica}"), name) for name in shards for replica in range(replicas)
+        )
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    @property
+    def sharded(self) -> bool:
+        return any(engine is not self.directory for engine in self.engines.values())
+
+    def ring_shard(self, user_id: int) -> str:
+        index = bisect.bisect(self.ring, (self.hash(str(user_id)), "")) % len(self.ring)
+        return self.ring[index][1]
+
+    def shard_for(self, user_id: int, assigned: str | None = None) -> str:
+        """The shard holding a user's notes, pinning them to their ring shard the first time.
+
+        Pass `assigned` when the user's assignment was already loaded along with them. Lookups and
+        new assignments use a directory session of their own, so they never commit a caller's work.
+        """
+        if not self.sharded:
+            return next(iter(self.engines))
+
+        if assigned in self.engines:
+            return assigned
+
+        with Session(self.directory) as directory:
+            assignment = directory.get(ShardAssignment, user_id)
+
+            if assignment is not None and assignment.shard in self.engines:
+                return assignment.shard
+
+            user = directory.get(User, user_id)
+
+            if user is None:
+                raise ValueError(f"No user with id {user_id}")
+
+            shard = self.ring_shard(user_id)
+            self.ensure_user_row(shard, user)
+
+            directory.merge(ShardAssignment(user_id=user_id, shard=shard))
+            directory.commit()
+
+        return shard
+
+    def ensure_user_row(self, shard: str, user: User) -> None:
+        """Shard tables reference users.id, so each shard keeps a credential-less copy of the user row."""
+        engine = self.engines[shard]
+
+        if engine is self.directory:
+            return
+
+        with Session(engine) as session:
+            if session.get(User, user.id) is None:
+                session.execute(
+                    insert(User).values(id=user.id, username=user.username, email=user.email, password_hash="")
+                )
+                session.commit()
+
+    def create_all(self) -> None:
+        """Create missing tables on every database and upgrade those an older schema created."""
+        Base.metadata.create_all(bind=self.directory)
+        schema.upgrade(self.directory)
+
+        for engine in self.engines.values():
+            if engine is not self.directory:
+                Base.metadata.create_all(bind=engine)
+                schema.upgrade(engine)
+
+
+class ShardedSession(Session):
+    """Sends directory tables to the directory database and everything else to the routed shard."""
+
+    def __init__(self, *args, router: ShardRouter, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.router = router
+        self.shard: str | None = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if mapper is not None and mapper.local_table.name in DIRECTORY_TABLES:
+            return self.router.directory
+
+        if self.shard is not None:
+            return self.router.engines[self.shard]
+
+        if self.router.sharded:
+            raise RuntimeError("Session must be routed to a user's shard before touching their notes")
+
+        return next(iter(self.router.engines.values()))
+
+
+def sharded_tables() -> list[Table]:
+    return [
+        table for table in Base.metadata.sorted_tables if table.name not in DIRECTORY_TABLES | DATABASE_TABLES
+    ]
+
+
+def move_user(router: ShardRouter, user_id: int, target: str) -> dict[str, int]:
+    """Copy a user's notes to another shard, repoint the directory and delete the originals.
+
+    Row ids are reassigned on the target shard, so the user's token is revoked first to
+    log them out: nothing can write to the source shard mid-move or follow a stale link.
+    The change log restarts on the target with one change per moved entity, and the trigram
+    index, whose rows point at entities by id, is rebuilt from the copied rows. References to
+    another user's rows, which older versions allowed for technique targets, are cleared.
+
+    Each app process notices the move the next time it routes one of the user's sessions, and
+    then drops their buffered autosaves and every cache keyed by their old ids.
+    """
+    from .db import CHANGE_ENTITIES, TRIGRAM_MODELS, trigram_rows
+
+    with ShardedSession(router=router) as directory:
+        user = directory.get(User, user_id)
+
+        if user is None:
+            raise ValueError(f"No user with id {user_id}")
+
+        source = router.shard_for(user_id)
+
+        if source == target:
+            return {}
+
+        token_id = user.token_id
+
+        if token_id is not None:
+            directory.execute(update(User).where(User.id == user_id).values(token_id=None))
+            directory.execute(delete(Token).where(Token.id == token_id))
+            directory.commit()
+
+        router.ensure_user_row(target, user)
+
+    id_maps: dict[str, dict[int, int]] = {}
+    copied: dict[str, int] = {}
+    tables = sharded_tables()
+
+    with router.engines[source].connect() as reader, router.engines[target].begin() as writer:
+        for table in tables:
+            if table.name in REBUILT_TABLES:
+                continue
+
+            rows = reader.execute(select(table).where(owned_by(table, user_id, id_maps))).mappings().all()
+            id_map = id_maps.setdefault(table.name, {})
+
+            for row in rows:
+                values = dict(row)
+
+                for column in table.columns:
+                    for foreign_key in column.foreign_keys:
+                        target_map = id_maps.get(foreign_key.column.table.name)
+
+                        if target_map is None or values[column.name] is None:
+                            continue
+
+                        if values[column.name] in target_map:
+                            values[column.name] = target_map[values[column.name]]
+                        elif column.nullable:
+                            values[column.name] = None
+                        else:
+                            referred = foreign_key.column.table.name
+                            raise ValueError(f"{table.name} row {dict(row)} refers to another user's {referred}")
+
+                if "id" in table.columns and table.c.id.autoincrement:
+                    old_id = values.pop("id")
+                    id_map[old_id] = writer.execute(insert(table).values(values)).inserted_primary_key[0]
+                else:
+                    writer.execute(insert(table).values(values))
+
+            copied[table.name] = len(rows)
+
+        for model, entity in CHANGE_ENTITIES.items():
+            for entity_id in id_maps.get(model.__tablename__, {}).values():
+                writer.execute(insert(Change).values(user_id=user_id, entity=entity, entity_id=entity_id))
+
+        for model in TRIGRAM_MODELS:
+            moved = list(id_maps.get(model.__tablename__, {}).values())
+            rows = writer.execute(select(model.user_id, model.id, model.name, model.description).where(model.id.in_(moved))).all()
+
+            if values := trigram_rows(model, rows):
+                writer.execute(insert(Trigram), values)
+
+    with ShardedSession(router=router) as directory:
+        directory.merge(ShardAssignment(user_id=user_id, shard=target))
+        directory.commit()
+
+    with router.engines[source].begin() as connection:
+        for table in reversed(tables):
+            if table.name != User.__tablename__:
+                connection.execute(delete(table).where(owned_by(table, user_id, id_maps)))
+
+    return copied
+
+
+def owned_by(table: Table, user_id: int, id_maps: dict[str, dict[int, int]]):
+    if "user_id" in table.columns:
+        return table.c.user_id == user_id
+
+    for column in table.columns:
+        for foreign_key in column.foreign_keys:
+            if foreign_key.column.table.name in id_maps:
+                return column.in_(list(id_maps[foreign_key.column.table.name]))
+
+    raise ValueError(f"Cannot tell which rows of {table.name!r} belong to a user")
+
+
+def main() -> None:
+    from . import db
+
+    parser = argparse.ArgumentParser(description="Inspect and rebalance user shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="Show each shard and how many users are pinned to it")
+
+    move = commands.add_parser("move", help="Move a user's notes to another shard")
+    move.add_argument("user_id", type=int)
+    move.add_argument("shard", choices=list(db.shard_router.engines))
+
+    arguments = parser.parse_args()
+    db.shard_router.create_all()
+
+    if arguments.command == "list":
+        with ShardedSession(router=db.shard_router) as directory:
+            for shard in db.shard_router.engines:
+                count = directory.query(ShardAssignment).filter_by(shard=shard).count()
+                print(f"{shard}: {count} users")
+
+    if arguments.command == "move":
+        try:
+            copied = move_user(db.shard_router, arguments.user_id, arguments.shard)
+        except ValueError as error:
+            parser.error(str(error))
+
+        for table, count in copied.items():
+            print(f"{table}: {count} rows moved")
+
+
+if __name__ == "__main__":
+    main()
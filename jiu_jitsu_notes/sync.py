@@ -0,0 +1,96 @@
+import os
+from datetime import timedelta
+from typing import Any
+
+from . import db, serialisers
+from .models import ChangeLogState, Position, Technique, User
+from .shards import ShardedSession
+
+COMPACTION_INTERVAL_SECONDS: float = float(os.environ.get("CHANGE_COMPACTION_INTERVAL", "3600"))
+TOMBSTONE_RETENTION = timedelta(days=float(os.environ.get("CHANGE_TOMBSTONE_DAYS", "30")))
+MAXIMUM_PAGE_SIZE = 500
+
+ENTITY_MODELS = {name: model for model, name in db.CHANGE_ENTITIES.items()}
+
+# Relations sent with each entity; tag membership is part of a position or technique, so a
+# change to it is recorded as a change to them.
+INCLUDES: dict[type, serialisers.IncludeTree] = {Position: {"tags": {}}, Technique: {"tags": {}}}
+
+
+def parse_cursor(cursor: str | None, shard: str, state: ChangeLogState) -> tuple[int, bool]:
+    """Return the change id to resume after and whether the client must discard its copy.
+
+    Cursors name the shard and change log epoch they were issued in: change ids restart when a user
+    moves shard, and go back when the shard is restored from a backup. Cursors before the horizon
+    may have missed deletions that compaction has since dropped.
+    """
+    if not cursor:
+        return 0, False
+
+    parts = cursor.rsplit(":", 2)
+
+    if len(parts) != 3 or parts[0] != shard or parts[1] != state.epoch or not parts[2].isdigit():
+        return 0, True
+
+    if int(parts[2]) < state.horizon:
+        return 0, True
+
+    return int(parts[2]), False
+
+
+def changes_page(session: ShardedSession, user: User, cursor: str | None, limit: int) -> dict[str, Any]:
+    state = db.change_log_state(session)
+    since, reset = parse_cursor(cursor, session.shard, state)
+    limit = min(limit, MAXIMUM_PAGE_SIZE)
+    changes = db.changes_since(session, user, since, limit + 1)
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest = {(change.entity, change.entity_id): change for change in changes}
+    upserted: dict[str, list[int]] = {}
+
+    for (entity, entity_id), change in latest.items():
+        if not change.deleted:
+            upserted.setdefault(entity, []).append(entity_id)
+
+    loaded = {
+        (entity, row.id): row
+        for entity, ids in upserted.items()
+        for row in db.entities_by_ids(session, user, ENTITY_MODELS[entity], ids, with_tags=ENTITY_MODELS[entity] in INCLUDES)
+    }
+
+    entries = []
+
+    for change in sorted(latest.values(), key=lambda change: change.id):
+        key = (change.entity, change.entity_id)
+        entity = loaded.get(key)
+
+        entries.append(
+            {
+                "entity": change.entity,
+                "id": change.entity_id,
+                "deleted": entity is None,
+                "data": None if entity is None else serialisers.serialise(entity, INCLUDES.get(type(entity), {}), {}),
+            }
+        )
+
+    next_since = changes[-1].id if changes else since
+
+    return {
+        "cursor": f"{session.shard}:{state.epoch}:{next_since}",
+        "reset": reset,
+        "has_more": has_more,
+        "changes": entries,
+    }
+
+
+def compact_all_shards() -> int:
+    compacted = 0
+
+    for shard in db.shard_router.engines:
+        with db.SessionLocal() as session:
+            session.shard = shard
+            compacted += db.compact_changes(session, TOMBSTONE_RETENTION)
+
+    return compacted
@@ -0,0 +1,249 @@
+import re
+import threading
+
+from sqlalchemy.orm import Session
+
+from . import db, events
+from .models import Technique, User
+
+_WHITESPACE = re.compile(r"\s+")
+_TOKENS = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+OPERATORS = {"AND", "OR", "NOT"}
+
+
+def normalise(name: str) -> str:
+    return _WHITESPACE.sub("-", name.strip().casefold())
+
+
+def parse_tag_names(value: str | None) -> list[str]:
+    """Split a comma separated form field into unique, normalised tag names."""
+    names = (normalise(name) for name in (value or "").split(","))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+class TagQueryError(ValueError):
+    """A tag query that doesn't parse."""
+
+
+class TagIndex:
+    """Bitmap per tag over one user's techniques.
+
+    Each technique gets a dense ordinal and each tag a Python int whose set bits are the ordinals
+    tagged with it, so filters are a handful of big-integer AND/OR/NOT operations. A technique
+    carries its own tags and those of the position it starts from.
+
+    The bitmaps are left uncompressed: ordinals are dense and freed ones are reused, so a bitmap
+    costs at most one bit per technique, a few hundred bytes for a large notebook, where a
+    compressed format would only add work to every operation.
+    """
+
+    def __init__(self) -> None:
+        self.ordinals: dict[int, int] = {}
+        self.technique_ids: list[int | None] = []
+        self.free: list[int] = []
+        self.bitmaps: dict[str, int] = {}
+        self.universe = 0
+        self.lock = threading.Lock()
+
+    def ordinal(self, technique_id: int) -> int:
+        ordinal = self.ordinals.get(technique_id)
+
+        if ordinal is None:
+            if self.free:
+                ordinal = self.free.pop()
+                self.technique_ids[ordinal] = technique_id
+            else:
+                ordinal = len(self.technique_ids)
+                self.technique_ids.append(technique_id)
+
+            self.ordinals[technique_id] = ordinal
+            self.universe |= 1 << ordinal
+
+        return ordinal
+
+    def set_tags(self, technique_id: int, tags: set[str]) -> None:
+        with self.lock:
+            bit = 1 << self.ordinal(technique_id)
+
+            for tag, bitmap in list(self.bitmaps.items()):
+                if bitmap & bit and tag not in tags:
+                    self.bitmaps[tag] = bitmap & ~bit
+
+            for tag in tags:
+                self.bitmaps[tag] = self.bitmaps.get(tag, 0) | bit
+
+    def remove(self, technique_id: int) -> None:
+        with self.lock:
+            ordinal = self.ordinals.pop(technique_id, None)
+
+            if ordinal is None:
+                return
+
+            mask = ~(1 << ordinal)
+            self.bitmaps = {tag: bitmap & mask for tag, bitmap in self.bitmaps.items()}
+            self.universe &= mask
+            self.technique_ids[ordinal] = None
+            self.free.append(ordinal)
+
+    def evaluate(self, query: str) -> int:
+        with self.lock:
+            return Parser(query, self.bitmaps, self.universe).parse()
+
+    def ids(self, bitmap: int) -> list[int]:
+        ids = []
+
+        while bitmap:
+            lowest = bitmap & -bitmap
+            ids.append(self.technique_ids[lowest.bit_length() - 1])
+            bitmap ^= lowest
+
+        return sorted(ids)
+
+    def filter(self, query: str) -> list[int]:
+        return self.ids(self.evaluate(query))
+
+
+class Parser:
+    """Recursive descent over `or := and (OR and)*`, `and := not ([AND] not)*`, `not := NOT not | ( or ) | tag`."""
+
+    def __init__(self, query: str, bitmaps: dict[str, int], universe: int) -> None:
+        self.tokens = self.tokenise(query)
+        self.position = 0
+        self.bitmaps = bitmaps
+        self.universe = universe
+
+    @staticmethod
+    def tokenise(query: str) -> list[tuple[str, str]]:
+        tokens = []
+        query = query.strip()
+        index = 0
+
+        while index < len(query):
+            match = _TOKENS.match(query, index)
+
+            if match is None:
+                raise TagQueryError(f"Cannot parse tag query at {query[index:]!r}")
+
+            opening, closing, quoted, word = match.groups()
+            index = match.end()
+
+            if opening or closing:
+                tokens.append(("paren", opening or closing))
+            elif quoted is not None:
+                tokens.append(("tag", normalise(quoted)))
+            elif word.upper() in OPERATORS:
+                tokens.append(("operator", word.upper()))
+            else:
+                tokens.append(("tag", normalise(word)))
+
+        return tokens
+
+    def peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> tuple[str, str]:
+        token = self.peek()
+
+        if token is None:
+            raise TagQueryError("Tag query ended unexpectedly")
+
+        self.position += 1
+        return token
+
+    def parse(self) -> int:
+        if not self.tokens:
+            return self.universe
+
+        result = self.parse_or()
+
+        if self.peek() is not None:
+            raise TagQueryError(f"Unexpected {self.peek()[1]!r} in tag query")
+
+        return result
+
+    def parse_or(self) -> int:
+        result = self.parse_and()
+
+        while self.peek() == ("operator", "OR"):
+            self.take()
+            result |= self.parse_and()
+
+        return result
+
+    def parse_and(self) -> int:
+        result = self.parse_not()
+
+        while (token := self.peek()) is not None and token not in (("operator", "OR"), ("paren", ")")):
+            if token == ("operator", "AND"):
+                self.take()
+
+            result &= self.parse_not()
+
+        return result
+
+    def parse_not(self) -> int:
+        kind, value = self.take()
+
+        if (kind, value) == ("operator", "NOT"):
+            return self.universe & ~self.parse_not()
+
+        if (kind, value) == ("paren", "("):
+            result = self.parse_or()
+
+            if self.take() != ("paren", ")"):
+                raise TagQueryError("Missing ')' in tag query")
+
+            return result
+
+        if kind != "tag":
+            raise TagQueryError(f"Unexpected {value!r} in tag query")
+
+        return self.bitmaps.get(value, 0)
+
+
+_indexes: dict[int, TagIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for_user(session: Session, user: User) -> TagIndex:
+    index = _indexes.get(user.id)
+
+    if index is None:
+        index = TagIndex()
+        tags: dict[int, set[str]] = {technique_id: set() for technique_id in db.technique_ids_for_user(session, user)}
+
+        for technique_id, name in db.technique_tag_names(session, user):
+            tags.setdefault(technique_id, set()).add(name)
+
+        for technique_id, names in tags.items():
+            index.set_tags(technique_id, names)
+
+        with _indexes_lock:
+            index = _indexes.setdefault(user.id, index)
+
+    return index
+
+
+def filter_techniques(session: Session, user: User, query: str) -> list[int]:
+    return index_for_user(session, user).filter(query)
+
+
+def technique_saved(user_id: int, technique: Technique) -> None:
+    index = _indexes.get(user_id)
+
+    if index is not None:
+        position_tags = technique.from_position.tags if technique.from_position is not None else []
+        index.set_tags(technique.id, {tag.name for tag in [*technique.tags, *position_tags]})
+
+
+def technique_deleted(user_id: int, technique_id: int) -> None:
+    index = _indexes.get(user_id)
+
+    if index is not None:
+        index.remove(technique_id)
+
+
+@events.on_user_moved
+def invalidate(user_id: int) -> None:
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
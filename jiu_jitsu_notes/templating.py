@@ -0,0 +1,6 @@
+from fastapi.templating import Jinja2Templates
+
+from .profiling import ProfiledTemplate
+
+templates = Jinja2Templates(directory="templates")
+templates.env.template_class = ProfiledTemplate
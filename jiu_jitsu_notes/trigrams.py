@@ -0,0 +1,36 @@
+import math
+import re
+
+_WORDS = re.compile(r"[^\W_]+")
+
+NAME_WEIGHT = 0.75
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams of each casefolded word, padded like pg_trgm so "Closed-guard" and "closed guard " match."""
+    result: set[str] = set()
+
+    for word in _WORDS.findall(text.casefold()):
+        padded = f"  {word} "
+        result.update(padded[index : index + 3] for index in range(len(padded) - 2))
+
+    return result
+
+
+def similarity(shared: int, first: int, second: int) -> float:
+    """Jaccard similarity of two trigram sets from their sizes and how many trigrams they share."""
+    union = first + second - shared
+
+    return shared / union if union else 0.0
+
+
+def minimum_shared(size: int, threshold: float) -> int:
+    """Fewest shared trigrams a set of `size` needs with any other set to reach `threshold`."""
+    return max(1, math.ceil(threshold * size - 1e-9))
+
+
+def blend(name_similarity: float, description_similarity: float | None) -> float:
+    if description_similarity is None:
+        return name_similarity
+
+    return NAME_WEIGHT * name_similarity + (1 - NAME_WEIGHT) * description_similarity
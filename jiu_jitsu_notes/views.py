@@ -0,0 +1,27 @@
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class TechniqueView:
+    id: int
+    name: str
+    description: str
+    from_position_id: int
+    to_position_id: int | None
+    tags: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class PositionView:
+    id: int
+    name: str
+    description: str
+    techniques_from: list[TechniqueView] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class GroupView:
+    id: int
+    name: str
+    description: str
+    positions: list[PositionView] = field(default_factory=list)
@@ -7,3 +7,25 @@ def client():
     from jiu_jitsu_notes.app import app
 
     return TestClient(app)
+
+
+@fixture
+def database(tmp_path, monkeypatch):
+    """A fresh SQLite database that every db.py session is routed to for the length of a test."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from jiu_jitsu_notes import db
+    from jiu_jitsu_notes.shards import ShardedSession, ShardRouter
+
+    uri = f"sqlite:///{tmp_path / 'notes.db'}"
+    engine = create_engine(uri)
+    router = ShardRouter(engine, {"default": uri}, uri)
+    router.create_all()
+
+    monkeypatch.setattr(db, "shard_router", router)
+    monkeypatch.setattr(db, "SessionLocal", sessionmaker(class_=ShardedSession, router=router))
+
+    yield engine
+
+    engine.dispose()
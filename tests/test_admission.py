@@ -0,0 +1,80 @@
+import asyncio
+import uuid
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from jiu_jitsu_notes import admission
+
+
+def limited_app(backend: admission.InMemoryBackend, tokens: dict[str, int], **limits) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        admission.AdmissionControlMiddleware,
+        backend=backend,
+        users=admission.TokenUsers(tokens.get),
+        **limits,
+    )
+
+    @app.get("/api/ping")
+    async def ping():
+        await asyncio.sleep(0.1)
+        return {}
+
+    return app
+
+
+def get(client: TestClient, token: str) -> int:
+    client.cookies.set("token", token)
+    return client.get("/api/ping").status_code
+
+
+def test_user_bucket_is_keyed_by_user_and_skipped_for_unknown_tokens(monkeypatch):
+    monkeypatch.setattr(admission, "USER_RATE", 0.01)
+    monkeypatch.setattr(admission, "USER_BURST", 2)
+    backend = admission.InMemoryBackend()
+    client = TestClient(limited_app(backend, {"first": 1, "second": 1}))
+
+    assert [get(client, token) for token in ("first", "second", "first")] == [200, 200, 429]
+
+    for _ in range(5):
+        assert get(client, str(uuid.uuid4())) == 200
+
+    assert set(backend.buckets) == {"ip:testclient", "user:1"}
+
+
+def test_rejected_request_charges_no_bucket(monkeypatch):
+    monkeypatch.setattr(admission, "USER_RATE", 0.01)
+    monkeypatch.setattr(admission, "USER_BURST", 1)
+    backend = admission.InMemoryBackend()
+    client = TestClient(limited_app(backend, {"token": 1}))
+
+    assert get(client, "token") == 200
+    ip_tokens = backend.buckets["ip:testclient"][0]
+
+    assert get(client, "token") == 429
+    assert backend.buckets["ip:testclient"][0] >= ip_tokens
+
+
+def test_backend_forgets_least_recently_used_buckets():
+    backend = admission.InMemoryBackend(max_keys=3)
+
+    for key in ("a", "b", "c", "a", "d", "e"):
+        backend.take([(key, 1.0, 10.0)], 1.0)
+
+    assert list(backend.buckets) == ["a", "d", "e"]
+
+
+def test_requests_beyond_the_queue_are_turned_away():
+    app = limited_app(admission.InMemoryBackend(), {}, max_concurrent=1, max_queued=0)
+
+    async def concurrent() -> list[int]:
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(client.get("/api/ping") for _ in range(3)))
+
+        return sorted(response.status_code for response in responses)
+
+    assert asyncio.run(concurrent()) == [200, 503, 503]
@@ -0,0 +1,86 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import auth, autosave
+from jiu_jitsu_notes.models import Position, PositionGroup, Technique, User
+from jiu_jitsu_notes.routes.api import autosave as autosave_routes
+
+
+def seed(engine) -> tuple[User, User]:
+    with Session(engine, expire_on_commit=False) as session:
+        users = [User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", password_hash="") for user_id in (1, 2)]
+        session.add_all(users)
+        session.flush()
+
+        for user_id in (1, 2):
+            session.execute(insert(PositionGroup).values(id=user_id, user_id=user_id, name="Guard", description=""))
+            session.execute(insert(Position).values(id=user_id, user_id=user_id, group_id=user_id, name="Closed guard", description=""))
+            session.execute(
+                insert(Technique).values(id=user_id, user_id=user_id, name="Armbar", description="", from_position_id=user_id)
+            )
+
+        session.commit()
+
+    return users[0], users[1]
+
+
+def test_target_position_must_belong_to_the_user(database, monkeypatch):
+    first, second = seed(database)
+    buffer = autosave.AutosaveBuffer()
+    monkeypatch.setattr(autosave, "buffer", buffer)
+
+    app = FastAPI()
+    app.include_router(autosave_routes.router)
+    app.dependency_overrides[auth.current_user] = lambda: first
+    client = TestClient(app)
+
+    assert client.patch("/techniques/1", data={"to_position_id": str(second.id)}).status_code == 422
+    assert client.patch("/techniques/1", data={"to_position_id": "999"}).status_code == 422
+    assert buffer.pending == {}
+
+    assert client.patch("/techniques/1", data={"to_position_id": "1"}).status_code == 204
+    assert buffer.pending[("techniques", first.id, 1)].values == {"to_position_id": 1}
+
+
+def test_rejected_edit_is_dropped_without_failing_the_rest_of_its_shard(database):
+    first, second = seed(database)
+    buffer = autosave.AutosaveBuffer()
+
+    # Position 999 never existed, or was deleted after the request checked it.
+    buffer.buffer("techniques", first.id, 1, {"to_position_id": 999})
+    buffer.buffer("techniques", second.id, 2, {"name": "Triangle"})
+
+    assert buffer.flush(force=True) == 1
+    assert buffer.pending == {}
+    assert buffer.flush(force=True) == 0
+
+    with Session(database) as session:
+        assert session.get(Technique, 1).to_position_id is None
+        assert session.get(Technique, 2).name == "Triangle"
+
+
+def test_discard_during_a_flush_neither_waits_nor_is_overwritten(database, monkeypatch):
+    first, second = seed(database)
+    buffer = autosave.AutosaveBuffer()
+    write = autosave.AutosaveBuffer.write
+
+    def write_then_delete(session, key, values):
+        write(session, key, values)
+
+        # A delete request arrives while the flush holds flush_lock.
+        if key[1] == first.id:
+            assert buffer.flush_lock.locked()
+            buffer.discard(*key)
+
+    monkeypatch.setattr(buffer, "write", write_then_delete)
+    buffer.buffer("techniques", first.id, 1, {"name": "Kimura"})
+    buffer.buffer("techniques", second.id, 2, {"name": "Triangle"})
+
+    assert buffer.flush(force=True) == 1
+    assert buffer.pending == {}
+
+    with Session(database) as session:
+        assert session.get(Technique, 1).name == "Armbar"
+        assert session.get(Technique, 2).name == "Triangle"
@@ -0,0 +1,37 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from jiu_jitsu_notes import backup
+
+
+def test_snapshot_round_trip_and_damage_detection(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIRECTORY", tmp_path / "backups")
+
+    source = tmp_path / "notes.db"
+    connection = sqlite3.connect(source)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)")
+    connection.executemany("INSERT INTO notes (body) VALUES (?)", [(f"note {index}",) for index in range(1000)])
+    connection.commit()
+
+    taken_at = datetime(2024, 1, 1)
+    path = backup.snapshot_path("directory", "sqlite", taken_at)
+    backup.snapshot_sqlite(str(source), path)
+
+    snapshot = backup.snapshot_at("directory")
+    assert snapshot.path == path
+
+    restored = backup.decompress(snapshot, tmp_path)
+    assert sqlite3.connect(restored).execute("SELECT count(*) FROM notes").fetchone() == (1000,)
+
+    damaged = bytearray(path.read_bytes())
+    damaged[len(damaged) // 2] ^= 0xFF
+    path.write_bytes(bytes(damaged))
+
+    with pytest.raises(ValueError):
+        backup.verify(snapshot)
+
+    with pytest.raises(ValueError):
+        backup.snapshot_at("directory", datetime(2023, 1, 1))
@@ -0,0 +1,120 @@
+import asyncio
+import sys
+import threading
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from jiu_jitsu_notes import auth, coalescing, db, metrics, prefetch
+from jiu_jitsu_notes.models import User
+from jiu_jitsu_notes.routes import pages
+
+BURST = 50
+
+
+def test_burst_of_identical_requests_loads_once(monkeypatch):
+    user = User(id=1, username="burst", email="burst@example.com", password_hash="")
+    loads = []
+    loads_lock = threading.Lock()
+
+    def group_views_for_user(session, user):
+        with loads_lock:
+            loads.append(user.id)
+
+        time.sleep(0.2)
+        return []
+
+    monkeypatch.setattr(db, "group_views_for_user", group_views_for_user)
+
+    app = FastAPI()
+    app.include_router(pages.router)
+    app.dependency_overrides[auth.current_user] = lambda: user
+
+    coalesced_before = metrics.counter("coalescing.coalesced")
+
+    async def burst() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get("/groups") for _ in range(BURST)))
+
+    responses = asyncio.run(burst())
+
+    assert [response.status_code for response in responses] == [200] * BURST
+    assert len({response.text for response in responses}) == 1
+    assert loads == [user.id]
+    assert metrics.counter("coalescing.coalesced") - coalesced_before == BURST - 1
+
+    coalescing.bump_data_version(user.id)
+    asyncio.run(burst())
+
+    assert loads == [user.id, user.id]
+
+
+def test_prefetched_page_is_served_without_loading(monkeypatch):
+    user = User(id=2, username="prefetch", email="prefetch@example.com", password_hash="")
+    loads = []
+
+    monkeypatch.setattr(prefetch, "load_working_set", lambda user_id: (user, []))
+    monkeypatch.setattr(db, "group_views_for_user", lambda session, user: loads.append(user.id) or [])
+
+    app = FastAPI()
+    app.include_router(pages.router)
+    app.dependency_overrides[auth.current_user] = lambda: user
+
+    assert asyncio.run(prefetch.warm(user.id)) == 1
+
+    hits_before = metrics.counter("fragments.hit")
+    response = TestClient(app).get("/groups")
+
+    assert response.status_code == 200
+    assert loads == []
+    assert metrics.counter("fragments.hit") - hits_before == 1
+
+    coalescing.bump_data_version(user.id)
+    TestClient(app).get("/groups")
+
+    assert loads == [user.id]
+
+
+def test_first_pages_expire_and_are_bounded(monkeypatch):
+    monkeypatch.setattr(coalescing, "_first_pages", coalescing.OrderedDict())
+    monkeypatch.setattr(coalescing, "FIRST_PAGE_USERS", 2)
+
+    for user_id in range(1, 4):
+        coalescing.expect_first_page(user_id, True)
+
+    assert list(coalescing._first_pages) == [2, 3]
+    assert coalescing.first_page(3) is True
+    assert coalescing.first_page(3) is None
+
+    monkeypatch.setattr(coalescing, "FIRST_PAGE_WINDOW_SECONDS", 0)
+    time.sleep(0.01)
+
+    assert coalescing.first_page(2) is None
+
+    coalescing.expect_first_page(4, False)
+
+    assert list(coalescing._first_pages) == [4]
+
+
+def test_fragment_cache_keeps_to_its_total_budget_and_ttl(monkeypatch):
+    page = "x" * 1000
+    size = sys.getsizeof(page)
+    cache = coalescing.FragmentCache(budget=size * 2, total_budget=size * 3, ttl=60)
+
+    for user_id in (1, 2):
+        cache.put(user_id, "a", page)
+        cache.put(user_id, "b", page)
+
+    assert cache.stats() == {"users": 2, "fragments": 3, "bytes": size * 3}
+    assert cache.get(1, "a") is None
+    assert cache.get(1, "b") == page
+
+    now = time.monotonic()
+    monkeypatch.setattr(coalescing.time, "monotonic", lambda: now + 61)
+
+    assert cache.get(2, "a") is None
+    assert cache.stats()["bytes"] == size * 2
@@ -0,0 +1,115 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest import fixture, mark
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import auth
+from jiu_jitsu_notes.models import Position, PositionGroup, Tag, Technique, User
+from jiu_jitsu_notes.routes.api import data
+
+
+@fixture
+def client(database) -> TestClient:
+    with Session(database, expire_on_commit=False) as session:
+        user = User(id=1, username="user1", email="user1@example.com", password_hash="")
+        other = User(id=2, username="user2", email="user2@example.com", password_hash="")
+        group = PositionGroup(id=1, user=user, name="Guard", description="Bottom positions")
+        closed = Position(id=1, user=user, group=group, name="Closed guard", description="", submission=False)
+        mount = Position(id=2, user=user, group=group, name="Mount", description="", submission=False)
+        sweep = Tag(id=1, user_id=1, name="sweep")
+
+        session.add_all(
+            [
+                Technique(id=1, user=user, name="Scissor", description="", from_position=closed, to_position=mount),
+                Technique(id=2, user=user, name="Hip bump", description="", from_position=closed, to_position=mount),
+                Technique(id=3, user=user, name="Armbar", description="", from_position=closed),
+                Technique(id=4, user=user, name="Americana", description="", from_position=mount),
+                PositionGroup(id=2, user=other, name="Other", description=""),
+            ]
+        )
+        session.flush()
+        session.get(Technique, 1).tags = [sweep]
+        session.commit()
+
+    app = FastAPI()
+    app.include_router(data.router)
+    app.dependency_overrides[auth.current_user] = lambda: user
+
+    return TestClient(app)
+
+
+def test_fields_and_include_shape_the_response(client, database):
+    statements = []
+    event.listen(database, "before_cursor_execute", lambda *arguments: statements.append(arguments[2]))
+
+    response = client.get(
+        "/groups",
+        params={
+            "include": "positions.techniques,positions.techniques_to",
+            "fields": "name,positions.name,positions.techniques.name,positions.techniques_to.name",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "id": 1,
+            "name": "Guard",
+            "positions": [
+                {
+                    "id": 1,
+                    "name": "Closed guard",
+                    "techniques": [
+                        {"id": 1, "name": "Scissor"},
+                        {"id": 2, "name": "Hip bump"},
+                        {"id": 3, "name": "Armbar"},
+                    ],
+                    "techniques_to": [],
+                },
+                {
+                    "id": 2,
+                    "name": "Mount",
+                    "techniques": [{"id": 4, "name": "Americana"}],
+                    "techniques_to": [{"id": 1, "name": "Scissor"}, {"id": 2, "name": "Hip bump"}],
+                },
+            ],
+        }
+    ]
+    # Sibling collections are loaded separately rather than joined into one row per combination.
+    assert sum("JOIN" in statement for statement in statements) == 0
+
+    technique = client.get("/techniques/1", params={"include": "from_position,tags", "fields": "from_position.name"})
+
+    assert technique.status_code == 200
+    assert technique.json() == {
+        "id": 1,
+        "name": "Scissor",
+        "description": "",
+        "from_position_id": 1,
+        "to_position_id": 2,
+        "from_position": {"id": 1, "name": "Closed guard"},
+        "tags": [{"id": 1, "name": "sweep"}],
+    }
+
+
+@mark.parametrize(
+    "path, params, detail",
+    [
+        ("/groups", {"include": "techniques"}, "Cannot include 'techniques'"),
+        ("/positions", {"include": "techniques.owner"}, "Cannot include 'techniques.owner'"),
+        ("/groups", {"fields": "colour"}, "Unknown field 'colour'"),
+        ("/groups", {"include": "positions", "fields": "positions.colour"}, "Unknown field 'positions.colour'"),
+        ("/groups", {"fields": "positions.name"}, "Field 'positions.name' belongs to a relation that is not included"),
+    ],
+)
+def test_unknown_fields_and_relations_are_rejected(client, path, params, detail):
+    response = client.get(path, params=params)
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": detail}
+
+
+def test_other_users_entities_are_not_found(client):
+    assert client.get("/groups/2").status_code == 404
+    assert [group["id"] for group in client.get("/groups").json()] == [1]
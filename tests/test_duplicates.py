@@ -0,0 +1,142 @@
+from itertools import combinations
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest import approx, mark
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import auth, db, duplicates, trigrams
+from jiu_jitsu_notes.models import Position, PositionGroup, User
+from jiu_jitsu_notes.routes.api import duplicates as duplicate_routes
+
+NAMES = [
+    "Closed Guard",
+    "closed-guard",
+    "Closed guard break",
+    "Open guard",
+    "Half guard",
+    "Deep half guard",
+    "Half-guard sweep",
+    "Mount",
+    "Low mount",
+    "Side control",
+    "Side-control escape",
+    "Back control",
+    "Knee on belly",
+    "Turtle",
+]
+
+
+def jaccard(first: set[str], second: set[str]) -> float:
+    return len(first & second) / len(first | second)
+
+
+def brute_force_pairs(names: dict[int, set[str]], threshold: float) -> dict[tuple[int, int], float]:
+    return {
+        (first, second): similarity
+        for first, second in combinations(sorted(names), 2)
+        if (similarity := jaccard(names[first], names[second])) >= threshold
+    }
+
+
+def seed(engine) -> User:
+    with Session(engine, expire_on_commit=False) as session:
+        users = [User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", password_hash="") for user_id in (1, 2)]
+        session.add_all(users)
+        session.flush()
+
+        for user_id in (1, 2):
+            session.execute(insert(PositionGroup).values(id=user_id, user_id=user_id, name="Positions", description=""))
+
+        for position_id, name in enumerate(NAMES, start=1):
+            session.execute(insert(Position).values(id=position_id, user_id=1, group_id=1, name=name, description=""))
+
+        # Another user's notes never count as duplicates.
+        session.execute(insert(Position).values(id=100, user_id=2, group_id=2, name="Closed guard", description=""))
+
+        db.reindex_trigrams(session)
+
+    return users[0]
+
+
+@mark.parametrize("threshold", [0.2, 0.35, 0.5, 0.7, 0.9, 1.0])
+def test_similar_pairs_match_brute_force(threshold):
+    names = {entity_id: trigrams.trigrams(name) for entity_id, name in enumerate(NAMES, start=1)}
+
+    pairs = duplicates.similar_pairs(names, threshold)
+    found = {(min(first, second), max(first, second)): similarity for first, second, similarity in pairs}
+
+    assert len(found) == len(pairs)
+    assert found == approx(brute_force_pairs(names, threshold))
+
+
+def test_similar_pairs_include_identical_sets_at_full_threshold():
+    names = {1: trigrams.trigrams("Closed Guard"), 2: trigrams.trigrams("closed-guard"), 3: trigrams.trigrams("Mount")}
+
+    assert duplicates.similar_pairs(names, 1.0) == [(1, 2, 1.0)]
+
+
+@mark.parametrize("name", ["Closed Guard", "closed guard", "Half guard", "Side control escapes", "Mount", "Armbar"])
+def test_possible_duplicates_match_brute_force(database, name):
+    user = seed(database)
+    query = trigrams.trigrams(name)
+    scores = {
+        entity_id: similarity
+        for entity_id, other in enumerate(NAMES, start=1)
+        if (similarity := jaccard(query, trigrams.trigrams(other))) >= duplicates.THRESHOLD
+    }
+    expected = sorted(scores, key=lambda entity_id: (-scores[entity_id], entity_id))[: duplicates.MAXIMUM_WARNINGS]
+
+    with db.session_for_user(user.id) as session:
+        matches = duplicates.possible_duplicates(session, user, Position, name)
+
+    assert [match.id for match in matches] == expected
+    assert [match.similarity for match in matches] == approx([scores[entity_id] for entity_id in expected])
+
+
+def test_merge_suggestions_cluster_transitively_similar_names(database):
+    user = seed(database)
+    names = {entity_id: trigrams.trigrams(name) for entity_id, name in enumerate(NAMES, start=1)}
+    clusters = duplicates.DisjointSet()
+
+    for first, second in brute_force_pairs(names, duplicates.THRESHOLD):
+        clusters.union(first, second)
+
+    members: dict[int, list[int]] = {}
+
+    for entity_id in clusters.parents:
+        members.setdefault(clusters.find(entity_id), []).append(entity_id)
+
+    expected = sorted(sorted(ids) for ids in members.values() if len(ids) > 1)
+
+    with db.session_for_user(user.id) as session:
+        suggestions = duplicates.merge_suggestions(session, user, Position)
+
+    assert [[entity["id"] for entity in cluster] for cluster in suggestions] == expected
+    assert [entity["name"] for entity in suggestions[0]] == ["Closed Guard", "closed-guard", "Closed guard break"]
+
+
+def test_warns_about_closed_guard_when_adding_closed_guard(database):
+    user = seed(database)
+
+    with db.session_for_user(user.id) as session:
+        matches = duplicates.possible_duplicates(session, user, Position, "Closed Guard", exclude_id=1)
+
+    assert matches[0].id == 2
+    assert matches[0].name == "closed-guard"
+    assert matches[0].similarity == approx(1.0)
+    assert all(match.id != 100 for match in matches)
+
+    app = FastAPI()
+    app.include_router(duplicate_routes.router)
+    app.dependency_overrides[auth.current_user] = lambda: user
+    client = TestClient(app)
+
+    warning = client.get("/positions", params={"name": "Closed Guard", "exclude_id": 1})
+
+    assert warning.status_code == 200
+    assert "Possible duplicate of" in warning.text
+    assert "closed-guard" in warning.text
+
+    assert "Possible duplicate of" not in client.get("/positions", params={"name": "Armbar"}).text
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import db, jobs
+from jiu_jitsu_notes.models import Job
+
+
+def test_job_that_lost_its_lease_cannot_overwrite_the_new_owner(database, monkeypatch):
+    monkeypatch.setitem(jobs.HANDLERS, "slow", jobs.Handler(lambda user_id, payload: {"run": payload["run"]}, 1, 3))
+
+    with db.SessionLocal() as session:
+        jobs.enqueue(session, "slow", {"run": 1})
+        job = jobs.claim(session, "first")
+        job_id = job.id
+
+        # The first worker looks dead, so the job is requeued and claimed by another.
+        session.execute(update(Job).values(locked_at=datetime.utcnow() - timedelta(seconds=jobs.LEASE_SECONDS + 1)))
+        session.commit()
+        assert jobs.release_expired_leases(session) == 1
+
+        with db.SessionLocal() as other:
+            assert jobs.claim(other, "second").id == job_id
+
+        assert jobs.run_job(session, job, "first") is False
+
+    with Session(database) as session:
+        job = session.get(Job, job_id)
+        assert (job.status, job.locked_by, job.result) == ("running", "second", None)
+
+
+def test_claim_respects_the_concurrency_limit(database, monkeypatch):
+    monkeypatch.setitem(jobs.HANDLERS, "limited", jobs.Handler(lambda user_id, payload: None, 1, 3))
+
+    with db.SessionLocal() as session:
+        for _ in range(2):
+            jobs.enqueue(session, "limited")
+
+        assert jobs.claim(session, "first") is not None
+        assert jobs.claim(session, "second") is None
+
+
+def test_heartbeat_keeps_a_long_job_leased(database, monkeypatch):
+    monkeypatch.setitem(jobs.HANDLERS, "long", jobs.Handler(lambda user_id, payload: None, 1, 3))
+
+    with db.SessionLocal() as session:
+        jobs.enqueue(session, "long")
+        job = jobs.claim(session, "worker")
+        session.execute(update(Job).values(locked_at=datetime(2000, 1, 1)))
+        session.commit()
+
+        with jobs.Heartbeat(job.id, "worker", interval=0.01):
+            deadline = datetime.utcnow() + timedelta(seconds=5)
+
+            while session.get(Job, job.id).locked_at.year == 2000 and datetime.utcnow() < deadline:
+                session.expire_all()
+
+        assert jobs.release_expired_leases(session) == 0
@@ -0,0 +1,35 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from jiu_jitsu_notes import db, publishing
+from jiu_jitsu_notes.models import User
+
+
+def test_pages_are_republished_only_when_their_inputs_change(database, tmp_path, monkeypatch):
+    monkeypatch.setattr(publishing, "PUBLISH_DIRECTORY", tmp_path / "published")
+
+    with db.session_for_user(1) as session:
+        user = User(id=1, username="published", email="published@example.com", password_hash="")
+        session.add(user)
+        session.commit()
+
+        group = db.create_group(session, user, "Guard", "")
+        db.create_position_in_group(session, user, group, name="Closed guard", description="")
+        page_path = f"/published/{db.create_publication(session, user).slug}/groups/{group.id}"
+
+    assert publishing.rebuild(1) == 2
+    assert publishing.rebuild(1) == 0
+
+    monkeypatch.setattr(publishing, "TEMPLATE_VERSION", "changed")
+    assert publishing.rebuild(1) == 2
+
+    app = FastAPI()
+    app.mount("/published", publishing.PublishedFiles(directory=publishing.PUBLISH_DIRECTORY, html=True))
+    client = TestClient(app)
+
+    page = client.get(page_path)
+    assert page.status_code == 200
+    assert "Closed guard" in page.text
+
+    assert client.get(page_path, headers={"If-None-Match": page.headers["etag"]}).status_code == 304
+    assert client.get(page_path.replace(f"groups/{group.id}", publishing.MANIFEST)).status_code == 404
@@ -0,0 +1,523 @@
+"""Fail if any db.py helper or relationship load scans a large table.
+
+Set QUERY_PLAN_REPORT=1 (and run pytest with -s) to print the SQL, plan and timing of every query.
+Set QUERY_PLAN_POSTGRES_URI to also check plans on a scratch Postgres database; its tables are dropped afterwards.
+Postgres plans are explained with enable_seqscan off, so the small seed doesn't hide a missing index.
+"""
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+import pytest
+from sqlalchemy import Engine, create_engine, event, insert, text
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import db, duplicates, jobs, serialisers
+from jiu_jitsu_notes.models import Base, Position, PositionGroup, Tag, Technique, Token, User, position_tags, technique_tags
+
+USERS = 40
+GROUPS_PER_USER = 10
+POSITIONS_PER_GROUP = 10
+TECHNIQUES_PER_POSITION = 4
+TAGS_PER_USER = 8
+
+LARGE_TABLES = {
+    "users",
+    "shard_assignments",
+    "tokens",
+    "position_groups",
+    "positions",
+    "techniques",
+    "changes",
+    "change_locks",
+    "jobs",
+    "tags",
+    "technique_tags",
+    "position_tags",
+    "trigrams",
+}
+
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)")
+POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+REPORT = bool(os.environ.get("QUERY_PLAN_REPORT"))
+
+
+@dataclass
+class Seed:
+    user_id: int
+    email: str
+    username: str
+    token: str
+    group_id: int
+    position_id: int
+    technique_id: int
+    tag_id: int
+
+
+@dataclass
+class CapturedQuery:
+    statement: str
+    parameters: object
+    duration: float = 0.0
+
+
+class Capture:
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self.queries: list[CapturedQuery] = []
+        self.started: list[float] = []
+
+    def before(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.queries.append(CapturedQuery(statement, parameters))
+        self.started.append(time.perf_counter())
+
+    def after(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.queries[-1].duration = time.perf_counter() - self.started.pop()
+
+    def __enter__(self) -> "Capture":
+        event.listen(self.engine, "before_cursor_execute", self.before)
+        event.listen(self.engine, "after_cursor_execute", self.after)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        event.remove(self.engine, "before_cursor_execute", self.before)
+        event.remove(self.engine, "after_cursor_execute", self.after)
+
+
+CASES: dict[str, Callable[[Session, Seed, Capture], None]] = {}
+
+
+def case(function):
+    CASES[function.__name__.removeprefix("case_")] = function
+    return function
+
+
+@case
+def case_token_from_string(session, seed, capture):
+    with capture:
+        db.token_from_string(session, seed.token)
+
+
+@case
+def case_token_with_user(session, seed, capture):
+    with capture:
+        db.token_with_user(session, seed.token)
+
+
+@case
+def case_token_user(session, seed, capture):
+    token = db.token_from_string(session, seed.token)
+
+    with capture:
+        token.user
+
+
+@case
+def case_user_by_email(session, seed, capture):
+    with capture:
+        db.user_by_email(session, seed.email)
+
+
+@case
+def case_user_by_username(session, seed, capture):
+    with capture:
+        db.user_by_username(session, seed.username)
+
+
+@case
+def case_group_by_id(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.group_by_id(session, user, seed.group_id)
+
+
+@case
+def case_all_groups_for_user(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.all_groups_for_user(session, user)
+
+
+@case
+def case_position_by_id(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.position_by_id(session, user, seed.position_id)
+
+
+@case
+def case_all_positions_for_user(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.all_positions_for_user(session, user)
+
+
+@case
+def case_technique_by_id(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.technique_by_id(session, user, seed.technique_id)
+
+
+@case
+def case_technique_view(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.technique_view(session, user, seed.technique_id, with_tags=True)
+
+
+@case
+def case_load_group_tree(session, seed, capture):
+    user = session.get(User, seed.user_id)
+    include = serialisers.parse_include(PositionGroup, "positions.techniques,positions.techniques_to")
+
+    with capture:
+        db.load_for_user(session, user, PositionGroup, serialisers.eager_options(PositionGroup, include))
+
+
+@case
+def case_group_views_for_user(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.group_views_for_user(session, user)
+
+
+@case
+def case_group_views_with_techniques(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.group_views_with_techniques(session, user)
+
+
+@case
+def case_group_view(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.group_view(session, user, seed.group_id)
+
+
+@case
+def case_technique_tag_names(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.technique_tag_names(session, user)
+
+
+@case
+def case_all_tags_for_user(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.all_tags_for_user(session, user)
+
+
+@case
+def case_tags_named(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.tags_named(session, user, ["Tag 1", "New tag"])
+
+
+@case
+def case_techniques_with_tags(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.entities_by_ids(session, user, Technique, [seed.technique_id, seed.technique_id + 1], with_tags=True)
+
+
+@case
+def case_positions_with_tags(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.entities_by_ids(session, user, Position, [seed.position_id, seed.position_id + 1], with_tags=True)
+
+
+@case
+def case_technique_tags(session, seed, capture):
+    technique = session.get(Technique, seed.technique_id)
+
+    with capture:
+        technique.tags
+
+
+@case
+def case_tag_positions(session, seed, capture):
+    tag = session.get(Tag, seed.tag_id)
+
+    with capture:
+        tag.positions
+
+
+@case
+def case_possible_duplicates(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        duplicates.possible_duplicates(session, user, Position, f"Position {seed.position_id}", "Closed guard")
+
+
+@case
+def case_merge_suggestions(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        duplicates.merge_suggestions(session, user, Technique)
+
+
+@case
+def case_changes_since(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.changes_since(session, user, 0, 100)
+
+
+@case
+def case_claim_job(session, seed, capture):
+    with capture:
+        jobs.claim(session, "worker")
+
+
+@case
+def case_release_expired_leases(session, seed, capture):
+    with capture:
+        jobs.release_expired_leases(session)
+
+
+@case
+def case_user_groups(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        user.groups
+
+
+@case
+def case_user_token(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        user.token
+
+
+@case
+def case_group_positions(session, seed, capture):
+    group = session.get(PositionGroup, seed.group_id)
+
+    with capture:
+        group.positions
+
+
+@case
+def case_position_techniques_from(session, seed, capture):
+    position = session.get(Position, seed.position_id)
+
+    with capture:
+        position.techniques_from
+
+
+@case
+def case_position_techniques_to(session, seed, capture):
+    position = session.get(Position, seed.position_id)
+
+    with capture:
+        position.techniques_to
+
+
+@case
+def case_delete_position(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.delete_position(session, user, seed.group_id, seed.position_id + 1)
+
+
+@case
+def case_delete_group(session, seed, capture):
+    user = session.get(User, seed.user_id)
+
+    with capture:
+        db.delete_group(session, user, seed.group_id + 1)
+
+
+def seed_database(engine: Engine) -> Seed:
+    Base.metadata.create_all(engine)
+
+    users, tokens, groups, positions, techniques = [], [], [], [], []
+    tags, tagged_positions, tagged_techniques = [], [], []
+    group_id = position_id = technique_id = tag_id = 0
+
+    for user_id in range(1, USERS + 1):
+        tokens.append({"id": user_id, "token": str(uuid.uuid4()), "created_at": datetime.utcnow()})
+        users.append(
+            {
+                "id": user_id,
+                "username": f"user{user_id}",
+                "email": f"user{user_id}@example.com",
+                "password_hash": "",
+                "token_id": user_id,
+            }
+        )
+
+        first_tag = tag_id + 1
+
+        for _ in range(TAGS_PER_USER):
+            tag_id += 1
+            tags.append({"id": tag_id, "user_id": user_id, "name": f"Tag {tag_id - first_tag + 1}"})
+
+        for _ in range(GROUPS_PER_USER):
+            group_id += 1
+            groups.append({"id": group_id, "user_id": user_id, "name": f"Group {group_id}", "description": ""})
+
+            first_position_in_group = position_id + 1
+
+            for _ in range(POSITIONS_PER_GROUP):
+                position_id += 1
+                positions.append(
+                    {
+                        "id": position_id,
+                        "user_id": user_id,
+                        "group_id": group_id,
+                        "name": f"Position {position_id}",
+                        "description": "",
+                        "submission": False,
+                    }
+                )
+                tagged_positions.append({"position_id": position_id, "tag_id": first_tag + position_id % TAGS_PER_USER})
+
+                for offset in range(TECHNIQUES_PER_POSITION):
+                    technique_id += 1
+                    techniques.append(
+                        {
+                            "id": technique_id,
+                            "user_id": user_id,
+                            "name": f"Technique {technique_id}",
+                            "description": "",
+                            "from_position_id": position_id,
+                            "to_position_id": first_position_in_group + offset,
+                        }
+                    )
+                    tagged_techniques.append(
+                        {"technique_id": technique_id, "tag_id": first_tag + technique_id % TAGS_PER_USER}
+                    )
+
+    with Session(engine) as session:
+        for table, rows in (
+            (Token, tokens),
+            (User, users),
+            (PositionGroup, groups),
+            (Position, positions),
+            (Technique, techniques),
+            (Tag, tags),
+            (position_tags, tagged_positions),
+            (technique_tags, tagged_techniques),
+        ):
+            session.execute(insert(table), rows)
+
+        session.commit()
+        db.reindex_trigrams(session)
+
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+
+    middle = USERS // 2
+    first_group = (middle - 1) * GROUPS_PER_USER + 1
+    first_position = (first_group - 1) * POSITIONS_PER_GROUP + 1
+
+    return Seed(
+        user_id=middle,
+        email=f"user{middle}@example.com",
+        username=f"user{middle}",
+        token=tokens[middle - 1]["token"],
+        group_id=first_group,
+        position_id=first_position,
+        technique_id=(first_position - 1) * TECHNIQUES_PER_POSITION + 1,
+        tag_id=(middle - 1) * TAGS_PER_USER + 1,
+    )
+
+
+def explain(engine: Engine, query: CapturedQuery) -> list[str]:
+    with engine.connect() as connection:
+        if engine.dialect.name == "sqlite":
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {query.statement}", query.parameters)
+            return [row[3] for row in rows]
+
+        # The seed is far smaller than production, so Postgres would rightly pick a sequential scan
+        # on its own; with them disabled it still falls back to one only when no index applies.
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        rows = connection.exec_driver_sql(f"EXPLAIN {query.statement}", query.parameters)
+        return [row[0] for row in rows]
+
+
+def scanned_tables(engine: Engine, plan: list[str]) -> set[str]:
+    pattern = SQLITE_SCAN if engine.dialect.name == "sqlite" else POSTGRES_SCAN
+
+    return {match.group(1) for line in plan if (match := pattern.search(line.strip()))} & LARGE_TABLES
+
+
+def engines():
+    yield pytest.param("sqlite://", id="sqlite")
+
+    postgres_uri = os.environ.get("QUERY_PLAN_POSTGRES_URI")
+    yield pytest.param(
+        postgres_uri,
+        id="postgres",
+        marks=pytest.mark.skipif(postgres_uri is None, reason="QUERY_PLAN_POSTGRES_URI is not set"),
+    )
+
+
+@pytest.fixture(scope="module", params=list(engines()))
+def seeded(request):
+    engine = create_engine(request.param)
+    seed = seed_database(engine)
+
+    yield engine, seed
+
+    if engine.dialect.name != "sqlite":
+        Base.metadata.drop_all(engine)
+
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_query_uses_index(seeded, name):
+    engine, seed = seeded
+    capture = Capture(engine)
+
+    with Session(engine) as session:
+        CASES[name](session, seed, capture)
+        session.rollback()
+
+    assert capture.queries, f"{name} issued no SQL"
+
+    scans = {}
+
+    for query in capture.queries:
+        plan = explain(engine, query)
+
+        if REPORT:
+            print(f"\n[{engine.dialect.name}] {name}: {query.duration * 1000:.3f} ms\n{query.statement}")
+            print("\n".join(f"    {line}" for line in plan))
+
+        if tables := scanned_tables(engine, plan):
+            scans[query.statement] = tables
+
+    assert not scans, f"{name} scans large tables: {scans}"
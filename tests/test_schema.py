@@ -0,0 +1,63 @@
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import db, schema
+from jiu_jitsu_notes.models import Base, Token, User
+
+# The tables as the first release created them: no ON DELETE actions, unique constraints or indexes.
+BASELINE_SCHEMA = """
+CREATE TABLE tokens (id INTEGER NOT NULL, token VARCHAR NOT NULL, created_at DATETIME NOT NULL, PRIMARY KEY (id));
+CREATE TABLE users (
+    id INTEGER NOT NULL, username VARCHAR NOT NULL, email VARCHAR NOT NULL, password_hash VARCHAR NOT NULL,
+    token_id INTEGER, PRIMARY KEY (id), FOREIGN KEY(token_id) REFERENCES tokens (id)
+);
+CREATE TABLE position_groups (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, name VARCHAR NOT NULL, description VARCHAR NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE positions (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, name VARCHAR NOT NULL, description VARCHAR NOT NULL,
+    submission BOOLEAN NOT NULL, group_id INTEGER, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(group_id) REFERENCES position_groups (id)
+);
+CREATE TABLE techniques (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, name VARCHAR NOT NULL, description VARCHAR NOT NULL,
+    from_position_id INTEGER, to_position_id INTEGER, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(from_position_id) REFERENCES positions (id),
+    FOREIGN KEY(to_position_id) REFERENCES positions (id)
+);
+INSERT INTO tokens VALUES (1, 'token', '2024-01-01 00:00:00');
+INSERT INTO users VALUES (1, 'user', 'user@example.com', '', 1);
+INSERT INTO position_groups VALUES (1, 1, 'Guard', '');
+INSERT INTO positions VALUES (1, 1, 'Closed guard', '', 0, 1);
+INSERT INTO techniques VALUES (1, 1, 'Armbar', '', 1, 1);
+"""
+
+
+def test_upgrade_rebuilds_baseline_tables(tmp_path):
+    path = tmp_path / "notes.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    connection.close()
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    assert set(schema.upgrade(engine)) == {"tokens", "users", "positions", "techniques"}
+    assert schema.upgrade(engine) == []
+    assert "ix_positions_group_id" in {index["name"] for index in inspect(engine).get_indexes("positions")}
+
+    with Session(engine) as session:
+        assert session.get(Token, 1).created_at == datetime(2024, 1, 1)
+
+        db.delete_token_for_user(session, session.get(User, 1))
+        assert session.get(User, 1).token_id is None
+
+        db.delete_position(session, session.get(User, 1), 1, 1)
+        assert session.execute(Base.metadata.tables["techniques"].select()).all() == []
+
+    engine.dispose()
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from jiu_jitsu_notes import autosave, db, position_index, shards
+from jiu_jitsu_notes.models import Position, PositionGroup, Technique, User
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    uris = {name: f"sqlite:///{tmp_path / f'{name}.db'}" for name in ("first", "second")}
+    directory = create_engine(uris["first"])
+    router = shards.ShardRouter(directory, uris, uris["first"])
+    router.create_all()
+
+    monkeypatch.setattr(db, "shard_router", router)
+    monkeypatch.setattr(db, "SessionLocal", sessionmaker(class_=shards.ShardedSession, router=router))
+    monkeypatch.setattr(db, "_routed_shards", {})
+
+    yield router
+
+    for engine in router.engines.values():
+        engine.dispose()
+
+
+def seed(router: shards.ShardRouter, source: str) -> None:
+    with Session(router.directory) as session:
+        for user_id in (1, 2):
+            session.add(User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", password_hash=""))
+
+        session.commit()
+
+    with shards.ShardedSession(router=router) as directory:
+        directory.merge(shards.ShardAssignment(user_id=1, shard=source))
+        directory.merge(shards.ShardAssignment(user_id=2, shard=source))
+        directory.commit()
+
+    router.ensure_user_row(source, User(id=1, username="user1", email="user1@example.com"))
+    router.ensure_user_row(source, User(id=2, username="user2", email="user2@example.com"))
+
+    with Session(router.engines[source]) as session:
+        session.execute(insert(PositionGroup).values(id=1, user_id=1, name="Guard", description=""))
+        session.execute(insert(PositionGroup).values(id=2, user_id=2, name="Guard", description=""))
+        session.execute(insert(Position).values(id=1, user_id=1, group_id=1, name="Closed guard", description=""))
+        session.execute(insert(Position).values(id=2, user_id=2, group_id=2, name="Mount", description=""))
+        # Older versions didn't check that a technique's target belonged to the same user.
+        session.execute(
+            insert(Technique).values(id=1, user_id=1, name="Armbar", description="", from_position_id=1, to_position_id=2)
+        )
+        session.commit()
+
+
+def test_unknown_user_has_no_shard(router):
+    with pytest.raises(ValueError, match="No user with id 99"):
+        router.shard_for(99)
+
+    with pytest.raises(ValueError, match="No user with id 99"):
+        shards.move_user(router, 99, "second")
+
+
+def test_move_clears_foreign_targets_and_stale_caches(router, monkeypatch):
+    seed(router, "first")
+    buffer = autosave.AutosaveBuffer()
+    monkeypatch.setattr(autosave, "buffer", buffer)
+
+    with db.session_for_user(1) as session:
+        position_index.search(session, session.get(User, 1), "clo")
+
+    buffer.buffer("techniques", 1, 1, {"name": "Kimura"})
+
+    assert shards.move_user(router, 1, "second")["techniques"] == 1
+
+    with Session(router.engines["second"]) as session:
+        technique = session.query(Technique).one()
+        assert (technique.name, technique.to_position_id) == ("Armbar", None)
+
+    # The edit was made against the first shard's ids, so it is dropped rather than applied here.
+    assert buffer.flush(force=True) == 0
+
+    with db.session_for_user(1) as session:
+        assert session.shard == "second"
+
+    assert 1 not in position_index._indexes
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from jiu_jitsu_notes import db, sync
+from jiu_jitsu_notes.models import User
+
+
+def test_tag_membership_reaches_sync_clients(database):
+    with db.session_for_user(1) as session:
+        user = User(id=1, username="sync", email="sync@example.com", password_hash="")
+        session.add(user)
+        session.commit()
+
+        group = db.create_group(session, user, "Guard", "")
+        position = db.create_position_in_group(session, user, group, name="Closed guard", description="")
+        technique = db.create_technique(session, user, "Armbar", "", position.id, None)
+
+        cursor = sync.changes_page(session, user, None, 100)["cursor"]
+
+        technique.tags = db.tags_named(session, user, ["submission"])
+        db.record_change(session, technique)
+        session.commit()
+
+        page = sync.changes_page(session, user, cursor, 100)
+
+    changed = {(entry["entity"], entry["id"]): entry["data"] for entry in page["changes"]}
+
+    assert changed[("technique", technique.id)]["tags"] == [{"id": 1, "name": "submission"}]
+    assert changed[("tag", 1)] == {"id": 1, "name": "submission"}
+
+
+def test_cursor_from_before_a_restore_resets(database):
+    with db.session_for_user(1) as session:
+        user = User(id=1, username="restore", email="restore@example.com", password_hash="")
+        session.add(user)
+        session.commit()
+
+        db.create_group(session, user, "Guard", "")
+        cursor = sync.changes_page(session, user, None, 100)["cursor"]
+
+        assert sync.changes_page(session, user, cursor, 100)["reset"] is False
+
+        db.start_change_log_epoch(session)
+        page = sync.changes_page(session, user, cursor, 100)
+
+    assert page["reset"] is True
+    assert [entry["entity"] for entry in page["changes"]] == ["group"]
+
+
+def test_cursor_from_before_compacted_deletions_resets(database):
+    with db.session_for_user(1) as session:
+        user = User(id=1, username="compact", email="compact@example.com", password_hash="")
+        session.add(user)
+        session.commit()
+
+        kept = db.create_group(session, user, "Guard", "")
+        deleted = db.create_group(session, user, "Mount", "")
+        stale = sync.changes_page(session, user, None, 100)["cursor"]
+
+        db.delete_group(session, user, deleted.id)
+        current = sync.changes_page(session, user, stale, 100)["cursor"]
+
+        db.compact_changes(session, timedelta(0))
+        db.compact_changes(session, timedelta(0))
+
+        assert [change.entity_id for change in db.changes_since(session, user, 0, 100)] == [kept.id]
+
+        stale_page = sync.changes_page(session, user, stale, 100)
+        current_page = sync.changes_page(session, user, current, 100)
+
+    assert stale_page["reset"] is True
+    assert [entry["id"] for entry in stale_page["changes"]] == [kept.id]
+    assert current_page["reset"] is False
+    assert current_page["changes"] == []
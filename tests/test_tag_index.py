@@ -0,0 +1,118 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest import fixture, mark, raises
+from sqlalchemy.orm import Session
+
+from jiu_jitsu_notes import auth
+from jiu_jitsu_notes.models import User
+from jiu_jitsu_notes.routes.api import tags
+from jiu_jitsu_notes.tag_index import Parser, TagIndex, TagQueryError
+
+
+@fixture
+def index() -> TagIndex:
+    index = TagIndex()
+    index.set_tags(1, {"gi", "submission"})
+    index.set_tags(2, {"gi", "sweep"})
+    index.set_tags(3, {"no-gi", "submission"})
+    index.set_tags(4, {"no-gi", "sweep", "leg-lock"})
+    index.set_tags(5, set())
+    return index
+
+
+@mark.parametrize(
+    "query, expected",
+    [
+        ("", [1, 2, 3, 4, 5]),
+        ("gi", [1, 2]),
+        ("gi AND submission", [1]),
+        ("gi submission", [1]),
+        ("gi OR leg-lock", [1, 2, 4]),
+        ("NOT gi", [3, 4, 5]),
+        ("not gi and not no-gi", [5]),
+        ("NOT NOT gi", [1, 2]),
+        ("unknown", []),
+        ("NOT unknown", [1, 2, 3, 4, 5]),
+    ],
+)
+def test_operators(index, query, expected):
+    assert index.filter(query) == expected
+
+
+@mark.parametrize(
+    "query, expected",
+    [
+        # NOT binds tighter than AND, which binds tighter than OR.
+        ("sweep OR gi AND submission", [1, 2, 4]),
+        ("gi AND submission OR sweep", [1, 2, 4]),
+        ("NOT gi AND sweep", [4]),
+        ("NOT gi OR sweep", [2, 3, 4, 5]),
+        ("sweep OR gi submission", [1, 2, 4]),
+        ("(sweep OR gi) AND submission", [1]),
+        ("NOT (gi OR sweep)", [3, 5]),
+        ("(gi)", [1, 2]),
+    ],
+)
+def test_precedence_and_parentheses(index, query, expected):
+    assert index.filter(query) == expected
+
+
+def test_tags_are_normalised_and_may_be_quoted(index):
+    index.set_tags(6, {"half-guard"})
+
+    assert index.filter("GI") == [1, 2]
+    assert index.filter('"Half Guard"') == [6]
+    assert index.filter('"or"') == []
+
+
+@mark.parametrize("query", ["gi AND", "gi OR", "NOT", "(gi", "gi)", "()", "AND gi", 'gi "sweep'])
+def test_malformed_queries_raise(index, query):
+    with raises(TagQueryError):
+        index.filter(query)
+
+
+def test_parser_evaluates_against_the_given_bitmaps():
+    assert Parser("a b OR NOT c", {"a": 0b0011, "b": 0b0110, "c": 0b1100}, 0b1111).parse() == 0b0011
+    assert Parser("", {}, 0b101).parse() == 0b101
+
+
+def test_set_tags_replaces_a_techniques_tags(index):
+    index.set_tags(1, {"sweep"})
+
+    assert index.filter("gi") == [2]
+    assert index.filter("submission") == [3]
+    assert index.filter("sweep") == [1, 2, 4]
+
+
+def test_removed_techniques_ordinal_is_reused_without_its_tags(index):
+    ordinal = index.ordinals[3]
+    index.remove(3)
+
+    assert index.filter("submission") == [1]
+    assert index.filter("") == [1, 2, 4, 5]
+
+    index.set_tags(7, {"guard-pass"})
+
+    assert index.ordinals[7] == ordinal
+    assert index.filter("submission") == [1]
+    assert index.filter("no-gi") == [4]
+    assert index.filter("guard-pass") == [7]
+    assert index.filter("NOT gi") == [4, 5, 7]
+
+    index.remove(3)
+    assert index.filter("guard-pass") == [7]
+
+
+def test_route_rejects_malformed_queries(database):
+    with Session(database, expire_on_commit=False) as session:
+        user = User(id=1, username="user1", email="user1@example.com", password_hash="")
+        session.add(user)
+        session.commit()
+
+    app = FastAPI()
+    app.include_router(tags.router)
+    app.dependency_overrides[auth.current_user] = lambda: user
+    response = TestClient(app).get("/techniques", params={"query": "gi AND"})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Tag query ended unexpectedly"}